@@ -1,8 +1,15 @@
-import requests
+import asyncio
 import concurrent.futures
-from bs4 import BeautifulSoup
-import difflib
 import re
+import time
+
+import dedup
+import html_parsing
+import http_client
+import isbn
+import metadata_cache
+import scoring
+from provider_engine import ProviderEngine, SyncProvider
 
 def fetch_google_books(query):
     """
@@ -23,7 +30,8 @@ def fetch_google_books(query):
     
     try:
         # 1. Standard Search
-        response = requests.get(base_url, params=params, timeout=5)
+        response = http_client.get(base_url, params=params, timeout=5)
+        response.raise_for_status()
         results = []
         
         if response.status_code == 200:
@@ -40,21 +48,23 @@ def fetch_google_books(query):
             params_author = params.copy()
             params_author["q"] = f"inauthor:{query}"
             try:
-                response_author = requests.get(base_url, params=params_author, timeout=5)
+                response_author = http_client.get(base_url, params=params_author, timeout=5)
                 if response_author.status_code == 200:
                     data_author = response_author.json()
                     if "items" in data_author:
+                        # Avoid duplicates
+                        seen = {(r["title"], r["author"]) for r in results}
                         for item in data_author["items"]:
-                            # Avoid duplicates
                             parsed = parse_google_book(item)
-                            if parsed and not any(r["title"] == parsed["title"] and r["author"] == parsed["author"] for r in results):
+                            if parsed and (parsed["title"], parsed["author"]) not in seen:
+                                seen.add((parsed["title"], parsed["author"]))
                                 results.append(parsed)
             except Exception as e:
                 print(f"Google Books Author Search Error: {e}")
 
     except Exception as e:
         print(f"Google Books Error: {e}")
-        return []
+        raise
         
     return results
 
@@ -122,7 +132,8 @@ def fetch_open_library(query):
         }
     
     try:
-        response = requests.get(base_url, params=params, timeout=5)
+        response = http_client.get(base_url, params=params, timeout=5)
+        response.raise_for_status()
         results = []
         
         if response.status_code == 200:
@@ -171,7 +182,7 @@ def fetch_open_library(query):
                     })
     except Exception as e:
         print(f"Open Library Error: {e}")
-        return []
+        raise
         
     return results
 
@@ -188,7 +199,8 @@ def fetch_itunes_books(query):
     }
     
     try:
-        response = requests.get(base_url, params=params, timeout=5)
+        response = http_client.get(base_url, params=params, timeout=5)
+        response.raise_for_status()
         results = []
         
         if response.status_code == 200:
@@ -225,227 +237,383 @@ def fetch_itunes_books(query):
                     })
     except Exception as e:
         print(f"iTunes Error: {e}")
-        return []
+        raise
+        
+    return results
+
+KITAPYURDU_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+}
+# Detail pages are fetched concurrently through http_client, which caps
+# requests per host. Whatever hasn't arrived by KITAPYURDU_DEADLINE seconds
+# after the search started is left at defaults, and the results are returned
+# as metadata_cache.Incomplete so they aren't cached.
+KITAPYURDU_DEADLINE = 6
+_kitapyurdu_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=http_client.HOST_CONNECTIONS, thread_name_prefix="kitapyurdu"
+)
+
+# The parts of Kitapyurdu's pages the parsers below read; everything else is
+# skipped while parsing.
+KITAPYURDU_SEARCH_PARTS = html_parsing.only(classes=["product-cr"])
+KITAPYURDU_DETAIL_PARTS = html_parsing.only(
+    ids=["description_text"],
+    classes=["info__text", "product-info-text", "attributes"],
+    meta=["description"],
+)
+
+def parse_kitapyurdu_details(html):
+    """
+    Returns (summary, page_count, isbn) from a Kitapyurdu product page.
+    """
+    summary = "Özet bulunmuyor."
+    page_count = 0
+    isbn = "Bilinmiyor"
+    detail_soup = html_parsing.parse(html, KITAPYURDU_DETAIL_PARTS)
+    
+    # Summary - Try multiple selectors
+    desc_tag = detail_soup.select_one('#description_text')
+    if not desc_tag:
+        desc_tag = detail_soup.select_one('.info__text')
+    if not desc_tag:
+        desc_tag = detail_soup.select_one('.product-info-text')
+    
+    # Fallback to meta description
+    if not desc_tag:
+        meta_desc = detail_soup.find('meta', attrs={'name': 'description'})
+        if meta_desc:
+            summary = meta_desc.get('content', '')
+
+    if desc_tag:
+        summary = desc_tag.get_text(strip=True)
+    
+    # Clean up summary and check for bad data
+    if summary:
+        # Check for the specific error string reported by user
+        if "Kitapyurdu'ndan bulundu" in summary or "bulundu" in summary.lower() and len(summary) < 50:
+            summary = "Özet bulunmuyor."
         
+        # If summary is still empty or default
+        if not summary or summary == "Özet bulunmuyor.":
+             # Try to get from meta description if we haven't already
+             meta_desc = detail_soup.find('meta', attrs={'name': 'description'})
+             if meta_desc:
+                 summary = meta_desc.get('content', '')
+
+    
+    # Attributes
+    attr_rows = detail_soup.select('.attributes table tr')
+    for row in attr_rows:
+        cols = row.select('td')
+        if len(cols) == 2:
+            key = cols[0].get_text(strip=True)
+            val = cols[1].get_text(strip=True)
+            if "Sayfa Sayısı" in key:
+                try: page_count = int(val)
+                except: pass
+            elif "ISBN" in key:
+                isbn = val.replace("-", "")
+    return summary, page_count, isbn
+
+def parse_kitapyurdu_search(html):
+    """
+    Returns result dicts for the top products on a Kitapyurdu search page,
+    with the detail page fields left at their defaults.
+    """
+    results = []
+    soup = html_parsing.parse(html, KITAPYURDU_SEARCH_PARTS)
+    products = soup.select('.product-cr')[:5] # Limit to top 5
+
+    for product in products:
+        try:
+            name_tag = product.select_one('.name span')
+            title = name_tag.text.strip() if name_tag else "Bilinmeyen Kitap"
+
+            link_tag = product.select_one('.name a')
+            link = link_tag['href'] if link_tag else ""
+
+            img_tag = product.select_one('.image img')
+            cover_url = img_tag['src'] if img_tag else ""
+
+            # Author
+            author_tag = product.select_one('.author span a span')
+            author = author_tag.text.strip() if author_tag else "Bilinmeyen Yazar"
+
+            # Publisher
+            publisher_tag = product.select_one('.publisher span a span')
+            publisher = publisher_tag.text.strip() if publisher_tag else "Bilinmeyen Yayınevi"
+
+            # Details come from the product page (fetch_kitapyurdu_details)
+            results.append({
+                "title": title,
+                "author": author,
+                "isbn": "Bilinmiyor",
+                "cover_url": cover_url,
+                "summary": "Özet bulunmuyor.",
+                "page_count": 0,
+                "publisher": publisher,
+                "published_date": "",
+                "source": "Kitapyurdu",
+                "link": link
+            })
+        except Exception as e:
+            print(f"Error parsing kitapyurdu item: {e}")
+            continue
     return results
 
+def fetch_kitapyurdu_details(link, deadline=None):
+    detail_resp = http_client.get(link, headers=KITAPYURDU_HEADERS, timeout=5, deadline=deadline)
+    detail_resp.raise_for_status()
+    return parse_kitapyurdu_details(detail_resp.text)
+
 def fetch_kitapyurdu(query):
     """
-    Fetches book metadata from Kitapyurdu.
+    Fetches book metadata from Kitapyurdu. If a detail page couldn't be
+    read in time the results are wrapped in metadata_cache.Incomplete.
     """
     base_url = "https://www.kitapyurdu.com/index.php"
     params = {
         "route": "product/search",
         "filter_name": query
     }
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-    }
+    deadline = time.monotonic() + KITAPYURDU_DEADLINE
     
     results = []
     try:
-        response = requests.get(base_url, params=params, headers=headers, timeout=8)
+        response = http_client.get(base_url, params=params, headers=KITAPYURDU_HEADERS, timeout=8, deadline=deadline)
+        response.raise_for_status()
         if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            products = soup.select('.product-cr')[:5] # Limit to top 5
-            
-            for product in products:
-                try:
-                    name_tag = product.select_one('.name span')
-                    title = name_tag.text.strip() if name_tag else "Bilinmeyen Kitap"
-                    
-                    link_tag = product.select_one('.name a')
-                    link = link_tag['href'] if link_tag else ""
-                    
-                    img_tag = product.select_one('.image img')
-                    cover_url = img_tag['src'] if img_tag else ""
-                    
-                    # Author
-                    author_tag = product.select_one('.author span a span')
-                    author = author_tag.text.strip() if author_tag else "Bilinmeyen Yazar"
-                    
-                    # Publisher
-                    publisher_tag = product.select_one('.publisher span a span')
-                    publisher = publisher_tag.text.strip() if publisher_tag else "Bilinmeyen Yayınevi"
-                    
-                    # Fetch details
-                    summary = "Özet bulunmuyor."
-                    page_count = 0
-                    isbn = "Bilinmiyor"
-                    
-                    if link:
-                        try:
-                            detail_resp = requests.get(link, headers=headers, timeout=5)
-                            if detail_resp.status_code == 200:
-                                detail_soup = BeautifulSoup(detail_resp.text, 'html.parser')
-                                
-                                # Summary - Try multiple selectors
-                                desc_tag = detail_soup.select_one('#description_text')
-                                if not desc_tag:
-                                    desc_tag = detail_soup.select_one('.info__text')
-                                if not desc_tag:
-                                    desc_tag = detail_soup.select_one('.product-info-text')
-                                
-                                # Fallback to meta description
-                                if not desc_tag:
-                                    meta_desc = detail_soup.find('meta', attrs={'name': 'description'})
-                                    if meta_desc:
-                                        summary = meta_desc.get('content', '')
-
-                                if desc_tag:
-                                    summary = desc_tag.get_text(strip=True)
-                                
-                                # Clean up summary and check for bad data
-                                if summary:
-                                    # Check for the specific error string reported by user
-                                    if "Kitapyurdu'ndan bulundu" in summary or "bulundu" in summary.lower() and len(summary) < 50:
-                                        summary = "Özet bulunmuyor."
-                                    
-                                    # If summary is still empty or default
-                                    if not summary or summary == "Özet bulunmuyor.":
-                                         # Try to get from meta description if we haven't already
-                                         meta_desc = detail_soup.find('meta', attrs={'name': 'description'})
-                                         if meta_desc:
-                                             summary = meta_desc.get('content', '')
-
-                                
-                                # Attributes
-                                attr_rows = detail_soup.select('.attributes table tr')
-                                for row in attr_rows:
-                                    cols = row.select('td')
-                                    if len(cols) == 2:
-                                        key = cols[0].get_text(strip=True)
-                                        val = cols[1].get_text(strip=True)
-                                        if "Sayfa Sayısı" in key:
-                                            try: page_count = int(val)
-                                            except: pass
-                                        elif "ISBN" in key:
-                                            isbn = val.replace("-", "")
-                        except Exception as e:
-                            print(f"Detail fetch error: {e}")
+            results = parse_kitapyurdu_search(response.text)
 
-                    results.append({
-                        "title": title,
-                        "author": author,
-                        "isbn": isbn,
-                        "cover_url": cover_url,
-                        "summary": summary,
-                        "page_count": page_count,
-                        "publisher": publisher,
-                        "published_date": "",
-                        "source": "Kitapyurdu",
-                        "link": link
-                    })
+            # Fetch details
+            futures = {}
+            for book in results:
+                if book["link"]:
+                    futures[_kitapyurdu_executor.submit(fetch_kitapyurdu_details, book["link"], deadline)] = book
+            done, not_done = concurrent.futures.wait(futures, timeout=max(deadline - time.monotonic(), 0))
+            # Don't wait for stragglers; their books keep the defaults
+            for future in not_done:
+                future.cancel()
+
+            missing = len(not_done)
+            for future in done:
+                try:
+                    book = futures[future]
+                    book["summary"], book["page_count"], book["isbn"] = future.result()
                 except Exception as e:
-                    print(f"Error parsing kitapyurdu item: {e}")
-                    continue
+                    missing += 1
+                    print(f"Detail fetch error: {e}")
+            if not_done:
+                print(f"Kitapyurdu: {len(not_done)} detail pages missed the {KITAPYURDU_DEADLINE}s deadline")
+            if missing:
+                results = metadata_cache.Incomplete(results)
                     
     except Exception as e:
         print(f"Kitapyurdu Error: {e}")
+        raise
         
     return results
 
+# Source name (as used by metadata_cache) -> fetcher. Fetchers raise when the
+# upstream call fails so that errors aren't cached as empty results.
+PROVIDERS = {
+    "google": fetch_google_books,
+    "openlibrary": fetch_open_library,
+    "itunes": fetch_itunes_books,
+    "kitapyurdu": fetch_kitapyurdu,
+}
+
+ENGINE = ProviderEngine([SyncProvider(name, fetch) for name, fetch in PROVIDERS.items()])
+
+# ISBN queries are first looked up directly by identifier. The first
+# endpoint to return the edition wins; the rest aren't waited for.
+ISBN_DEADLINE = 5
+
+def fetch_open_library_isbn(isbn13):
+    """
+    Looks an edition up with Open Library's books API, which (unlike
+    /isbn/{isbn}.json) includes author names and cover URLs.
+    """
+    key = f"ISBN:{isbn13}"
+    response = http_client.get(
+        "https://openlibrary.org/api/books",
+        params={"bibkeys": key, "format": "json", "jscmd": "data"},
+        timeout=5
+    )
+    response.raise_for_status()
+    book = response.json().get(key)
+    if not book or not book.get("title"):
+        return []
+
+    title = book["title"]
+    if book.get("subtitle"):
+        title = f"{title}: {book['subtitle']}"
+    authors = ", ".join(a["name"] for a in book.get("authors", []) if a.get("name"))
+    publishers = [p["name"] for p in book.get("publishers", []) if p.get("name")]
+    cover = book.get("cover", {})
+    return [{
+        "title": title,
+        "author": authors or "Bilinmeyen Yazar",
+        "isbn": isbn13,
+        "cover_url": cover.get("large") or cover.get("medium", ""),
+        "summary": "Özet bulunmuyor.",
+        "page_count": book.get("number_of_pages", 0),
+        "publisher": publishers[0] if publishers else "Bilinmeyen Yayınevi",
+        "published_date": book.get("publish_date", ""),
+        "source": "Open Library",
+        "link": book.get("url", "")
+    }]
+
+def fetch_google_books_isbn(isbn13):
+    # isbn: searches can return other editions; only exact matches count
+    return [book for book in fetch_google_books(isbn13) if isbn.normalize(book["isbn"]) == isbn13]
+
+def fetch_google_books_query(query):
+    # The query goes to Google Books unchanged, operators (inauthor:, subject:) included
+    response = http_client.get(
+        "https://www.googleapis.com/books/v1/volumes",
+        params={"q": query, "maxResults": 40, "printType": "books", "orderBy": "relevance"},
+        timeout=5
+    )
+    response.raise_for_status()
+    return [book for book in map(parse_google_book, response.json().get("items", [])) if book]
+
+def search_books(query):
+    """
+    Google Books results for a raw search query such as "inauthor:NAME" or
+    "subject:GENRE", through metadata_cache. Returns [] if the search fails.
+    """
+    try:
+        return metadata_cache.cached_fetch("google_query", query, fetch_google_books_query)
+    except Exception as e:
+        print(f"Google Books search failed for {query}: {e}")
+        return []
+
+ISBN_PROVIDERS = [fetch_open_library_isbn, fetch_google_books_isbn]
+# Room for a second lookup while the last one's slower endpoint finishes
+_isbn_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=2 * len(ISBN_PROVIDERS), thread_name_prefix="isbn"
+)
+
+def fetch_isbn(isbn13):
+    """
+    Queries the direct ISBN endpoints in parallel and returns the first
+    non-empty answer; [] if none has the ISBN. Raises if every endpoint failed.
+    """
+    futures = [_isbn_executor.submit(fetch, isbn13) for fetch in ISBN_PROVIDERS]
+    errors = []
+    try:
+        for future in concurrent.futures.as_completed(futures, timeout=ISBN_DEADLINE):
+            try:
+                results = future.result()
+            except Exception as e:
+                errors.append(e)
+                continue
+            if results:
+                return results
+    except concurrent.futures.TimeoutError as e:
+        errors.append(e)
+    finally:
+        for future in futures:
+            future.cancel()
+    if len(errors) == len(futures):
+        raise errors[-1]
+    # Some endpoint answered and none knows the ISBN; that is cached briefly
+    return []
+
+def resolve_isbn(query):
+    """
+    Returns the results of a direct lookup if query is a valid ISBN-10 or
+    ISBN-13 (check digit included), else None. Hits are cached permanently,
+    under the ISBN-13, so both forms of an ISBN share them.
+    """
+    isbn13 = isbn.parse(query)
+    if isbn13 is None:
+        return None
+    try:
+        results = metadata_cache.cached_fetch("isbn", isbn13, fetch_isbn)
+    except Exception as e:
+        print(f"ISBN lookup failed for {isbn13}: {e}")
+        return None
+    return results or None
+
+def _rank_isbn_hits(query, results):
+    # Direct hits are the edition asked for: scored for ordering, never filtered
+    results = scoring.Scorer(query).score_all(results)
+    results.sort(key=lambda x: x["score"], reverse=True)
+    return results
+
 def get_book_metadata(query):
     """
     Fetches book metadata from multiple sources in parallel.
     Uses a scoring system to rank results instead of strict filtering.
+    Responses are served from metadata_cache when it has them; sources that
+    haven't answered by the engine's deadline are left out. ISBN queries
+    try resolve_isbn first and only search every source if it finds nothing.
     """
-    results = []
-    
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        future_google = executor.submit(fetch_google_books, query)
-        future_openlib = executor.submit(fetch_open_library, query)
-        future_itunes = executor.submit(fetch_itunes_books, query)
-        future_kitapyurdu = executor.submit(fetch_kitapyurdu, query)
-        
-        for future in concurrent.futures.as_completed([future_google, future_openlib, future_itunes, future_kitapyurdu]):
-            try:
-                data = future.result()
-                results.extend(data)
-            except Exception as e:
-                print(f"API Error: {e}")
+    hits = resolve_isbn(query)
+    if hits:
+        return _rank_isbn_hits(query, hits)
+    return rank_results(query, ENGINE.search_sync(query))
 
-    # Scoring and Deduplication
-    scored_results = []
-    seen_keys = set()
-    
-    query_lower = query.lower()
-    query_words = [w for w in query_lower.split() if len(w) > 1]
-    
+async def get_book_metadata_async(query):
+    """
+    get_book_metadata for async callers such as Flet async event handlers.
+    """
+    hits = await asyncio.get_running_loop().run_in_executor(None, resolve_isbn, query)
+    if hits:
+        return _rank_isbn_hits(query, hits)
+    return rank_results(query, await ENGINE.search(query))
+
+def stream_book_metadata(query):
+    """
+    Streaming get_book_metadata: yields a list of results each time a
+    provider finishes, scored and sorted like get_book_metadata's.
+    Duplicates of results already yielded are merged into those records,
+    which are then re-scored and yielded again: a batch can hold a record
+    (the same dict) yielded before, whose earlier copy the caller replaces.
+    """
+    hits = resolve_isbn(query)
+    if hits:
+        yield _rank_isbn_hits(query, hits)
+        return
+    clusters = dedup.Clusters()
+    for source, results in ENGINE.stream_sync(query):
+        ranked = _rank_new_results(query, results, clusters)
+        if ranked:
+            yield ranked
+
+async def stream_book_metadata_async(query):
+    """
+    stream_book_metadata for async callers.
+    """
+    hits = await asyncio.get_running_loop().run_in_executor(None, resolve_isbn, query)
+    if hits:
+        yield _rank_isbn_hits(query, hits)
+        return
+    clusters = dedup.Clusters()
+    async for source, results in ENGINE.stream(query):
+        ranked = _rank_new_results(query, results, clusters)
+        if ranked:
+            yield ranked
+
+def rank_results(query, results):
+    """
+    Merges duplicate provider results (see dedup.py) and sorts them by
+    relevance to query, dropping those that score 0 or less.
+    """
+    return _rank_new_results(query, results, dedup.Clusters())
+
+def _rank_new_results(query, results, clusters):
+    # clusters holds the results ranked earlier; duplicates of those are
+    # merged into them, and the records they changed are ranked again
+    records = {}
     for book in results:
-        title = book["title"]
-        author = book["author"]
-        publisher = book["publisher"]
-        
-        # Deduplication Key
-        key = (title.lower(), author.lower())
-        if key in seen_keys:
-            continue
-        seen_keys.add(key)
-        
-        # Calculate Score
-        score = 0
-        title_lower = title.lower()
-        author_lower = author.lower()
-        
-        # Filter out bad results
-        # 1. Corporate Authors
-        bad_authors = ["inc", "corp", "ltd", "studio", "staff", "entertainment", "warner bros"]
-        if any(bad in author_lower for bad in bad_authors):
-            score -= 100 # Heavy penalty
-            
-        # 2. Zero Page Count (unless it's a very strong match otherwise)
-        if book["page_count"] == 0:
-            score -= 20
-        else:
-            score += 10 # Bonus for having page count
-            
-        # 3. Fuzzy Similarity Score (Replaces exact/word match)
-        # Calculates how similar the query is to the title (0-100 points)
-        similarity = difflib.SequenceMatcher(None, query_lower, title_lower).ratio() * 100
-        score += similarity
-        
-        # Extra bonus if it starts with the query
-        if title_lower.startswith(query_lower):
-            score += 20
-
-        # 4. Cover Image Bonus
-        if book["cover_url"]:
-            score += 10
-
-        # 4. Turkish Character Bonus (to further prioritize local content)
-        tr_chars = ['ç', 'ğ', 'ı', 'ö', 'ş', 'ü', 'Ç', 'Ğ', 'I', 'Ö', 'Ş', 'Ü']
-        if any(char in title for char in tr_chars) or any(char in author for char in tr_chars):
-            score += 20
-            
-        # 5. Source Bonus (Kitapyurdu is usually better for Turkish books)
-        if book["source"] == "Kitapyurdu":
-            score += 30
-
-        # 6. Non-Book Item Penalty (Generic filter for all searches)
-        # Filters out coloring books, movie guides, calendars, summaries, etc.
-        non_book_keywords = [
-            "boyama", "film", "rehber", "ajanda", "takvim", "poster", "çıkartma", 
-            "dehlizi", "popüler kültür", "özet", "notlar", "sınav", "hazırlık", 
-            "analiz", "inceleme", "kılavuz"
-        ]
-        if any(keyword in title_lower for keyword in non_book_keywords):
-            score -= 40
-
-        # 7. Generic Author Quality Check
-        # Penalize generic or corporate authors
-        generic_authors = ["kolektif", "komisyon", "editör", "staff", "unknown", "bilinmeyen", "inc", "corp"]
-        if any(gen in author_lower for gen in generic_authors):
-            score -= 15
-            
-        # Store score
-        book["score"] = score
-        scored_results.append(book)
-    
-    # Sort by score descending
+        record = clusters.merge_into(book)
+        records[id(record)] = record
+
+    scored_results = scoring.Scorer(query).score_all(list(records.values()))
     scored_results.sort(key=lambda x: x["score"], reverse=True)
     
     # Filter out very low scores
-    final_results = [b for b in scored_results if b["score"] > 0]
-    
-    return final_results
+    return [b for b in scored_results if b["score"] > 0]
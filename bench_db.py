@@ -0,0 +1,105 @@
+"""
+Micro-benchmark: per-call sqlite3.connect()/close() versus the pooled
+connections of db_manager, on a synthetic 50k-book library. The per-call
+side runs on a copy of the library in SQLite's default rollback-journal
+mode, as library.db was before the WAL storage profile.
+
+Usage: python bench_db.py [book_count] [seconds_per_case]
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+import database
+import db_manager
+
+
+def build_library(path, book_count):
+    db_manager.set_database_path(path)
+    database.init_db()
+    user_id = database.register_user("bench")
+    shelf_id = database.add_shelf("Genel", "", user_id)
+    conn = db_manager.get_connection()
+    with database.transaction():
+        conn.executemany(
+            "INSERT INTO books(title, author, isbn, shelf_id, user_id, page_count) VALUES(?,?,?,?,?,?)",
+            ((f"Kitap {i}", f"Yazar {i % 997}", f"978{i:010d}", shelf_id, user_id, 100 + i % 400) for i in range(book_count))
+        )
+        conn.executemany(
+            "INSERT INTO quotes(book_id, text, page_number) VALUES(?,?,?)",
+            ((1 + i % 50, f"Alıntı {i}", i) for i in range(500))
+        )
+    return user_id
+
+
+def legacy_copy(path, legacy_path):
+    # Closing the pooled connections checkpoints the WAL into the file
+    db_manager.close_all()
+    shutil.copyfile(path, legacy_path)
+    conn = sqlite3.connect(legacy_path)
+    conn.execute("PRAGMA journal_mode = DELETE")
+    conn.close()
+
+
+def legacy_call(path, sql, params, write=False):
+    # What every database.* function did before: open, run, commit, close.
+    conn = sqlite3.connect(path)
+    cur = conn.cursor()
+    cur.execute(sql, params)
+    result = None if write else cur.fetchall()
+    if write:
+        conn.commit()
+    conn.close()
+    return result
+
+
+def run_case(fn, seconds):
+    ops = 0
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        fn()
+        ops += 1
+    return ops / (time.perf_counter() - start)
+
+
+def main():
+    book_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        user_id = build_library(path, book_count)
+        legacy_path = os.path.join(tmp, "legacy.db")
+        legacy_copy(path, legacy_path)
+        print(f"Library: {book_count} books in {path}")
+
+        cases = [
+            ("get_user_goal",
+             lambda: legacy_call(legacy_path, "SELECT reading_goal FROM users WHERE id=?", (user_id,)),
+             lambda: database.get_user_goal(user_id)),
+            ("get_quotes",
+             lambda: legacy_call(legacy_path, "SELECT * FROM quotes WHERE book_id=?", (7,)),
+             lambda: database.get_quotes(7)),
+            ("get_shelves",
+             lambda: legacy_call(legacy_path, "SELECT * FROM shelves WHERE user_id=?", (user_id,)),
+             lambda: database.get_shelves(user_id)),
+            ("add_xp",
+             lambda: legacy_call(legacy_path, "UPDATE users SET xp = xp + ? WHERE id=?", (1, user_id), write=True),
+             lambda: database.add_xp(user_id, 1)),
+        ]
+
+        print(f"{'operation':<16}{'before ops/s':>14}{'after ops/s':>14}{'speedup':>10}")
+        for name, before, after in cases:
+            before_rate = run_case(before, seconds)
+            after_rate = run_case(after, seconds)
+            print(f"{name:<16}{before_rate:>14.0f}{after_rate:>14.0f}{after_rate / before_rate:>9.1f}x")
+
+        db_manager.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark: the old row-by-row CSV import (book_exists + get_shelves + add_book
+per row) versus database.bulk_import_books on a synthetic Goodreads-style CSV.
+The row-by-row side runs the way those functions used to: a new, unpooled
+sqlite3 connection per call on a library in SQLite's default rollback-journal
+mode, committing every insert.
+
+Usage: python bench_import.py [rows] [legacy_rows]
+The legacy loop only runs on the first legacy_rows rows (default 5000) and
+its rate is extrapolated, since it is the slow path being replaced.
+"""
+import csv
+import itertools
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import database
+import db_manager
+import utils
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Title", "Author", "ISBN", "Publisher", "Pages", "Status"])
+        for i in range(rows):
+            # Every 20th row repeats an earlier book to exercise deduplication
+            n = i - 1 if i % 20 == 19 else i
+            writer.writerow([f"Kitap {n}", f"Yazar {n % 5003}", f"978{n:010d}", f"Yayınevi {n % 211}", 100 + n % 500, "Okunacak"])
+
+
+def fresh_library(path):
+    db_manager.set_database_path(path)
+    database.init_db()
+    user_id = database.register_user("bench")
+    database.add_shelf("Genel", "", user_id)
+    return user_id
+
+
+def legacy_library(path):
+    user_id = fresh_library(path)
+    # Back to SQLite's defaults; the pooled connections must be closed first
+    db_manager.close_all()
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = DELETE")
+    conn.close()
+    return user_id
+
+
+def legacy_call(path, sql, params, write=False):
+    # What every database.* function did before db_manager: open, run, commit, close
+    conn = sqlite3.connect(path)
+    cur = conn.cursor()
+    cur.execute(sql, params)
+    result = None if write else cur.fetchall()
+    if write:
+        conn.commit()
+    conn.close()
+    return result
+
+
+def legacy_import(path, user_id, rows):
+    count = skipped = 0
+    for row in rows:
+        # book_exists, get_shelves and add_book as they were
+        if not legacy_call(path, "SELECT id FROM books WHERE user_id=? AND title=? AND author=?", (user_id, row["title"], row["author"])):
+            shelves = legacy_call(path, "SELECT * FROM shelves WHERE user_id=?", (user_id,))
+            shelf_id = shelves[0][0] if shelves else 1
+            legacy_call(
+                path,
+                "INSERT INTO books(title, author, isbn, cover_url, shelf_id, user_id, page_count, publisher, status) VALUES(?,?,?,?,?,?,?,?,?)",
+                (row["title"], row["author"], row["isbn"], "", shelf_id, user_id, row["page_count"], row["publisher"], row["status"]),
+                write=True
+            )
+            count += 1
+        else:
+            skipped += 1
+    return count, skipped
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    legacy_rows = min(rows, int(sys.argv[2]) if len(sys.argv) > 2 else 5000)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "export.csv")
+        write_csv(csv_path, rows)
+        print(f"CSV: {rows} rows, {os.path.getsize(csv_path) / 1e6:.1f} MB")
+
+        legacy_path = os.path.join(tmp, "legacy.db")
+        user_id = legacy_library(legacy_path)
+        with open(csv_path, encoding='utf-8', newline='') as f:
+            start = time.perf_counter()
+            added, skipped = legacy_import(legacy_path, user_id, itertools.islice(utils.read_import_rows(f), legacy_rows))
+            legacy_time = time.perf_counter() - start
+        legacy_rate = legacy_rows / legacy_time
+        print(f"row-by-row: {legacy_rows} rows in {legacy_time:.2f}s ({legacy_rate:.0f} rows/s, "
+              f"~{rows / legacy_rate:.1f}s projected for {rows}) added={added} skipped={skipped}")
+
+        user_id = fresh_library(os.path.join(tmp, "bulk.db"))
+        with open(csv_path, encoding='utf-8', newline='') as f:
+            start = time.perf_counter()
+            added, skipped = database.bulk_import_books(user_id, utils.read_import_rows(f))
+            bulk_time = time.perf_counter() - start
+        bulk_rate = rows / bulk_time
+        print(f"bulk:       {rows} rows in {bulk_time:.2f}s ({bulk_rate:.0f} rows/s) added={added} skipped={skipped}")
+        print(f"speedup: {bulk_rate / legacy_rate:.1f}x")
+
+        db_manager.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Benchmark: per-page parse time of the Kitapyurdu search and product page
+parsers, parsing the whole page with html.parser (the old path) versus the
+strained parse with each installed tree builder.
+
+Usage: python bench_parse.py [pages_dir] [repeats]
+pages_dir holds saved pages named search*.html and product*.html. Without
+it, pages shaped like Kitapyurdu's (navigation, scripts, product carousels)
+are generated.
+"""
+import glob
+import os
+import random
+import statistics
+import sys
+import time
+
+import api
+import html_parsing
+
+FULL_PAGE = None    # parse_only value that parses everything
+
+
+def chrome(rng):
+    # Header, menus and footer: most of a real page's markup
+    links = "".join(
+        f'<li class="menu-item"><a href="/kategori/{i}" title="Kategori {i}"><span>Kategori {i}</span></a></li>'
+        for i in range(400)
+    )
+    scripts = "".join(
+        f'<script type="text/javascript">window.dataLayer=window.dataLayer||[];dataLayer.push({{"id":{i},"v":"{rng.random()}"}});</script>'
+        for i in range(40)
+    )
+    return f'<div id="header"><ul class="menu">{links}</ul></div>{scripts}', f'<div id="footer"><ul>{links}</ul></div>'
+
+
+def product(rng, i, cls="product-cr"):
+    return (
+        f'<div class="{cls}" id="product-{i}">'
+        f'<div class="image"><a href="https://www.kitapyurdu.com/kitap/kitap-{i}/{i}.html">'
+        f'<img src="https://img.kitapyurdu.com/v1/getImage/fn:{i}/wh:true/wi:220" alt="Kitap {i}"></a></div>'
+        f'<div class="name"><a href="https://www.kitapyurdu.com/kitap/kitap-{i}/{i}.html"><span>Kitap Adı {i}</span></a></div>'
+        f'<div class="publisher"><span><a href="/yayinevi/{i % 50}"><span>Yayınevi {i % 50}</span></a></span></div>'
+        f'<div class="author"><span><a href="/yazar/{i % 80}"><span>Yazar {i % 80}</span></a></span></div>'
+        f'<div class="price"><div class="price-old"><span>{rng.randint(50, 300)},00</span></div>'
+        f'<div class="price-new"><span class="value">{rng.randint(30, 200)},50</span></div></div>'
+        f'<div class="rating"><div class="stars" style="width:{rng.randint(0, 100)}%"></div></div>'
+        f'</div>'
+    )
+
+
+def search_page(rng):
+    head, foot = chrome(rng)
+    products = "".join(product(rng, i, "product-cr big") for i in range(20))
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>Arama</title></head><body>'
+        f'{head}<div id="content"><div class="product-grid">{products}</div></div>{foot}</body></html>'
+    )
+
+
+def product_page(rng):
+    head, foot = chrome(rng)
+    description = "".join(f"<p>{' '.join(rng.choice(['roman', 'hayat', 'şehir', 'aşk', 'yol', 'zaman']) for _ in range(60))}</p>" for _ in range(6))
+    attributes = (
+        '<tr><td>Yayın Tarihi:</td><td>12.01.2021</td></tr>'
+        f'<tr><td>ISBN:</td><td>978-975-{rng.randint(100, 999)}-{rng.randint(100, 999)}-1</td></tr>'
+        '<tr><td>Dil:</td><td>TÜRKÇE</td></tr>'
+        f'<tr><td>Sayfa Sayısı:</td><td>{rng.randint(80, 900)}</td></tr>'
+        '<tr><td>Cilt Tipi:</td><td>Karton Kapak</td></tr>'
+    )
+    related = "".join(product(rng, i, "product-cr") for i in range(40))
+    comments = "".join(f'<div class="review"><span class="user">Okur {i}</span><p>Güzel bir kitap.</p></div>' for i in range(30))
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8">'
+        '<meta name="description" content="Kitap açıklaması"><title>Kitap</title></head><body>'
+        f'{head}<div id="content"><div class="pr_details">'
+        f'<div id="description_text" class="info__text">{description}</div>'
+        f'<div class="attributes"><table>{attributes}</table></div></div>'
+        f'<div class="related">{related}</div><div class="reviews">{comments}</div></div>{foot}</body></html>'
+    )
+
+
+def load_pages(pages_dir):
+    pages = {"search": [], "product": []}
+    if pages_dir:
+        for kind in pages:
+            for path in sorted(glob.glob(os.path.join(pages_dir, f"{kind}*.html"))):
+                with open(path, encoding="utf-8") as f:
+                    pages[kind].append(f.read())
+    else:
+        rng = random.Random(7)
+        pages["search"] = [search_page(rng) for _ in range(5)]
+        pages["product"] = [product_page(rng) for _ in range(5)]
+    return pages
+
+
+def time_parse(parse, pages, repeats):
+    timings = []
+    for html in pages:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = parse(html)
+            timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+
+def main():
+    pages_dir = sys.argv[1] if len(sys.argv) > 1 else None
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    pages = load_pages(pages_dir)
+
+    variants = [("html.parser, full page", "html.parser", False), ("html.parser, strained", "html.parser", True)]
+    if html_parsing.PARSER != "html.parser":
+        variants += [(f"{html_parsing.PARSER}, full page", html_parsing.PARSER, False), (f"{html_parsing.PARSER}, strained", html_parsing.PARSER, True)]
+
+    search_parts, detail_parts = api.KITAPYURDU_SEARCH_PARTS, api.KITAPYURDU_DETAIL_PARTS
+    for kind, parse in (("search", api.parse_kitapyurdu_search), ("product", api.parse_kitapyurdu_details)):
+        if not pages[kind]:
+            continue
+        size = statistics.mean(len(html) for html in pages[kind]) / 1024
+        print(f"{kind} pages: {len(pages[kind])}, {size:.0f} KB on average")
+        print(f"  {'parser':<28}{'ms/page':>10}")
+        baseline = None
+        for label, parser, strained in variants:
+            html_parsing.PARSER = parser
+            api.KITAPYURDU_SEARCH_PARTS = search_parts if strained else FULL_PAGE
+            api.KITAPYURDU_DETAIL_PARTS = detail_parts if strained else FULL_PAGE
+            ms, result = time_parse(parse, pages[kind], repeats)
+            if baseline is None:
+                baseline = result
+            # Every variant has to read the same data off the page
+            same = "" if result == baseline else "  (results differ!)"
+            print(f"  {label:<28}{ms:>10.2f}{same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Benchmark: p50/p95 latency of each api.py fetcher and of get_book_metadata
+end to end, with a cold and a warm metadata cache, replayed offline from
+recorded fixtures through replay.ReplayServer.
+
+Usage: python bench_providers.py [--fixtures DIR] [--repeats N]
+                                 [--latency S] [--failure-rate P] [--rate-limits]
+
+Record fixtures first with `python replay.py record QUERY...`. Requests with
+no recording (or every request, with no fixtures at all) are answered with
+synthetic responses shaped like each service's, so the benchmark always runs.
+--latency is the injected delay per response in seconds (Kitapyurdu gets
+twice as much, like the real site); http_client's rate limits are off unless
+--rate-limits is given, since they would dominate repeated runs.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import api
+import bench_parse
+import http_client
+import metadata_cache
+import replay
+
+DEFAULT_QUERIES = ["Kürk Mantolu Madonna", "Sabahattin Ali", "9789750719387", "Tutunamayanlar", "Suç ve Ceza"]
+
+FETCHERS = [
+    ("google", api.fetch_google_books),
+    ("openlibrary", api.fetch_open_library),
+    ("itunes", api.fetch_itunes_books),
+    ("kitapyurdu", api.fetch_kitapyurdu),
+]
+
+
+def synthetic_response(url):
+    # Deterministic per URL, so repeated requests get the same answer
+    rng = random.Random(url)
+    parts = urlsplit(url)
+    params = parse_qs(parts.query)
+    host = parts.netloc
+
+    if host == "www.googleapis.com":
+        term = params.get("q", [""])[0]
+        items = [{"volumeInfo": {
+            "title": f"{term} {i}", "authors": [f"Yazar {i}"], "publisher": "Yayınevi",
+            "industryIdentifiers": [{"type": "ISBN_13", "identifier": f"978975{rng.randint(1000000, 9999999)}"}],
+            "imageLinks": {"thumbnail": f"http://books.google.com/books/content?id={i}"},
+            "description": "Özet " * 80, "pageCount": rng.randint(80, 800), "publishedDate": "2019",
+            "infoLink": f"https://books.google.com/books?id={i}",
+        }} for i in range(rng.randint(5, 40))]
+        return 200, {"Content-Type": "application/json; charset=UTF-8"}, json.dumps({"items": items}).encode("utf-8")
+    if host == "openlibrary.org" and parts.path == "/api/books":
+        key = params.get("bibkeys", [""])[0]
+        book = {
+            "title": f"Kitap {key}", "authors": [{"name": "Yazar"}], "publishers": [{"name": "Yayınevi"}],
+            "number_of_pages": rng.randint(80, 800), "cover": {"large": "https://covers.openlibrary.org/b/id/1-L.jpg"},
+            "url": "https://openlibrary.org/books/OL1M", "publish_date": "2004",
+        }
+        return 200, {"Content-Type": "application/json"}, json.dumps({key: book}).encode("utf-8")
+    if host == "openlibrary.org":
+        term = params.get("q", [""])[0]
+        docs = [{
+            "title": f"{term} {i}", "author_name": [f"Yazar {i}"], "isbn": [f"975{rng.randint(1000000, 9999999)}"],
+            "cover_i": rng.randint(1, 10 ** 7), "number_of_pages_median": rng.randint(80, 800),
+            "publisher": ["Yayınevi"], "publish_date": ["2001"], "key": f"/works/OL{i}W",
+        } for i in range(rng.randint(0, 20))]
+        return 200, {"Content-Type": "application/json"}, json.dumps({"docs": docs}).encode("utf-8")
+    if host == "itunes.apple.com":
+        term = params.get("term", [""])[0]
+        results = [{
+            "trackName": f"{term} {i}", "artistName": f"Yazar {i}", "description": "Özet " * 60,
+            "artworkUrl100": f"https://is1-ssl.mzstatic.com/image/{i}/100x100bb.jpg",
+            "trackViewUrl": f"https://books.apple.com/tr/book/id{i}", "releaseDate": "2015-03-01T08:00:00Z",
+        } for i in range(rng.randint(0, 20))]
+        return 200, {"Content-Type": "text/javascript; charset=utf-8"}, json.dumps({"results": results}).encode("utf-8")
+    if host == "www.kitapyurdu.com":
+        page = bench_parse.search_page(rng) if parts.path == "/index.php" else bench_parse.product_page(rng)
+        return 200, {"Content-Type": "text/html; charset=utf-8"}, page.encode("utf-8")
+    return None
+
+
+def percentiles(timings):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(round(0.95 * (len(timings) - 1))))]
+    return statistics.median(timings), p95
+
+
+def measure(call, queries, repeats, before=None, warm=False):
+    if warm:
+        for query in queries:
+            call(query)
+    timings = []
+    failures = 0
+    for _ in range(repeats):
+        for query in queries:
+            if before:
+                before()
+            start = time.perf_counter()
+            try:
+                call(query)
+            except Exception:
+                failures += 1
+            timings.append((time.perf_counter() - start) * 1000)
+    return percentiles(timings) + (failures,)
+
+
+def clear_metadata_cache():
+    metadata_cache._connection().execute("DELETE FROM lookups")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay provider fixtures and report p50/p95 latency.")
+    parser.add_argument("--fixtures", default=replay.FIXTURE_DIR)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.15, help="injected seconds per response")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of responses answered with a 503")
+    parser.add_argument("--rate-limits", action="store_true", help="keep http_client's per-host rate limits")
+    args = parser.parse_args(argv)
+
+    queries = replay.recorded_queries(args.fixtures) or DEFAULT_QUERIES
+    if not args.rate_limits:
+        http_client.RATE_LIMITS = {}
+    latency = {host: args.latency for host in ("www.googleapis.com", "openlibrary.org", "itunes.apple.com")}
+    latency["www.kitapyurdu.com"] = args.latency * 2
+
+    with tempfile.TemporaryDirectory() as tmp:
+        metadata_cache.CACHE_PATH = os.path.join(tmp, "metadata_cache.db")
+        with replay.ReplayServer(args.fixtures, latency=latency, failure_rate=args.failure_rate,
+                                 fallback=synthetic_response, seed=1) as server:
+            previous = replay.replay_through(server)
+            try:
+                print(f"{len(queries)} queries x {args.repeats}, {args.latency * 1000:.0f} ms injected latency, "
+                      f"{args.failure_rate:.0%} failures")
+                print(f"{'call':<28}{'p50 ms':>10}{'p95 ms':>10}{'failed':>8}")
+                rows = [(name, fetch, None, False) for name, fetch in FETCHERS]
+                rows.append(("get_book_metadata (cold)", api.get_book_metadata, clear_metadata_cache, False))
+                rows.append(("get_book_metadata (cached)", api.get_book_metadata, None, True))
+                for label, call, before, warm in rows:
+                    p50, p95, failures = measure(call, queries, args.repeats, before, warm)
+                    print(f"{label:<28}{p50:>10.1f}{p95:>10.1f}{failures:>8}")
+            finally:
+                http_client.set_transport(previous)
+            if server.missing:
+                print(f"{len(server.missing)} requests had no fixture")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark: the old per-result scoring loop (difflib.SequenceMatcher, keyword
+lists rebuilt for every result) versus scoring.Scorer on a batch the size of
+one search (Google 40+40, Open Library 20, iTunes 20, Kitapyurdu 5).
+
+Usage: python bench_scoring.py [batches]
+Also reports how often both pick the same top results, since the similarity
+metric changed from difflib's ratio to the InDel ratio.
+"""
+import difflib
+import random
+import statistics
+import sys
+import time
+
+import scoring
+
+WORDS = (
+    "kürk mantolu madonna suç ve ceza tutunamayanlar saatleri ayarlama enstitüsü kar "
+    "beyaz kale masumiyet müzesi içimizdeki şeytan sefiller savaş barış yüzyıllık yalnızlık "
+    "dönüşüm simyacı küçük prens harry potter felsefe taşı yüzüklerin efendisi film rehberi "
+    "özet notlar boyama kitabı"
+).split()
+AUTHORS = ["Sabahattin Ali", "Oğuz Atay", "Orhan Pamuk", "Dostoyevski", "Kolektif", "Warner Bros Inc", "J. K. Rowling", "Unknown"]
+SOURCES = [("Google Books", 80), ("Open Library", 20), ("Apple Books", 20), ("Kitapyurdu", 5)]
+QUERIES = ["Kürk Mantolu Madonna", "suç ve ceza", "Harry Potter ve Felsefe Taşı", "tutunamayanlar", "kar"]
+
+
+def candidates(rng):
+    books = []
+    for source, count in SOURCES:
+        for _ in range(count):
+            books.append({
+                "title": " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 8))).title(),
+                "author": rng.choice(AUTHORS),
+                "page_count": rng.choice([0, rng.randint(80, 900)]),
+                "cover_url": rng.choice(["", "http://example.com/c.jpg"]),
+                "source": source,
+            })
+    return books
+
+
+def legacy_score(query, book):
+    # The scoring loop body as it was in api.get_book_metadata
+    title = book["title"]
+    author = book["author"]
+    query_lower = query.lower()
+    score = 0
+    title_lower = title.lower()
+    author_lower = author.lower()
+    bad_authors = ["inc", "corp", "ltd", "studio", "staff", "entertainment", "warner bros"]
+    if any(bad in author_lower for bad in bad_authors):
+        score -= 100
+    if book["page_count"] == 0:
+        score -= 20
+    else:
+        score += 10
+    similarity = difflib.SequenceMatcher(None, query_lower, title_lower).ratio() * 100
+    score += similarity
+    if title_lower.startswith(query_lower):
+        score += 20
+    if book["cover_url"]:
+        score += 10
+    tr_chars = ['ç', 'ğ', 'ı', 'ö', 'ş', 'ü', 'Ç', 'Ğ', 'I', 'Ö', 'Ş', 'Ü']
+    if any(char in title for char in tr_chars) or any(char in author for char in tr_chars):
+        score += 20
+    if book["source"] == "Kitapyurdu":
+        score += 30
+    non_book_keywords = [
+        "boyama", "film", "rehber", "ajanda", "takvim", "poster", "çıkartma",
+        "dehlizi", "popüler kültür", "özet", "notlar", "sınav", "hazırlık",
+        "analiz", "inceleme", "kılavuz"
+    ]
+    if any(keyword in title_lower for keyword in non_book_keywords):
+        score -= 40
+    generic_authors = ["kolektif", "komisyon", "editör", "staff", "unknown", "bilinmeyen", "inc", "corp"]
+    if any(gen in author_lower for gen in generic_authors):
+        score -= 15
+    return score
+
+
+def legacy_batch(query, books):
+    return [legacy_score(query, book) for book in books]
+
+
+def scorer_batch(query, books):
+    scorer = scoring.Scorer(query)
+    return [scorer.score(book) for book in books]
+
+
+def top(books, scores, n=5):
+    order = sorted(range(len(books)), key=lambda i: scores[i], reverse=True)
+    return set(order[:n])
+
+
+def main():
+    batches = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rng = random.Random(3)
+    work = [(rng.choice(QUERIES), candidates(rng)) for _ in range(batches)]
+
+    print(f"{batches} searches of {sum(n for _, n in SOURCES)} results "
+          f"(similarity: {'rapidfuzz' if scoring.Indel else 'bit-parallel LCS'})")
+    print(f"{'scorer':<22}{'ms/search':>12}")
+    results = {}
+    for label, batch in (("difflib loop (old)", legacy_batch), ("scoring.Scorer", scorer_batch)):
+        timings = []
+        results[label] = []
+        for query, books in work:
+            start = time.perf_counter()
+            results[label].append(batch(query, books))
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"{label:<22}{statistics.median(timings):>12.3f}")
+
+    overlap = [
+        len(top(books, old) & top(books, new)) / 5
+        for (query, books), old, new in zip(work, results["difflib loop (old)"], results["scoring.Scorer"])
+    ]
+    print(f"top-5 agreement with the old scores: {statistics.mean(overlap):.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark: database.search_library on a synthetic library with many quotes
+and notes, reporting per-query latency.
+
+Usage: python bench_search.py [quote_count] [repeats]
+"""
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import database
+import db_manager
+
+WORDS = (
+    "kitap okumak zaman ışık gece sabah deniz rüzgâr yol şehir çiçek ağaç ev kapı pencere "
+    "sessizlik hatıra umut korku aşk dost düşman savaş barış insan hayat ölüm kalp akıl ruh "
+    "istanbul anadolu köy dağ nehir yağmur kar güneş ay yıldız gökyüzü toprak su ateş"
+).split()
+SYLLABLES = "ba be bi bo bu da de di du ka ke ki ko ku la le li lo lu ma me mi na ne ni ra re ri sa se si ta te ti ya ye yı".split()
+
+QUERIES = ["ışık", "isik", "cicek", "istanbul gece", "hatıra umut", "ruzgar", "ki", "yıldız gökyüzü deniz"]
+
+
+def vocabulary(rng, size):
+    # Real text is Zipf-distributed: a few words are everywhere, most are rare.
+    words = list(WORDS)
+    while len(words) < size:
+        words.append("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    rng.shuffle(words)
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+    return words, cum_weights
+
+
+def sentence(rng, vocab, length):
+    words, cum_weights = vocab
+    return " ".join(rng.choices(words, cum_weights=cum_weights, k=length)).capitalize() + "."
+
+
+def build_library(path, quote_count):
+    rng = random.Random(42)
+    vocab = vocabulary(rng, 20000)
+    db_manager.set_database_path(path)
+    database.init_db()
+    user_id = database.register_user("bench")
+    shelf_id = database.add_shelf("Genel", "", user_id)
+    book_count = max(1, quote_count // 20)
+    conn = db_manager.get_connection()
+    with database.transaction():
+        conn.executemany(
+            "INSERT INTO books(title, author, shelf_id, user_id, summary, notes) VALUES(?,?,?,?,?,?)",
+            ((sentence(rng, vocab, 3), f"Yazar {i % 997}", shelf_id, user_id, sentence(rng, vocab, 40), sentence(rng, vocab, 20))
+             for i in range(book_count))
+        )
+        conn.executemany(
+            "INSERT INTO quotes(book_id, text, page_number) VALUES(?,?,?)",
+            ((1 + i % book_count, sentence(rng, vocab, 25), i % 400) for i in range(quote_count))
+        )
+    return user_id
+
+
+def main():
+    quote_count = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        user_id = build_library(os.path.join(tmp, "bench.db"), quote_count)
+        print(f"Library: {quote_count} quotes indexed in {time.perf_counter() - start:.1f}s")
+
+        print(f"{'query':<24}{'hits':>6}{'median ms':>12}{'max ms':>10}")
+        for query in QUERIES:
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                hits = database.search_library(user_id, query)
+                timings.append((time.perf_counter() - start) * 1000)
+            print(f"{query:<24}{len(hits):>6}{statistics.median(timings):>12.2f}{max(timings):>10.2f}")
+
+        db_manager.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Runs EXPLAIN QUERY PLAN on every SQL query in database.py against a freshly
+initialised database and fails if any of them scans a whole table.
+
+Usage: python check_query_plans.py [-v]
+"""
+import ast
+import os
+import re
+import sys
+import tempfile
+
+import database
+import db_manager
+
+SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database.py")
+
+SQL_START = re.compile(r"^\s*(SELECT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+NAMED_PARAM = re.compile(r"(?<!:):([A-Za-z_]\w*)")
+FULL_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)(?!\(subquery)(?!.*VIRTUAL TABLE)")
+
+# Functions whose queries are allowed to scan, and why.
+EXEMPT = {
+    "migrate_db": "column probes with LIMIT 1, run once at startup",
+    "get_all_users": "lists every profile; a handful of rows",
+    "get_all_tags": "lists every tag for the tag picker",
+}
+
+
+def collect_queries(path=SOURCE):
+    """
+    Yields (function_name, lineno, sql) for every SQL string literal in the file.
+    """
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+
+    for top in tree.body:
+        # Module-level constants (query tables) are reported as "<module>"
+        name = top.name if isinstance(top, ast.FunctionDef) else "<module>"
+        # Pieces of f-strings aren't complete queries; dynamic_queries() covers those
+        fragments = {id(v) for n in ast.walk(top) if isinstance(n, ast.JoinedStr) for v in n.values}
+        for node in ast.walk(top):
+            if id(node) in fragments:
+                continue
+            if isinstance(node, ast.Constant) and isinstance(node.value, str) and SQL_START.match(node.value):
+                yield name, node.lineno, node.value
+
+
+def dynamic_queries():
+    """
+    Yields (function_name, label, sql, params) for representative variants of
+    the queries database.py assembles at runtime.
+    """
+    last_row = (1, "Kitap", "Yazar", "", 3, 100, "Okunacak", 0)
+    for sort in database.BOOK_SORTS:
+        for search in (None, "ara"):
+            for status in (None, "Okundu"):
+                for after in (None, last_row):
+                    sql, params = database.build_book_query(1, search, status, False, sort, after=after)
+                    label = f"sort={sort} search={bool(search)} status={bool(status)} after={after is not None}"
+                    yield "query_books", label, sql, params
+    # Built with the owner span interpolated
+    span = database.SEARCH_OWNER_SPAN
+    yield "search_library", "SEARCH_QUERY", database.SEARCH_QUERY, ('"ara"*', span, 2 * span, 20)
+
+
+def dummy_params(sql):
+    names = NAMED_PARAM.findall(sql)
+    if names:
+        return {name: None for name in names}
+    return (None,) * sql.count("?")
+
+
+def main():
+    verbose = "-v" in sys.argv
+    failures = 0
+    checked = 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_manager.set_database_path(os.path.join(tmp, "plans.db"))
+        database.init_db()
+        conn = db_manager.get_connection()
+
+        queries = [
+            (func_name, f"database.py:{lineno} {func_name}", sql, dummy_params(sql))
+            for func_name, lineno, sql in collect_queries()
+        ]
+        queries += [
+            (func_name, f"{func_name} ({label})", sql, params)
+            for func_name, label, sql, params in dynamic_queries()
+        ]
+
+        for func_name, label, sql, params in queries:
+            checked += 1
+            plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+            # Scanning a subquery's own (already bounded) output isn't a table scan
+            subqueries = {step.split()[-1] for step in plan if step.startswith(("CO-ROUTINE ", "MATERIALIZE "))}
+            scans = [step for step in plan if FULL_SCAN.match(step) and step.split()[1] not in subqueries]
+
+            if scans and func_name in EXEMPT:
+                if verbose:
+                    print(f"SKIP {label} ({EXEMPT[func_name]})")
+            elif scans:
+                failures += 1
+                print(f"FAIL {label}")
+                print("     " + " ".join(sql.split()))
+                for step in plan:
+                    print(f"     - {step}")
+            elif verbose:
+                print(f"OK   {label}: {'; '.join(plan)}")
+
+        db_manager.close_all()
+
+    print(f"{checked} queries checked, {failures} full table scans")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
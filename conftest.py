@@ -0,0 +1,41 @@
+import pytest
+
+import database
+import db_manager
+import metadata_cache
+
+
+@pytest.fixture
+def db(tmp_path):
+    """
+    A fresh library database with every schema migration applied.
+    """
+    db_manager.set_database_path(str(tmp_path / "library.db"))
+    database.init_db()
+    yield db_manager.get_connection()
+    db_manager.set_database_path(db_manager.DEFAULT_DB_PATH)
+
+
+@pytest.fixture
+def user(db):
+    """
+    (user_id, shelf_id) of a user with one shelf.
+    """
+    database.add_user("okur", "")
+    user_id = database.get_all_users()[0][0]
+    database.add_shelf("Okunacaklar", "", user_id)
+    return user_id, database.get_shelves(user_id)[0][0]
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """
+    An empty metadata cache in tmp_path.
+    """
+    monkeypatch.setattr(metadata_cache, "CACHE_PATH", str(tmp_path / "metadata_cache.db"))
+    monkeypatch.setattr(metadata_cache, "_schema_ready", False)
+    yield metadata_cache
+    if metadata_cache._executor is not None:
+        metadata_cache._executor.shutdown(wait=True)
+        metadata_cache._executor = None
+    db_manager.close_all()
@@ -0,0 +1,240 @@
+"""
+On-disk cover cache. Each cover is downloaded (or read, for local files)
+once, stored under the SHA-256 of its bytes as grid- and detail-sized JPEG
+thumbnails, and evicted least-recently-used first when the cache grows past
+MAX_CACHE_BYTES.
+
+UI code calls cover_src(url, size, on_ready): it returns a local path right
+away (the thumbnail, or a placeholder while the download runs in the
+background) and calls on_ready(path) once the thumbnail exists.
+"""
+import hashlib
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageDraw
+
+import db_manager
+import http_client
+
+# Where thumbnails and their index live; override with LIBRIS_COVERS.
+CACHE_DIR = os.environ.get("LIBRIS_COVERS", "covers")
+MAX_CACHE_BYTES = 200 * 1024 * 1024
+
+# Bounding boxes in pixels, about 2x the on-screen size for high-DPI displays
+SIZES = {
+    "grid": (320, 480),
+    "detail": (600, 900),
+}
+JPEG_QUALITY = 85
+
+_executor = None
+_pending = {}       # url -> Future of a running download
+_memo = {}          # (url, size) -> thumbnail path known to exist
+_touched = set()    # paths whose last_used was already bumped this run
+_failed = set()     # urls that couldn't be fetched this run; not retried
+_lock = threading.Lock()
+_schema_ready = False
+
+
+def _index_path():
+    return os.path.join(CACHE_DIR, "index.db")
+
+
+def _index():
+    # The index is a small SQLite file next to the thumbnails, on the same
+    # pooled per-thread connections as the library.
+    global _schema_ready
+    path = _index_path()
+    if not _schema_ready:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with db_manager.transaction(path) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS urls (url text PRIMARY KEY, digest text NOT NULL)")
+            conn.execute("""CREATE TABLE IF NOT EXISTS files (
+                                path text PRIMARY KEY,
+                                digest text NOT NULL,
+                                bytes integer NOT NULL,
+                                last_used real NOT NULL
+                            )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_files_last_used ON files(last_used)")
+        _schema_ready = True
+    return db_manager.get_connection(path)
+
+
+def _thumbnail_path(digest, size):
+    return os.path.abspath(os.path.join(CACHE_DIR, digest[:2], f"{digest}-{size}.jpg"))
+
+
+def _touch(conn, path):
+    # One write per thumbnail per run is enough to keep the LRU order useful
+    if path not in _touched:
+        _touched.add(path)
+        conn.execute("UPDATE files SET last_used=? WHERE path=?", (time.time(), path))
+
+
+def cached_cover(url, size="grid"):
+    """
+    Returns the local thumbnail path for url if it is cached, else None.
+    Never touches the network.
+    """
+    if not url:
+        return placeholder(size)
+    path = _memo.get((url, size))
+    if path is None or not os.path.exists(path):
+        conn = _index()
+        row = conn.execute("SELECT digest FROM urls WHERE url=?", (url,)).fetchone()
+        if row is None:
+            return None
+        path = _thumbnail_path(row[0], size)
+        if not os.path.exists(path):
+            return None
+        _memo[(url, size)] = path
+    _touch(_index(), path)
+    return path
+
+
+def _read_source(url):
+    if url.startswith(("http://", "https://")):
+        response = http_client.get(url, timeout=10)
+        response.raise_for_status()
+        return response.content
+    # Covers picked from disk are stored as plain file paths
+    with open(url, "rb") as f:
+        return f.read()
+
+
+def _write_thumbnails(data, digest):
+    image = Image.open(io.BytesIO(data))
+    # JPEG can decode straight at a reduced scale, which is much cheaper
+    image.draft("RGB", SIZES["detail"])
+    image = image.convert("RGB")
+
+    written = []
+    for size, box in SIZES.items():
+        path = _thumbnail_path(digest, size)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        thumb = image.copy()
+        thumb.thumbnail(box, Image.LANCZOS)
+        tmp = path + ".tmp"
+        thumb.save(tmp, "JPEG", quality=JPEG_QUALITY, optimize=True)
+        os.replace(tmp, path)
+        written.append((path, os.path.getsize(path)))
+    return written
+
+
+def fetch_cover(url, size="grid"):
+    """
+    Returns the thumbnail path for url, downloading and resizing it first if
+    it isn't cached. Raises requests/OSError/PIL errors on failure.
+    """
+    path = cached_cover(url, size)
+    if path:
+        return path
+
+    data = _read_source(url)
+    digest = hashlib.sha256(data).hexdigest()
+    # Identical images from different URLs share one set of thumbnails
+    if all(os.path.exists(_thumbnail_path(digest, s)) for s in SIZES):
+        written = []
+    else:
+        written = _write_thumbnails(data, digest)
+
+    now = time.time()
+    with db_manager.transaction(_index_path()) as conn:
+        conn.execute("INSERT OR REPLACE INTO urls(url, digest) VALUES(?,?)", (url, digest))
+        conn.executemany(
+            "INSERT OR REPLACE INTO files(path, digest, bytes, last_used) VALUES(?,?,?,?)",
+            [(p, digest, n, now) for p, n in written]
+        )
+    _evict(keep=digest)
+    return cached_cover(url, size)
+
+
+def _evict(keep):
+    conn = _index()
+    total = conn.execute("SELECT IFNULL(SUM(bytes), 0) FROM files").fetchone()[0]
+    if total <= MAX_CACHE_BYTES:
+        return
+    # Trim to 90% so a full cache doesn't evict on every new cover
+    target = MAX_CACHE_BYTES * 0.9
+    removed = []
+    for path, size in conn.execute("SELECT path, bytes FROM files WHERE digest != ? ORDER BY last_used", (keep,)):
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        removed.append((path,))
+        total -= size
+    with db_manager.transaction(_index_path()) as conn:
+        conn.executemany("DELETE FROM files WHERE path=?", removed)
+        # URLs whose thumbnails are all gone are simply fetched again next time
+        conn.execute("DELETE FROM urls WHERE digest NOT IN (SELECT digest FROM files)")
+
+
+def placeholder(size="grid"):
+    """
+    Returns the path of a locally drawn "no cover" image.
+    """
+    path = os.path.abspath(os.path.join(CACHE_DIR, f"placeholder-{size}.jpg"))
+    if not os.path.exists(path):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        width, height = SIZES[size]
+        img = Image.new("RGB", (width, height), (48, 48, 48))
+        draw = ImageDraw.Draw(img)
+        # A simple book outline
+        draw.rectangle([width * 0.3, height * 0.3, width * 0.7, height * 0.7], outline=(90, 90, 90), width=max(2, width // 80))
+        draw.line([width * 0.36, height * 0.3, width * 0.36, height * 0.7], fill=(90, 90, 90), width=max(2, width // 80))
+        tmp = path + ".tmp"
+        img.save(tmp, "JPEG", quality=JPEG_QUALITY)
+        os.replace(tmp, path)
+    return path
+
+
+def request_cover(url, size="grid", on_ready=None):
+    """
+    Downloads url in the background; on_ready(path) is called from a worker
+    thread once the thumbnail is on disk. Concurrent requests for the same
+    URL share one download. Failures are logged and on_ready is not called.
+    """
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="covers")
+        future = _pending.get(url)
+        if future is None:
+            future = _pending[url] = _executor.submit(fetch_cover, url, size)
+
+    def done(f):
+        with _lock:
+            _pending.pop(url, None)
+        try:
+            f.result()
+        except Exception as e:
+            _failed.add(url)
+            print(f"Cover download failed for {url}: {e}")
+            return
+        path = cached_cover(url, size)
+        if on_ready and path:
+            on_ready(path)
+
+    future.add_done_callback(done)
+    return future
+
+
+def cover_src(url, size="grid", on_ready=None):
+    """
+    Returns a local path for an ft.Image src: the cached thumbnail, or the
+    placeholder while the cover is fetched in the background (on_ready(path)
+    is called when it arrives).
+    """
+    path = cached_cover(url, size)
+    if path:
+        return path
+    if url not in _failed:
+        request_cover(url, size, on_ready)
+    return placeholder(size)
@@ -1,10 +1,347 @@
 import sqlite3
-import hashlib
+import json
+import re
+import unicodedata
+import datetime
+import db_manager
+
+# Multi-statement writes use this to commit once; see db_manager.transaction.
+transaction = db_manager.transaction
+
+# Turkish-aware case and dotted/dotless i folding, so "kirmizi", "KIRMIZI"
+# and "Kırmızı" compare equal. Registered as fold() for SQL.
+_FOLD_MAP = str.maketrans({"İ": "i", "I": "i", "ı": "i"})
+
+def fold_text(text):
+    if text is None:
+        return None
+    return text.translate(_FOLD_MAP).lower()
+
+db_manager.register_function("fold", 1, fold_text)
+
+# Full-text index over books, quotes and vocabulary (see search_library).
+# search_index is a contentless FTS5 table: it keeps only the token index, and
+# each rowid encodes its source row as id * 4 + kind. Since v9 the rowid also
+# carries the id of the user the row belongs to (0 for none), as
+# owner * SEARCH_OWNER_SPAN + id * 4 + kind, so each user's rows form one
+# rowid range that a search can seek to.
+SEARCH_KINDS = {1: "book", 2: "quote", 3: "word"}
+SEARCH_OWNER_SPAN = 1 << 40
+
+# kind: (table, columns that feed the index, title expression, body expression)
+_SEARCH_DOCS = {
+    1: ("books", "title, author, publisher, summary, notes", "{r}.title",
+        "IFNULL({r}.author, '') || char(10) || IFNULL({r}.publisher, '') || char(10) || "
+        "IFNULL({r}.summary, '') || char(10) || IFNULL({r}.notes, '')"),
+    2: ("quotes", "text", "''", "{r}.text"),
+    3: ("vocabulary", "word, definition, sentence", "{r}.word",
+        "IFNULL({r}.definition, '') || char(10) || IFNULL({r}.sentence, '')"),
+}
+
+def _search_index_statements():
+    # unicode61 already folds case (I and İ become i) and, with
+    # remove_diacritics 2, ç/ş/ğ/ö/ü; only the dotless ı has to be mapped by
+    # hand. Contentless deletes must repeat the indexed values exactly, so the
+    # triggers and the backfill share one expression per source table.
+    statements = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        "title, body, content='', prefix='2', tokenize='unicode61 remove_diacritics 2')"
+    ]
+    for kind, (table, columns, title, body) in _SEARCH_DOCS.items():
+        def values(r):
+            return (f"{r}.id * 4 + {kind}, replace({title.format(r=r)}, 'ı', 'i'), "
+                    f"replace({body.format(r=r)}, 'ı', 'i')")
+        insert = f"INSERT INTO search_index(rowid, title, body) VALUES({values('new')});"
+        delete = f"INSERT INTO search_index(search_index, rowid, title, body) VALUES('delete', {values('old')});"
+        statements += [
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_ai AFTER INSERT ON {table} BEGIN {insert} END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_ad AFTER DELETE ON {table} BEGIN {delete} END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_au AFTER UPDATE OF {columns} ON {table} BEGIN {delete} {insert} END",
+            f"INSERT INTO search_index(rowid, title, body) SELECT {values(table)} FROM {table}",
+        ]
+    return statements
+
+# Owner of each kind's rows; quotes and vocabulary belong to their book's user
+_SEARCH_OWNERS = {
+    1: "{r}.user_id",
+    2: "(SELECT user_id FROM books WHERE id = {r}.book_id)",
+    3: "(SELECT user_id FROM books WHERE id = {r}.book_id)",
+}
+
+def _owned_search_index_statements():
+    # Rebuilds search_index with the owner in every rowid. A row has to be
+    # deleted under the rowid it was indexed with, so when a book changes
+    # hands, is deleted or is inserted over an id that orphaned quotes still
+    # point at, its quotes and vocabulary are re-indexed under the new owner.
+    statements = [f"DROP TRIGGER IF EXISTS {table}_search_{event}"
+                  for table, *_ in _SEARCH_DOCS.values() for event in ("ai", "ad", "au")]
+    statements += [
+        "DROP TABLE IF EXISTS search_index",
+        "CREATE VIRTUAL TABLE search_index USING fts5("
+        "title, body, content='', prefix='2', tokenize='unicode61 remove_diacritics 2')",
+    ]
+
+    def values(kind, r, owner=None):
+        _, _, title, body = _SEARCH_DOCS[kind]
+        owner = owner or f"IFNULL({_SEARCH_OWNERS[kind].format(r=r)}, 0)"
+        return (f"{owner} * {SEARCH_OWNER_SPAN} + {r}.id * 4 + {kind}, "
+                f"replace({title.format(r=r)}, 'ı', 'i'), replace({body.format(r=r)}, 'ı', 'i')")
+
+    def insert(kind, r):
+        return f"INSERT INTO search_index(rowid, title, body) VALUES({values(kind, r)});"
+
+    def delete(kind, r):
+        return f"INSERT INTO search_index(search_index, rowid, title, body) VALUES('delete', {values(kind, r)});"
+
+    def reown(book, old_owner, new_owner, when=None):
+        # Moves the book's quotes and vocabulary from old_owner to new_owner
+        sql = ""
+        for kind in (2, 3):
+            table = _SEARCH_DOCS[kind][0]
+            source = f"FROM {table} c WHERE c.book_id = {book}.id" + (f" AND {when}" if when else "")
+            sql += (f"INSERT INTO search_index(search_index, rowid, title, body) "
+                    f"SELECT 'delete', {values(kind, 'c', old_owner)} {source}; "
+                    f"INSERT INTO search_index(rowid, title, body) SELECT {values(kind, 'c', new_owner)} {source}; ")
+        return sql
+
+    owner_changed = "IFNULL(old.user_id, 0) != IFNULL(new.user_id, 0)"
+    extra = {
+        "ai": reown("new", "0", "IFNULL(new.user_id, 0)"),
+        "ad": reown("old", "IFNULL(old.user_id, 0)", "0"),
+        "au": reown("new", "IFNULL(old.user_id, 0)", "IFNULL(new.user_id, 0)", owner_changed),
+    }
+    for kind, (table, columns, _, _) in _SEARCH_DOCS.items():
+        # The owner comes from books.user_id, or from the book a row points at
+        owner_column = "user_id" if kind == 1 else "book_id"
+        children = extra if kind == 1 else {}
+        statements += [
+            f"CREATE TRIGGER {table}_search_ai AFTER INSERT ON {table} "
+            f"BEGIN {insert(kind, 'new')} {children.get('ai', '')}END",
+            f"CREATE TRIGGER {table}_search_ad AFTER DELETE ON {table} "
+            f"BEGIN {delete(kind, 'old')} {children.get('ad', '')}END",
+            f"CREATE TRIGGER {table}_search_au AFTER UPDATE OF {columns}, {owner_column} ON {table} "
+            f"BEGIN {delete(kind, 'old')} {insert(kind, 'new')} {children.get('au', '')}END",
+            f"INSERT INTO search_index(rowid, title, body) SELECT {values(kind, table)} FROM {table}",
+        ]
+    return statements
+
+# Per-user daily reading rollups (see get_daily_stats), kept in step with
+# reading_sessions and finished books by triggers, so every write path
+# (add_reading_session, imports, edits, deletes) maintains them.
+#
+# day is the local date, as start_time and finish_date are. A finished book
+# counts on its finish_date; books finished without a date only count in
+# the shelf and status totals.
+def _finish_day(r):
+    return (f"CASE WHEN {r}.status = 'Okundu' THEN CASE "
+            f"WHEN {r}.finish_date GLOB '[0-9][0-9].[0-9][0-9].[0-9][0-9][0-9][0-9]' "
+            f"THEN substr({r}.finish_date, 7, 4) || '-' || substr({r}.finish_date, 4, 2) || '-' || substr({r}.finish_date, 1, 2) "
+            f"WHEN {r}.finish_date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*' "
+            f"THEN substr({r}.finish_date, 1, 10) END END")
+
+def _daily_stats_statements():
+    session_user = "(SELECT user_id FROM books WHERE id = {r}.book_id)"
+    session_day = "substr({r}.start_time, 1, 10)"
+    # Rows that drop back to nothing are removed, so a day's row exists only
+    # if something happened on it
+    def prune(user, day):
+        return f"DELETE FROM daily_stats WHERE user_id = {user} AND day = {day} AND sessions = 0 AND books_finished = 0;"
+
+    def add_session(r):
+        return (f"INSERT INTO daily_stats(user_id, day, minutes, pages, sessions) "
+                f"SELECT user_id, {session_day.format(r=r)}, IFNULL({r}.duration_minutes, 0), IFNULL({r}.pages_read, 0), 1 "
+                f"FROM books WHERE id = {r}.book_id AND user_id IS NOT NULL AND {r}.start_time IS NOT NULL "
+                f"ON CONFLICT(user_id, day) DO UPDATE SET minutes = minutes + excluded.minutes, "
+                f"pages = pages + excluded.pages, sessions = sessions + 1;")
+
+    def remove_session(r):
+        user, day = session_user.format(r=r), session_day.format(r=r)
+        return (f"UPDATE daily_stats SET minutes = minutes - IFNULL({r}.duration_minutes, 0), "
+                f"pages = pages - IFNULL({r}.pages_read, 0), sessions = sessions - 1 "
+                f"WHERE user_id = {user} AND day = {day};" + prune(user, day))
+
+    def add_finished(r):
+        return (f"INSERT INTO daily_stats(user_id, day, books_finished) "
+                f"SELECT {r}.user_id, {_finish_day(r)}, 1 WHERE {r}.user_id IS NOT NULL AND {_finish_day(r)} IS NOT NULL "
+                f"ON CONFLICT(user_id, day) DO UPDATE SET books_finished = books_finished + 1;")
+
+    def remove_finished(r):
+        user, day = f"{r}.user_id", _finish_day(r)
+        return (f"UPDATE daily_stats SET books_finished = books_finished - 1 "
+                f"WHERE user_id = {user} AND day = {day};" + prune(user, day))
+
+    return [
+        """CREATE TABLE IF NOT EXISTS daily_stats (
+               user_id integer NOT NULL,
+               day text NOT NULL,
+               minutes integer NOT NULL DEFAULT 0,
+               pages integer NOT NULL DEFAULT 0,
+               sessions integer NOT NULL DEFAULT 0,
+               books_finished integer NOT NULL DEFAULT 0,
+               PRIMARY KEY (user_id, day)
+           ) WITHOUT ROWID""",
+        f"CREATE TRIGGER IF NOT EXISTS reading_sessions_stats_ai AFTER INSERT ON reading_sessions BEGIN {add_session('new')} END",
+        f"CREATE TRIGGER IF NOT EXISTS reading_sessions_stats_ad AFTER DELETE ON reading_sessions BEGIN {remove_session('old')} END",
+        f"CREATE TRIGGER IF NOT EXISTS reading_sessions_stats_au AFTER UPDATE ON reading_sessions "
+        f"BEGIN {remove_session('old')} {add_session('new')} END",
+        f"CREATE TRIGGER IF NOT EXISTS books_stats_ai AFTER INSERT ON books BEGIN {add_finished('new')} END",
+        # Most edits save the status unchanged; only a different finish day matters
+        f"CREATE TRIGGER IF NOT EXISTS books_stats_au AFTER UPDATE OF status, finish_date, user_id ON books "
+        f"WHEN ({_finish_day('old')}) IS NOT ({_finish_day('new')}) OR old.user_id IS NOT new.user_id "
+        f"BEGIN {remove_finished('old')} {add_finished('new')} END",
+        # A book changing owner (register_user adopting orphan books) takes
+        # its sessions' totals along
+        """CREATE TRIGGER IF NOT EXISTS books_stats_owner_au AFTER UPDATE OF user_id ON books
+           WHEN old.user_id IS NOT new.user_id
+           BEGIN
+               UPDATE daily_stats SET
+                   minutes = minutes - (SELECT IFNULL(SUM(duration_minutes), 0) FROM reading_sessions
+                                        WHERE book_id = old.id AND substr(start_time, 1, 10) = daily_stats.day),
+                   pages = pages - (SELECT IFNULL(SUM(pages_read), 0) FROM reading_sessions
+                                    WHERE book_id = old.id AND substr(start_time, 1, 10) = daily_stats.day),
+                   sessions = sessions - (SELECT COUNT(*) FROM reading_sessions
+                                          WHERE book_id = old.id AND substr(start_time, 1, 10) = daily_stats.day)
+               WHERE user_id = old.user_id
+                 AND day IN (SELECT substr(start_time, 1, 10) FROM reading_sessions WHERE book_id = old.id);
+               DELETE FROM daily_stats
+               WHERE user_id = old.user_id AND sessions = 0 AND books_finished = 0
+                 AND day IN (SELECT substr(start_time, 1, 10) FROM reading_sessions WHERE book_id = old.id);
+               INSERT INTO daily_stats(user_id, day, minutes, pages, sessions)
+               SELECT new.user_id, substr(start_time, 1, 10), IFNULL(SUM(duration_minutes), 0), IFNULL(SUM(pages_read), 0), COUNT(*)
+               FROM reading_sessions
+               WHERE book_id = new.id AND new.user_id IS NOT NULL AND start_time IS NOT NULL
+               GROUP BY substr(start_time, 1, 10)
+               ON CONFLICT(user_id, day) DO UPDATE SET minutes = minutes + excluded.minutes,
+                   pages = pages + excluded.pages, sessions = sessions + excluded.sessions;
+           END""",
+        # reading_sessions declares ON DELETE CASCADE, but foreign keys are
+        # off; deleting the sessions here also takes them out of the rollup
+        # while the book (and so its user) can still be looked up.
+        f"CREATE TRIGGER IF NOT EXISTS books_stats_bd BEFORE DELETE ON books "
+        f"BEGIN DELETE FROM reading_sessions WHERE book_id = old.id; {remove_finished('old')} END",
+        # Backfill from the sessions and books already there
+        f"""INSERT INTO daily_stats(user_id, day, minutes, pages, sessions, books_finished)
+            SELECT user_id, day, SUM(minutes), SUM(pages), SUM(sessions), SUM(books_finished)
+            FROM (
+                SELECT b.user_id, substr(rs.start_time, 1, 10) AS day, IFNULL(rs.duration_minutes, 0) AS minutes,
+                       IFNULL(rs.pages_read, 0) AS pages, 1 AS sessions, 0 AS books_finished
+                FROM reading_sessions rs
+                JOIN books b ON b.id = rs.book_id
+                WHERE b.user_id IS NOT NULL AND rs.start_time IS NOT NULL
+                UNION ALL
+                SELECT user_id, {_finish_day('books')}, 0, 0, 0, 1
+                FROM books
+                WHERE user_id IS NOT NULL AND {_finish_day('books')} IS NOT NULL
+            )
+            GROUP BY user_id, day""",
+    ]
+
+def unit_of_work():
+    """
+    Groups several database.* calls into one atomic commit:
+
+        with database.unit_of_work():
+            database.update_book_progress(book_id, page)
+            database.add_reading_session(book_id, ...)
+
+    Either every statement in the block is written or none is.
+    """
+    return transaction()
+
+# Versioned schema changes, tracked with PRAGMA user_version.
+# Each (version, statements) entry runs once, in order, inside one transaction.
+SCHEMA_MIGRATIONS = [
+    (1, [
+        # get_books / delete_user / get_user_reading_sessions join
+        "CREATE INDEX IF NOT EXISTS idx_books_user_shelf ON books(user_id, shelf_id)",
+        # check_book_exists
+        "CREATE INDEX IF NOT EXISTS idx_books_user_isbn ON books(user_id, isbn)",
+        # book_exists
+        "CREATE INDEX IF NOT EXISTS idx_books_user_title_author ON books(user_id, title, author)",
+        # get_shelf_book_count / delete_shelf
+        "CREATE INDEX IF NOT EXISTS idx_books_shelf ON books(shelf_id)",
+        "CREATE INDEX IF NOT EXISTS idx_shelves_user ON shelves(user_id)",
+        # get_reading_sessions (ORDER BY start_time is served by the index too)
+        "CREATE INDEX IF NOT EXISTS idx_sessions_book_start ON reading_sessions(book_id, start_time)",
+        "CREATE INDEX IF NOT EXISTS idx_quotes_book ON quotes(book_id)",
+        "CREATE INDEX IF NOT EXISTS idx_vocabulary_book ON vocabulary(book_id)",
+        # book_tags' primary key covers book_id lookups; this one covers tag_id
+        "CREATE INDEX IF NOT EXISTS idx_book_tags_tag ON book_tags(tag_id)",
+    ]),
+    (2, [
+        # query_books: one index per sort order so pages are read in order
+        "CREATE INDEX IF NOT EXISTS idx_books_user ON books(user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_books_user_title_nocase ON books(user_id, title COLLATE NOCASE)",
+        "CREATE INDEX IF NOT EXISTS idx_books_user_rating ON books(user_id, IFNULL(rating, 0))",
+    ]),
+    # search_library: FTS5 index kept in sync by triggers, backfilled once
+    (3, _search_index_statements()),
+    # enrich.py: where each user's enrichment run got to, and its totals
+    (4, [
+        """CREATE TABLE IF NOT EXISTS enrichment_progress (
+               user_id integer PRIMARY KEY,
+               last_book_id integer NOT NULL DEFAULT 0,
+               checked integer NOT NULL DEFAULT 0,
+               enriched integer NOT NULL DEFAULT 0,
+               failed integer NOT NULL DEFAULT 0,
+               updated_at text
+           )""",
+    ]),
+    # get_reading_totals / get_daily_stats: per-user daily rollups
+    (5, _daily_stats_statements()),
+    # get_current_streak: streak state kept by add_reading_session
+    (6, [
+        """CREATE TABLE IF NOT EXISTS reading_streaks (
+               user_id integer PRIMARY KEY,
+               current_streak integer NOT NULL DEFAULT 0,
+               longest_streak integer NOT NULL DEFAULT 0,
+               last_day text
+           )""",
+        # Consecutive days share julianday(day) - row number, so each
+        # (user_id, grp) group is one streak; the bare columns come from the
+        # row with MAX(last_day), i.e. the latest streak
+        """INSERT INTO reading_streaks(user_id, current_streak, longest_streak, last_day)
+           SELECT user_id, length, longest, MAX(last_day)
+           FROM (
+               SELECT user_id, MAX(day) AS last_day, COUNT(*) AS length,
+                      MAX(COUNT(*)) OVER (PARTITION BY user_id) AS longest
+               FROM (
+                   SELECT user_id, day, julianday(day) - ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY day) AS grp
+                   FROM daily_stats
+                   WHERE sessions > 0 AND julianday(day) IS NOT NULL
+               )
+               GROUP BY user_id, grp
+           )
+           GROUP BY user_id""",
+    ]),
+    # get_shelf_summary: one index-only GROUP BY over the user's books. The
+    # new index starts with the same columns, so it replaces the old one.
+    (7, [
+        "ALTER TABLE books ADD COLUMN added_at text",
+        "DROP INDEX IF EXISTS idx_books_user_shelf",
+        "CREATE INDEX IF NOT EXISTS idx_books_user_shelf_summary ON books(user_id, shelf_id, status, page_count, rating, added_at)",
+    ]),
+    # enrich.py: books whose lookup failed, retried at the start of the next run
+    (8, [
+        """CREATE TABLE IF NOT EXISTS enrichment_failures (
+               user_id integer NOT NULL,
+               book_id integer NOT NULL,
+               PRIMARY KEY (user_id, book_id)
+           ) WITHOUT ROWID""",
+    ]),
+    # search_library: search_index rebuilt with an owner column, so a
+    # search matches and ranks only the user's own rows
+    (9, _owned_search_index_statements()),
+]
 
 def create_connection():
+    """
+    Returns the calling thread's pooled connection (see db_manager).
+    Callers must not close it.
+    """
     conn = None
     try:
-        conn = sqlite3.connect('library.db')
+        conn = db_manager.get_connection()
         return conn
     except sqlite3.Error as e:
         print(e)
@@ -24,12 +361,8 @@ def add_user_columns():
         c.execute("ALTER TABLE users ADD COLUMN reading_goal INTEGER DEFAULT 20")
     except sqlite3.OperationalError:
         pass
-    conn.commit()
-    conn.close()
 
 def init_db():
-    database = "library.db"
-
     sql_create_users_table = """ CREATE TABLE IF NOT EXISTS users (
                                     id integer PRIMARY KEY,
                                     username text NOT NULL UNIQUE,
@@ -132,8 +465,6 @@ def init_db():
         migrate_db(conn)
         add_user_columns()
         add_xp_column()
-        
-        conn.close()
     else:
         print("Error! cannot create the database connection.")
 
@@ -190,29 +521,38 @@ def migrate_db(conn):
             print(f"Added column {col_name}")
         except sqlite3.OperationalError:
             pass # Column likely exists
-    
-    conn.commit()
+
+    apply_schema_migrations(conn)
+
+def apply_schema_migrations(conn):
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, statements in SCHEMA_MIGRATIONS:
+        if version <= current:
+            continue
+        with transaction():
+            for statement in statements:
+                conn.execute(statement)
+            # PRAGMA doesn't take parameters; version is an int from the table above.
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+        print(f"Applied schema version {version}")
 
 def register_user(username):
-    conn = create_connection()
     # Password is no longer used, storing empty string for compatibility
     try:
-        sql = ''' INSERT INTO users(username, password) VALUES(?,?) '''
-        cur = conn.cursor()
-        cur.execute(sql, (username, ""))
-        conn.commit()
-        user_id = cur.lastrowid
-        
-        # Assign orphan data to first user
-        if user_id == 1:
-            cur.execute("UPDATE shelves SET user_id = ? WHERE user_id IS NULL", (user_id,))
-            cur.execute("UPDATE books SET user_id = ? WHERE user_id IS NULL", (user_id,))
-            conn.commit()
-            
-        conn.close()
+        with transaction() as conn:
+            sql = ''' INSERT INTO users(username, password) VALUES(?,?) '''
+            cur = conn.cursor()
+            cur.execute(sql, (username, ""))
+            user_id = cur.lastrowid
+
+            # Assign orphan data to first user
+            if user_id == 1:
+                cur.execute("UPDATE shelves SET user_id = ? WHERE user_id IS NULL", (user_id,))
+                cur.execute("UPDATE books SET user_id = ? WHERE user_id IS NULL", (user_id,))
+                repair_streak(user_id)
+
         return user_id
     except sqlite3.IntegrityError:
-        conn.close()
         return None
 
 def login_user(username):
@@ -220,7 +560,6 @@ def login_user(username):
     cur = conn.cursor()
     cur.execute("SELECT * FROM users WHERE username=?", (username,))
     user = cur.fetchone()
-    conn.close()
     return user
 
 def get_all_users():
@@ -228,7 +567,6 @@ def get_all_users():
     c = conn.cursor()
     c.execute("SELECT * FROM users")
     users = c.fetchall()
-    conn.close()
     return users
 
 def update_reading_goal(user_id, goal):
@@ -236,21 +574,19 @@ def update_reading_goal(user_id, goal):
     c = conn.cursor()
     try:
         c.execute("UPDATE users SET reading_goal = ? WHERE id = ?", (goal, user_id))
-        conn.commit()
     except sqlite3.Error as e:
         print(e)
-    finally:
-        conn.close()
 
 def delete_user(user_id):
-    conn = create_connection()
-    cur = conn.cursor()
-    # Delete user's books and shelves first (cascade manually if needed)
-    cur.execute("DELETE FROM books WHERE user_id=?", (user_id,))
-    cur.execute("DELETE FROM shelves WHERE user_id=?", (user_id,))
-    cur.execute("DELETE FROM users WHERE id=?", (user_id,))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cur = conn.cursor()
+        # Delete user's books and shelves first (cascade manually if needed)
+        cur.execute("DELETE FROM books WHERE user_id=?", (user_id,))
+        cur.execute("DELETE FROM shelves WHERE user_id=?", (user_id,))
+        cur.execute("DELETE FROM enrichment_progress WHERE user_id=?", (user_id,))
+        cur.execute("DELETE FROM enrichment_failures WHERE user_id=?", (user_id,))
+        cur.execute("DELETE FROM reading_streaks WHERE user_id=?", (user_id,))
+        cur.execute("DELETE FROM users WHERE id=?", (user_id,))
 
 def add_shelf(name, description, user_id):
     conn = create_connection()
@@ -258,8 +594,6 @@ def add_shelf(name, description, user_id):
               VALUES(?,?,?) '''
     cur = conn.cursor()
     cur.execute(sql, (name, description, user_id))
-    conn.commit()
-    conn.close()
     return cur.lastrowid
 
 def get_shelves(user_id):
@@ -267,27 +601,252 @@ def get_shelves(user_id):
     cur = conn.cursor()
     cur.execute("SELECT * FROM shelves WHERE user_id=?", (user_id,))
     rows = cur.fetchall()
-    conn.close()
     return rows
 
 def delete_shelf(id):
+    """
+    Deletes the shelf unless a book is on it; returns whether it was deleted.
+    """
     conn = create_connection()
-    sql = 'DELETE FROM shelves WHERE id=?'
+    # Checked in the same statement, so a book added in the meantime can't be orphaned
+    sql = 'DELETE FROM shelves WHERE id=? AND NOT EXISTS (SELECT 1 FROM books WHERE shelf_id=?)'
     cur = conn.cursor()
-    cur.execute(sql, (id,))
-    conn.commit()
-    conn.close()
+    cur.execute(sql, (id, id))
+    return cur.rowcount > 0
 
 def add_book(title, author, isbn, cover_url, shelf_id, user_id, summary=None, page_count=None, publisher=None, status='Okunacak', current_page=0, start_date=None, finish_date=None, link=None, file_path=None):
     conn = create_connection()
-    sql = ''' INSERT INTO books(title, author, isbn, cover_url, shelf_id, user_id, summary, page_count, publisher, status, current_page, start_date, finish_date, link, file_path)
-              VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?) '''
+    sql = ''' INSERT INTO books(title, author, isbn, cover_url, shelf_id, user_id, summary, page_count, publisher, status, current_page, start_date, finish_date, link, file_path, added_at)
+              VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?, datetime('now')) '''
     cur = conn.cursor()
     cur.execute(sql, (title, author, isbn, cover_url, shelf_id, user_id, summary, page_count, publisher, status, current_page, start_date, finish_date, link, file_path))
-    conn.commit()
-    conn.close()
     return cur.lastrowid
 
+def bulk_import_books(user_id, rows, shelf_id=None, batch_size=1000, progress=None):
+    """
+    Streams book rows (dicts with add_book's keyword names, at least title and
+    author) into the library in a single transaction.
+    Rows whose (title, author) already exist, in the library or earlier in the
+    same import, are skipped. progress(processed, added, skipped) is called
+    after every batch. Returns (added, skipped).
+    """
+    conn = create_connection()
+    existing = set(conn.execute("SELECT title, author FROM books WHERE user_id=?", (user_id,)))
+
+    if shelf_id is None:
+        shelves = get_shelves(user_id)
+        shelf_id = shelves[0][0] if shelves else 1
+
+    # Each batch goes in as one statement over a JSON array: the search_index
+    # trigger then runs inside a single statement, and FTS5 writes one index
+    # segment per batch instead of one per row.
+    columns = "title, author, isbn, cover_url, shelf_id, user_id, summary, page_count, publisher, status, current_page, start_date, finish_date, link, file_path"
+    values = ", ".join(f"json_extract(value, '$[{i}]')" for i in range(len(columns.split(","))))
+    sql = f"INSERT INTO books({columns}, added_at) SELECT {values}, datetime('now') FROM json_each(?)"
+    added = 0
+    skipped = 0
+    batch = []
+
+    with transaction():
+        for processed, row in enumerate(rows, 1):
+            key = (row["title"], row["author"])
+            if key in existing:
+                skipped += 1
+            else:
+                existing.add(key)
+                batch.append((
+                    row["title"], row["author"], row.get("isbn"), row.get("cover_url", ""), shelf_id, user_id,
+                    row.get("summary"), row.get("page_count"), row.get("publisher"), row.get("status") or "Okunacak",
+                    row.get("current_page", 0), row.get("start_date"), row.get("finish_date"), row.get("link"), row.get("file_path")
+                ))
+
+            if len(batch) >= batch_size:
+                conn.execute(sql, (json.dumps(batch),))
+                added += len(batch)
+                batch.clear()
+            if progress and processed % batch_size == 0:
+                progress(processed, added + len(batch), skipped)
+
+        if batch:
+            conn.execute(sql, (json.dumps(batch),))
+            added += len(batch)
+        if progress:
+            progress(added + skipped, added, skipped)
+
+    return added, skipped
+
+# Books with fields enrich.py can look up. 'Bilinmiyor', 'Özet bulunmuyor.'
+# and friends are the placeholders left by the providers and the CSV import.
+def get_incomplete_books(user_id, after_id=0, limit=50):
+    """
+    Returns up to limit (id, title, author, isbn, cover_url, summary,
+    page_count, publisher, link) rows with id > after_id, in id order, that
+    lack an ISBN, page count, summary or cover.
+    """
+    conn = create_connection()
+    return conn.execute("""
+        SELECT id, title, author, isbn, cover_url, summary, page_count, publisher, link
+        FROM books
+        WHERE user_id = ? AND id > ?
+          AND (IFNULL(isbn, '') IN ('', 'Bilinmiyor')
+               OR IFNULL(page_count, 0) = 0
+               OR IFNULL(summary, '') IN ('', 'Özet bulunmuyor.', 'Özet yok.')
+               OR IFNULL(cover_url, '') = '')
+        ORDER BY id
+        LIMIT ?
+    """, (user_id, after_id, limit)).fetchall()
+
+def count_incomplete_books(user_id, after_id=0):
+    conn = create_connection()
+    return conn.execute("""
+        SELECT COUNT(*)
+        FROM books
+        WHERE user_id = ? AND id > ?
+          AND (IFNULL(isbn, '') IN ('', 'Bilinmiyor')
+               OR IFNULL(page_count, 0) = 0
+               OR IFNULL(summary, '') IN ('', 'Özet bulunmuyor.', 'Özet yok.')
+               OR IFNULL(cover_url, '') = '')
+    """, (user_id, after_id)).fetchone()[0]
+
+def get_failed_enrichment_books(user_id, after_id=0, limit=50):
+    """
+    get_incomplete_books for the books whose lookup failed in an earlier
+    run (see save_enrichment), in id order.
+    """
+    conn = create_connection()
+    return conn.execute("""
+        SELECT b.id, b.title, b.author, b.isbn, b.cover_url, b.summary, b.page_count, b.publisher, b.link
+        FROM enrichment_failures f
+        JOIN books b ON b.id = f.book_id
+        WHERE f.user_id = ? AND f.book_id > ?
+        ORDER BY f.book_id
+        LIMIT ?
+    """, (user_id, after_id, limit)).fetchall()
+
+def save_enrichment(user_id, updates, last_book_id, book_ids, enriched, failed_ids):
+    """
+    Writes one batch of enrichment results and advances the user's
+    checkpoint in the same transaction. updates are dicts with id, isbn,
+    page_count, summary, cover_url, publisher and link (None where nothing
+    was found); only fields that are still missing in the row are filled.
+    book_ids are the books checked in the batch and failed_ids those whose
+    lookup failed: they are recorded for a retry, the others forgotten. The
+    checkpoint never moves back, so a retry batch passes last_book_id=0.
+    """
+    failed_ids = set(failed_ids)
+    with transaction() as conn:
+        conn.executemany("""
+            UPDATE books SET
+                isbn = CASE WHEN IFNULL(isbn, '') IN ('', 'Bilinmiyor') THEN IFNULL(:isbn, isbn) ELSE isbn END,
+                page_count = CASE WHEN IFNULL(page_count, 0) = 0 THEN IFNULL(:page_count, page_count) ELSE page_count END,
+                summary = CASE WHEN IFNULL(summary, '') IN ('', 'Özet bulunmuyor.', 'Özet yok.') THEN IFNULL(:summary, summary) ELSE summary END,
+                cover_url = CASE WHEN IFNULL(cover_url, '') = '' THEN IFNULL(:cover_url, cover_url) ELSE cover_url END,
+                publisher = CASE WHEN IFNULL(publisher, '') IN ('', 'Bilinmeyen Yayınevi') THEN IFNULL(:publisher, publisher) ELSE publisher END,
+                link = CASE WHEN IFNULL(link, '') = '' THEN IFNULL(:link, link) ELSE link END
+            WHERE id = :id
+        """, updates)
+        conn.executemany(
+            "DELETE FROM enrichment_failures WHERE user_id = ? AND book_id = ?",
+            [(user_id, book_id) for book_id in book_ids if book_id not in failed_ids]
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO enrichment_failures(user_id, book_id) VALUES(?, ?)",
+            [(user_id, book_id) for book_id in sorted(failed_ids)]
+        )
+        conn.execute("""
+            INSERT INTO enrichment_progress(user_id, last_book_id, checked, enriched, failed, updated_at)
+            VALUES(?, ?, ?, ?, ?, datetime('now'))
+            ON CONFLICT(user_id) DO UPDATE SET
+                last_book_id = MAX(last_book_id, excluded.last_book_id),
+                checked = checked + excluded.checked,
+                enriched = enriched + excluded.enriched,
+                failed = failed + excluded.failed,
+                updated_at = excluded.updated_at
+        """, (user_id, last_book_id, len(book_ids), enriched, len(failed_ids)))
+
+def get_enrichment_progress(user_id):
+    """
+    Returns (last_book_id, checked, enriched, failed, updated_at), or None
+    if enrichment never ran for the user.
+    """
+    conn = create_connection()
+    return conn.execute(
+        "SELECT last_book_id, checked, enriched, failed, updated_at FROM enrichment_progress WHERE user_id=?",
+        (user_id,)
+    ).fetchone()
+
+def reset_enrichment_progress(user_id):
+    with transaction() as conn:
+        conn.execute("DELETE FROM enrichment_progress WHERE user_id=?", (user_id,))
+        conn.execute("DELETE FROM enrichment_failures WHERE user_id=?", (user_id,))
+
+# Per-table queries used to export a user's library. Each selects rows in
+# index order, so SQLite streams them without building a sorted copy.
+EXPORT_QUERIES = {
+    "shelves": "SELECT * FROM shelves WHERE user_id = ?",
+    "books": "SELECT * FROM books WHERE user_id = ?",
+    "quotes": """
+        SELECT q.*
+        FROM books b
+        JOIN quotes q ON q.book_id = b.id
+        WHERE b.user_id = ?
+    """,
+    "reading_sessions": """
+        SELECT rs.*
+        FROM books b
+        JOIN reading_sessions rs ON rs.book_id = b.id
+        WHERE b.user_id = ?
+    """,
+    "vocabulary": """
+        SELECT v.*
+        FROM books b
+        JOIN vocabulary v ON v.book_id = b.id
+        WHERE b.user_id = ?
+    """,
+    "tags": """
+        SELECT bt.book_id, t.id AS tag_id, t.name, t.color
+        FROM books b
+        JOIN book_tags bt ON bt.book_id = b.id
+        JOIN tags t ON t.id = bt.tag_id
+        WHERE b.user_id = ?
+    """,
+}
+
+# Tables whose declared column types describe each export; the first one
+# that has a column wins
+EXPORT_SOURCES = {
+    "tags": ("book_tags", "tags"),
+}
+
+def get_export_column_types(table):
+    """
+    Returns {column: declared type} for the columns of an exported table,
+    e.g. {"id": "INTEGER", "title": "TEXT", ...}.
+    """
+    conn = create_connection()
+    types = {}
+    for source in EXPORT_SOURCES.get(table, (table,)):
+        # Table names come from EXPORT_SOURCES/EXPORT_QUERIES, not user input
+        for _, name, declared, *_ in conn.execute(f"PRAGMA table_info({source})"):
+            types.setdefault(name, declared.upper())
+    return types
+
+def iter_export_chunks(user_id, table, chunk_size=1000):
+    """
+    Streams one table of a user's library as (columns, rows) chunks.
+    Rows are pulled with fetchmany, so memory use doesn't grow with the library.
+    An empty table still yields one chunk with no rows, so callers get the columns.
+    """
+    cur = create_connection().cursor()
+    cur.execute(EXPORT_QUERIES[table], (user_id,))
+    columns = [d[0] for d in cur.description]
+    rows = cur.fetchmany(chunk_size)
+    yield columns, rows
+    while rows:
+        rows = cur.fetchmany(chunk_size)
+        if rows:
+            yield columns, rows
+
 def update_book_details(book_id, title, author, shelf_id, rating, notes, summary, borrower_name, borrow_date, status, current_page, start_date, finish_date, file_path=None):
     conn = create_connection()
     
@@ -304,8 +863,6 @@ def update_book_details(book_id, title, author, shelf_id, rating, notes, summary
 
     cur = conn.cursor()
     cur.execute(sql, params)
-    conn.commit()
-    conn.close()
 
 def get_books(user_id, shelf_id=None):
     conn = create_connection()
@@ -315,23 +872,200 @@ def get_books(user_id, shelf_id=None):
     else:
         cur.execute("SELECT * FROM books WHERE user_id=?", (user_id,))
     rows = cur.fetchall()
-    conn.close()
     return rows
 
+def get_book(book_id):
+    cur = create_connection().cursor()
+    cur.execute("SELECT * FROM books WHERE id=?", (book_id,))
+    return cur.fetchone()
+
+def get_random_book(user_id, status):
+    cur = create_connection().cursor()
+    cur.execute("SELECT * FROM books WHERE user_id=? AND status=? ORDER BY RANDOM() LIMIT 1", (user_id, status))
+    return cur.fetchone()
+
+# Columns query_books returns, in this order:
+# (id, title, author, cover_url, rating, page_count, status, current_page)
+GRID_COLUMNS = "id, title, author, cover_url, rating, page_count, status, current_page"
+
+# sort -> (ORDER BY clause, keyset predicate, cursor params taken from the last row).
+# The predicates repeat the leading sort column as a plain range so SQLite can
+# seek the index to the cursor instead of filtering from the first row.
+BOOK_SORTS = {
+    "id_desc": ("id DESC", "id < ?", lambda row: (row[0],)),
+    "id_asc": ("id ASC", "id > ?", lambda row: (row[0],)),
+    "title_asc": (
+        "title COLLATE NOCASE ASC, id ASC",
+        "title >= ? COLLATE NOCASE AND (title COLLATE NOCASE, id) > (?, ?)",
+        lambda row: (row[1], row[1], row[0]),
+    ),
+    "title_desc": (
+        "title COLLATE NOCASE DESC, id DESC",
+        "title <= ? COLLATE NOCASE AND (title COLLATE NOCASE, id) < (?, ?)",
+        lambda row: (row[1], row[1], row[0]),
+    ),
+    "rating_desc": (
+        "IFNULL(rating, 0) DESC, id DESC",
+        "IFNULL(rating, 0) <= ? AND (IFNULL(rating, 0), id) < (?, ?)",
+        lambda row: (row[4] or 0, row[4] or 0, row[0]),
+    ),
+}
+
+def build_book_query(user_id, search=None, status=None, borrowed=False, sort="id_desc", limit=60, offset=0, after=None):
+    """
+    Returns the (sql, params) query_books runs; kept separate so
+    check_query_plans.py can explain every variant.
+    """
+    order_by, keyset, cursor_params = BOOK_SORTS[sort]
+    where = ["user_id = ?"]
+    params = [user_id]
+
+    if search:
+        search = fold_text(search)
+        pattern = "%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        where.append("(fold(title) LIKE ? ESCAPE '\\' OR fold(author) LIKE ? ESCAPE '\\')")
+        params += [pattern, pattern]
+    if status:
+        where.append("status = ?")
+        params.append(status)
+    if borrowed:
+        where.append("borrower_name IS NOT NULL AND borrower_name != ''")
+    if after is not None:
+        where.append(keyset)
+        params += cursor_params(after)
+
+    sql = f"SELECT {GRID_COLUMNS} FROM books WHERE {' AND '.join(where)} ORDER BY {order_by} LIMIT ?"
+    params.append(limit)
+    if after is None and offset:
+        sql += " OFFSET ?"
+        params.append(offset)
+    return sql, params
+
+def query_books(user_id, search=None, status=None, borrowed=False, sort="id_desc", limit=60, offset=0, after=None):
+    """
+    Filters, sorts and pages a user's books in SQL, returning GRID_COLUMNS rows.
+    search matches title or author; sort is a BOOK_SORTS key.
+    Pass the last row of the previous page as after for keyset pagination
+    (offset is only used for the first page).
+    """
+    sql, params = build_book_query(user_id, search, status, borrowed, sort, limit, offset, after)
+    cur = create_connection().cursor()
+    cur.execute(sql, params)
+    return cur.fetchall()
+
+# Columns of a search_library hit, in this order:
+# (kind, ref_id, book_id, book_title, snippet, score); kind is a SEARCH_KINDS value
+# and ref_id the id of the book, quote or vocabulary row. Lower scores rank higher.
+#
+# The user's rows are one rowid range (see SEARCH_OWNER_SPAN), which FTS5
+# seeks to, so only they are matched and ranked; the limit is applied before
+# the hits are joined to their books.
+SEARCH_QUERY = f"""
+    SELECT hit.key % 4, hit.ref_id, b.id, b.title,
+           CASE hit.key % 4
+               WHEN 1 THEN IFNULL(b.author, '') || char(10) || IFNULL(b.publisher, '') || char(10) ||
+                           IFNULL(b.summary, '') || char(10) || IFNULL(b.notes, '')
+               WHEN 2 THEN (SELECT text FROM quotes WHERE id = hit.ref_id)
+               ELSE (SELECT word || char(10) || IFNULL(definition, '') || char(10) || IFNULL(sentence, '')
+                     FROM vocabulary WHERE id = hit.ref_id)
+           END,
+           hit.score
+    FROM (
+        SELECT rowid AS key, rowid % {SEARCH_OWNER_SPAN} / 4 AS ref_id, bm25(search_index, 5.0, 1.0) AS score
+        FROM search_index
+        WHERE search_index MATCH ? AND rowid >= ? AND rowid < ?
+        ORDER BY score
+        LIMIT ?
+    ) hit
+    JOIN books b ON b.id = CASE hit.key % 4
+        WHEN 1 THEN hit.ref_id
+        WHEN 2 THEN (SELECT book_id FROM quotes WHERE id = hit.ref_id)
+        ELSE (SELECT book_id FROM vocabulary WHERE id = hit.ref_id)
+    END
+    ORDER BY hit.score
+"""
+
+_WORD = re.compile(r"\w+")
+
+def search_key(text):
+    """
+    Folds text the way search_index tokenizes it: Turkish-aware lower case
+    with diacritics removed, so "Çiçek" and "cicek" give the same key.
+    """
+    decomposed = unicodedata.normalize("NFD", fold_text(text))
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+def make_snippet(text, terms, mark=("[", "]"), width=16):
+    """
+    Cuts a window of about width words around the first word of text that
+    starts with one of terms (search keys) and wraps matching words in mark.
+    """
+    words = list(_WORD.finditer(text or ""))
+    if not words:
+        return ""
+    hits = [i for i, m in enumerate(words) if search_key(m.group()).startswith(terms)]
+    start = max(0, hits[0] - width // 3) if hits else 0
+    end = min(len(words), start + width)
+
+    parts = []
+    pos = words[start].start()
+    for i in range(start, end):
+        m = words[i]
+        if i in hits:
+            parts.append(text[pos:m.start()] + mark[0] + m.group() + mark[1])
+            pos = m.end()
+    parts.append(text[pos:words[end - 1].end()])
+
+    snippet = " ".join("".join(parts).split())
+    if start > 0:
+        snippet = "…" + snippet
+    if end < len(words):
+        snippet += "…"
+    return snippet
+
+def search_library(user_id, query, limit=20, mark=("[", "]")):
+    """
+    Full-text search over the user's books (title, author, publisher, summary,
+    notes), quotes and vocabulary. Every word of query must match the start of
+    a word, ignoring case and diacritics. Returns up to limit hits ranked by
+    bm25 (title matches weigh more), with a snippet around the first match.
+    """
+    terms = tuple(search_key(word) for word in _WORD.findall(query or ""))
+    if not terms:
+        return []
+    # Quoting every term keeps FTS5 operators typed by the user inert
+    match = " ".join(f'"{term}"*' for term in terms)
+
+    cur = create_connection().cursor()
+    first = user_id * SEARCH_OWNER_SPAN
+    cur.execute(SEARCH_QUERY, (match, first, first + SEARCH_OWNER_SPAN, limit))
+    hits = []
+    for kind, ref_id, book_id, book_title, text, score in cur.fetchall():
+        if kind == 1 and not any(search_key(w).startswith(terms) for w in _WORD.findall(text)):
+            # Only the title matched; show the author line instead of an arbitrary window
+            text = book_title + "\n" + text
+        hits.append((SEARCH_KINDS[kind], ref_id, book_id, book_title, make_snippet(text, terms, mark), score))
+    return hits
+
 def delete_book(id):
-    conn = create_connection()
     sql = 'DELETE FROM books WHERE id=?'
-    cur = conn.cursor()
-    cur.execute(sql, (id,))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        # The book's sessions go with it (see books_stats_bd), which can
+        # shorten its owner's streaks
+        row = conn.execute("""
+            SELECT user_id FROM books
+            WHERE id = ? AND EXISTS (SELECT 1 FROM reading_sessions WHERE book_id = books.id)
+        """, (id,)).fetchone()
+        cur = conn.cursor()
+        cur.execute(sql, (id,))
+        if row and row[0] is not None:
+            repair_streak(row[0])
 
 def check_book_exists(isbn, user_id):
     conn = create_connection()
     cur = conn.cursor()
     cur.execute("SELECT id FROM books WHERE isbn=? AND user_id=?", (isbn, user_id))
     data = cur.fetchone()
-    conn.close()
     return data is not None
 
 def book_exists(user_id, title, author):
@@ -340,7 +1074,6 @@ def book_exists(user_id, title, author):
     # Check for exact match on title and author
     cur.execute("SELECT id FROM books WHERE user_id=? AND title=? AND author=?", (user_id, title, author))
     row = cur.fetchone()
-    conn.close()
     return row is not None
 
 def get_shelf_book_count(shelf_id):
@@ -348,7 +1081,6 @@ def get_shelf_book_count(shelf_id):
     cur = conn.cursor()
     cur.execute("SELECT COUNT(*) FROM books WHERE shelf_id=?", (shelf_id,))
     count = cur.fetchone()[0]
-    conn.close()
     return count
 
 def toggle_read_status(book_id, is_read):
@@ -358,23 +1090,18 @@ def toggle_read_status(book_id, is_read):
               WHERE id = ?'''
     cur = conn.cursor()
     cur.execute(sql, (is_read, book_id))
-    conn.commit()
-    conn.close()
 
 def add_quote(book_id, text, page_number=0):
     conn = create_connection()
     sql = ''' INSERT INTO quotes(book_id, text, page_number) VALUES(?,?,?) '''
     cur = conn.cursor()
     cur.execute(sql, (book_id, text, page_number))
-    conn.commit()
-    conn.close()
 
 def get_quotes(book_id):
     conn = create_connection()
     cur = conn.cursor()
     cur.execute("SELECT * FROM quotes WHERE book_id=?", (book_id,))
     rows = cur.fetchall()
-    conn.close()
     return rows
 
 def delete_quote(quote_id):
@@ -382,8 +1109,6 @@ def delete_quote(quote_id):
     sql = 'DELETE FROM quotes WHERE id=?'
     cur = conn.cursor()
     cur.execute(sql, (quote_id,))
-    conn.commit()
-    conn.close()
 
 def update_book_progress(book_id, current_page):
     conn = create_connection()
@@ -393,8 +1118,6 @@ def update_book_progress(book_id, current_page):
               WHERE id = ?'''
     cur = conn.cursor()
     cur.execute(sql, (current_page, book_id))
-    conn.commit()
-    conn.close()
 
 def update_book_cover(book_id, cover_url):
     conn = create_connection()
@@ -403,39 +1126,65 @@ def update_book_cover(book_id, cover_url):
               WHERE id = ?'''
     cur = conn.cursor()
     cur.execute(sql, (cover_url, book_id))
-    conn.commit()
-    conn.close()
 
 def get_user_goal(user_id):
     conn = create_connection()
     cur = conn.cursor()
     cur.execute("SELECT reading_goal FROM users WHERE id=?", (user_id,))
     result = cur.fetchone()
-    conn.close()
     return result[0] if result else 20
 
 def update_user_goal(user_id, goal):
     conn = create_connection()
     cur = conn.cursor()
     cur.execute("UPDATE users SET reading_goal=? WHERE id=?", (goal, user_id))
-    conn.commit()
-    conn.close()
 
 def add_reading_session(book_id, start_time, end_time, duration_minutes, pages_read):
-    conn = create_connection()
     sql = ''' INSERT INTO reading_sessions(book_id, start_time, end_time, duration_minutes, pages_read)
               VALUES(?,?,?,?,?) '''
-    cur = conn.cursor()
-    cur.execute(sql, (book_id, start_time, end_time, duration_minutes, pages_read))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute(sql, (book_id, start_time, end_time, duration_minutes, pages_read))
+        _record_reading_day(conn, book_id, start_time)
+
+def _record_reading_day(conn, book_id, start_time):
+    # Advances the owner's reading_streaks row by one session: same day,
+    # next day or a gap are O(1); a session dated before the last reading
+    # day can join two streaks, so that case rebuilds the row.
+    row = conn.execute("""
+        SELECT b.user_id, s.current_streak, s.longest_streak, s.last_day
+        FROM books b
+        LEFT JOIN reading_streaks s ON s.user_id = b.user_id
+        WHERE b.id = ?
+    """, (book_id,)).fetchone()
+    try:
+        day = datetime.date.fromisoformat((start_time or "")[:10])
+    except ValueError:
+        return
+    if row is None or row[0] is None:
+        return
+    user_id, current, longest, last_day = row
+    if last_day is not None:
+        last_day = datetime.date.fromisoformat(last_day)
+        if day == last_day:
+            return
+        if day < last_day:
+            repair_streak(user_id)
+            return
+    current = current + 1 if last_day == day - datetime.timedelta(days=1) else 1
+    conn.execute("""
+        INSERT INTO reading_streaks(user_id, current_streak, longest_streak, last_day) VALUES(?, ?, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET
+            current_streak = excluded.current_streak,
+            longest_streak = excluded.longest_streak,
+            last_day = excluded.last_day
+    """, (user_id, current, max(longest or 0, current), day.isoformat()))
 
 def get_reading_sessions(book_id):
     conn = create_connection()
     cur = conn.cursor()
     cur.execute("SELECT * FROM reading_sessions WHERE book_id=? ORDER BY start_time DESC", (book_id,))
     rows = cur.fetchall()
-    conn.close()
     return rows
 
 def get_user_reading_sessions(user_id):
@@ -451,36 +1200,83 @@ def get_user_reading_sessions(user_id):
     """
     cur.execute(sql, (user_id,))
     rows = cur.fetchall()
-    conn.close()
     return rows
 
+# Reading statistics, answered from daily_stats (one row per user and day
+# with activity) rather than from every session.
 def get_total_reading_time(user_id):
+    return get_reading_totals(user_id)[0]
+
+def get_total_pages_read_in_sessions(user_id):
+    return get_reading_totals(user_id)[1]
+
+def get_reading_totals(user_id):
+    """
+    Returns (minutes, pages, sessions, books_finished) over all time;
+    books_finished only counts books with a finish date.
+    """
     conn = create_connection()
-    cur = conn.cursor()
-    sql = """
-        SELECT SUM(rs.duration_minutes)
-        FROM reading_sessions rs
-        JOIN books b ON rs.book_id = b.id
-        WHERE b.user_id = ?
+    row = conn.execute("""
+        SELECT IFNULL(SUM(minutes), 0), IFNULL(SUM(pages), 0), IFNULL(SUM(sessions), 0), IFNULL(SUM(books_finished), 0)
+        FROM daily_stats
+        WHERE user_id = ?
+    """, (user_id,)).fetchone()
+    return tuple(row)
+
+def get_daily_stats(user_id, days=7, end=None):
     """
-    cur.execute(sql, (user_id,))
-    result = cur.fetchone()
-    conn.close()
-    return result[0] if result[0] else 0
+    Returns one (date, minutes, pages, sessions, books_finished) tuple per
+    day for the days days ending on end (default today), oldest first, with
+    zeros for days without activity.
+    """
+    end = end or datetime.date.today()
+    first = end - datetime.timedelta(days=days - 1)
+    conn = create_connection()
+    rows = conn.execute("""
+        SELECT day, minutes, pages, sessions, books_finished
+        FROM daily_stats
+        WHERE user_id = ? AND day BETWEEN ? AND ?
+    """, (user_id, first.isoformat(), end.isoformat())).fetchall()
+    by_day = {row[0]: row[1:] for row in rows}
+    series = []
+    for i in range(days):
+        day = first + datetime.timedelta(days=i)
+        series.append((day, *by_day.get(day.isoformat(), (0, 0, 0, 0))))
+    return series
 
-def get_total_pages_read_in_sessions(user_id):
+def get_book_count(user_id):
     conn = create_connection()
-    cur = conn.cursor()
-    sql = """
-        SELECT SUM(rs.pages_read)
-        FROM reading_sessions rs
-        JOIN books b ON rs.book_id = b.id
-        WHERE b.user_id = ?
+    return conn.execute("SELECT COUNT(*) FROM books WHERE user_id=?", (user_id,)).fetchone()[0]
+
+# Columns of get_shelf_summary rows, in this order:
+# (shelf_id, name, description, books, read, pages, avg_rating, last_added)
+# avg_rating leaves out unrated (0) books and is None if none are rated;
+# last_added is None for shelves whose books predate added_at.
+def get_shelf_summary(user_id):
     """
-    cur.execute(sql, (user_id,))
-    result = cur.fetchone()
-    conn.close()
-    return result[0] if result[0] else 0
+    Returns a row for each of the user's shelves, empty ones included, and
+    one with name None for books whose shelf is missing.
+    """
+    conn = create_connection()
+    return conn.execute("""
+        WITH counts AS (
+            SELECT shelf_id, COUNT(*) AS books, SUM(status = 'Okundu') AS read,
+                   SUM(IFNULL(page_count, 0)) AS pages, AVG(NULLIF(rating, 0)) AS avg_rating,
+                   MAX(added_at) AS last_added
+            FROM books
+            WHERE user_id = ?
+            GROUP BY shelf_id
+        )
+        SELECT s.id, s.name, s.description, IFNULL(c.books, 0), IFNULL(c.read, 0), IFNULL(c.pages, 0),
+               c.avg_rating, c.last_added
+        FROM shelves s
+        LEFT JOIN counts c ON c.shelf_id = s.id
+        WHERE s.user_id = ?
+        UNION ALL
+        SELECT shelf_id, NULL, NULL, books, read, pages, avg_rating, last_added
+        FROM counts
+        WHERE NOT EXISTS (SELECT 1 FROM shelves s WHERE s.id = counts.shelf_id AND s.user_id = ?)
+    """, (user_id, user_id, user_id)).fetchall()
 
 def add_xp_column():
     conn = create_connection()
@@ -489,8 +1285,6 @@ def add_xp_column():
         c.execute("ALTER TABLE users ADD COLUMN xp INTEGER DEFAULT 0")
     except sqlite3.OperationalError:
         pass
-    conn.commit()
-    conn.close()
 
 def get_user_xp(user_id):
     conn = create_connection()
@@ -501,15 +1295,11 @@ def get_user_xp(user_id):
         return result[0] if result else 0
     except:
         return 0
-    finally:
-        conn.close()
 
 def add_xp(user_id, amount):
     conn = create_connection()
     cur = conn.cursor()
     cur.execute("UPDATE users SET xp = xp + ? WHERE id=?", (amount, user_id))
-    conn.commit()
-    conn.close()
 
 def add_word(user_id, book_id, word, definition, sentence):
     conn = create_connection()
@@ -517,15 +1307,12 @@ def add_word(user_id, book_id, word, definition, sentence):
               VALUES(?,?,?,?,?, datetime('now')) '''
     cur = conn.cursor()
     cur.execute(sql, (user_id, book_id, word, definition, sentence))
-    conn.commit()
-    conn.close()
 
 def get_words(book_id):
     conn = create_connection()
     cur = conn.cursor()
     cur.execute("SELECT * FROM vocabulary WHERE book_id=? ORDER BY id DESC", (book_id,))
     rows = cur.fetchall()
-    conn.close()
     return rows
 
 def delete_word(word_id):
@@ -533,53 +1320,91 @@ def delete_word(word_id):
     sql = 'DELETE FROM vocabulary WHERE id=?'
     cur = conn.cursor()
     cur.execute(sql, (word_id,))
-    conn.commit()
-    conn.close()
+
+# Reading streaks: runs of consecutive days with at least one session.
+# reading_streaks holds each user's latest run and longest run, so the
+# sidebar doesn't walk the session history on every navigation.
+def get_streak(user_id):
+    """
+    Returns (current_streak, longest_streak, last_day) for the user, where
+    current_streak is 0 unless the user read today or yesterday.
+    """
+    conn = create_connection()
+    row = conn.execute(
+        "SELECT current_streak, longest_streak, last_day FROM reading_streaks WHERE user_id=?",
+        (user_id,)
+    ).fetchone()
+    if row is None or row[2] is None:
+        return 0, 0, None
+    current, longest, last_day = row
+    last_day = datetime.date.fromisoformat(last_day)
+    if last_day < datetime.date.today() - datetime.timedelta(days=1):
+        current = 0 # Streak broken
+    return current, longest, last_day
 
 def get_current_streak(user_id):
+    return get_streak(user_id)[0]
+
+def repair_streak(user_id):
+    """
+    Rebuilds the user's reading_streaks row from reading_sessions, e.g.
+    after sessions were deleted or backdated.
+    """
+    with transaction() as conn:
+        runs = conn.execute("""
+            WITH days AS (
+                SELECT DISTINCT substr(rs.start_time, 1, 10) AS day
+                FROM books b
+                JOIN reading_sessions rs ON rs.book_id = b.id
+                WHERE b.user_id = ? AND julianday(substr(rs.start_time, 1, 10)) IS NOT NULL
+            )
+            SELECT MAX(day), COUNT(*)
+            FROM (SELECT day, julianday(day) - ROW_NUMBER() OVER (ORDER BY day) AS grp FROM days)
+            GROUP BY grp
+            ORDER BY 1 DESC
+        """, (user_id,)).fetchall()
+        if not runs:
+            conn.execute("DELETE FROM reading_streaks WHERE user_id=?", (user_id,))
+            return
+        conn.execute("""
+            INSERT OR REPLACE INTO reading_streaks(user_id, current_streak, longest_streak, last_day)
+            VALUES(?, ?, ?, ?)
+        """, (user_id, runs[0][1], max(length for _, length in runs), runs[0][0]))
+
+def get_streak_history(user_id, limit=10):
+    """
+    Returns the user's latest limit streaks as (first_day, last_day, length)
+    tuples of dates, newest first. Reads the daily rollups, not the sessions.
+    """
     conn = create_connection()
-    cur = conn.cursor()
-    # Get unique reading dates for the user, ordered by date desc
-    sql = """
-        SELECT DISTINCT substr(rs.start_time, 1, 10) as rdate
-        FROM reading_sessions rs
-        JOIN books b ON rs.book_id = b.id
-        WHERE b.user_id = ?
-        ORDER BY rdate DESC
+    rows = conn.execute("""
+        SELECT MIN(day), MAX(day), COUNT(*)
+        FROM (
+            SELECT day, julianday(day) - ROW_NUMBER() OVER (ORDER BY day) AS grp
+            FROM daily_stats
+            WHERE user_id = ? AND sessions > 0 AND julianday(day) IS NOT NULL
+        )
+        GROUP BY grp
+        ORDER BY 2 DESC
+        LIMIT ?
+    """, (user_id, limit)).fetchall()
+    return [(datetime.date.fromisoformat(first), datetime.date.fromisoformat(last), length)
+            for first, last, length in rows]
+
+def get_reading_calendar(user_id, days=365, end=None):
     """
-    cur.execute(sql, (user_id,))
-    rows = cur.fetchall()
-    conn.close()
-    
-    if not rows:
-        return 0
-        
-    import datetime
-    
-    dates = [datetime.datetime.strptime(r[0], "%Y-%m-%d").date() for r in rows]
-    today = datetime.date.today()
-    
-    streak = 0
-    
-    # Check if read today
-    if dates[0] == today:
-        streak = 1
-        last_date = today
-    elif dates[0] == today - datetime.timedelta(days=1):
-        streak = 1
-        last_date = dates[0]
-    else:
-        return 0 # Streak broken or not started today/yesterday
-        
-    # Check previous days
-    for i in range(1, len(dates)):
-        if dates[i] == last_date - datetime.timedelta(days=1):
-            streak += 1
-            last_date = dates[i]
-        else:
-            break
-            
-    return streak
+    Heatmap data: {date: (minutes, pages)} for the days with a session among
+    the days days ending on end (default today).
+    """
+    end = end or datetime.date.today()
+    first = end - datetime.timedelta(days=days - 1)
+    conn = create_connection()
+    rows = conn.execute("""
+        SELECT day, minutes, pages
+        FROM daily_stats
+        WHERE user_id = ? AND day BETWEEN ? AND ? AND sessions > 0
+    """, (user_id, first.isoformat(), end.isoformat())).fetchall()
+    return {datetime.date.fromisoformat(day): (minutes, pages) for day, minutes, pages in rows}
 
 # --- Tags ---
 def create_tag(name, color="#2196F3"):
@@ -588,12 +1413,9 @@ def create_tag(name, color="#2196F3"):
         sql = ''' INSERT INTO tags(name, color) VALUES(?,?) '''
         cur = conn.cursor()
         cur.execute(sql, (name, color))
-        conn.commit()
         tag_id = cur.lastrowid
-        conn.close()
         return tag_id
     except sqlite3.IntegrityError:
-        conn.close()
         return None # Tag already exists
 
 def get_all_tags():
@@ -601,7 +1423,6 @@ def get_all_tags():
     cur = conn.cursor()
     cur.execute("SELECT * FROM tags ORDER BY name")
     rows = cur.fetchall()
-    conn.close()
     return rows
 
 def add_tag_to_book(book_id, tag_id):
@@ -610,18 +1431,14 @@ def add_tag_to_book(book_id, tag_id):
         sql = ''' INSERT INTO book_tags(book_id, tag_id) VALUES(?,?) '''
         cur = conn.cursor()
         cur.execute(sql, (book_id, tag_id))
-        conn.commit()
     except sqlite3.IntegrityError:
         pass # Already tagged
-    conn.close()
 
 def remove_tag_from_book(book_id, tag_id):
     conn = create_connection()
     sql = 'DELETE FROM book_tags WHERE book_id=? AND tag_id=?'
     cur = conn.cursor()
     cur.execute(sql, (book_id, tag_id))
-    conn.commit()
-    conn.close()
 
 def get_book_tags(book_id):
     conn = create_connection()
@@ -633,9 +1450,32 @@ def get_book_tags(book_id):
         WHERE bt.book_id = ?
     """, (book_id,))
     rows = cur.fetchall()
-    conn.close()
     return rows
 
+# Lists related to a book, by get_book_bundle part name; each takes
+# (book_id, user_id) and returns the rows of the function it wraps.
+BOOK_BUNDLE_PARTS = {
+    "shelves": lambda book_id, user_id: get_shelves(user_id),
+    "tags": lambda book_id, user_id: get_book_tags(book_id),
+    "all_tags": lambda book_id, user_id: get_all_tags(),
+    "quotes": lambda book_id, user_id: get_quotes(book_id),
+    "sessions": lambda book_id, user_id: get_reading_sessions(book_id),
+    "words": lambda book_id, user_id: get_words(book_id),
+}
+
+# What BookDetailsDialog needs to open; quotes, sessions and words are
+# fetched when their tab is first shown.
+BOOK_DIALOG_PARTS = ("shelves", "tags", "all_tags")
+
+def get_book_bundle(book_id, user_id, parts=BOOK_DIALOG_PARTS):
+    """
+    Returns {part: rows} for the given BOOK_BUNDLE_PARTS, read on the
+    thread's one connection inside a single transaction, so the lists are
+    consistent with each other.
+    """
+    with transaction(write=False):
+        return {part: BOOK_BUNDLE_PARTS[part](book_id, user_id) for part in parts}
+
 def add_user(username, password):
     conn = create_connection()
     try:
@@ -643,20 +1483,16 @@ def add_user(username, password):
         sql = ''' INSERT INTO users(username, password, reading_goal) VALUES(?,?,?) '''
         cur = conn.cursor()
         cur.execute(sql, (username, password, 20))
-        conn.commit()
         return cur.lastrowid
     except sqlite3.Error as e:
         print(e)
         return None
-    finally:
-        conn.close()
 
 def get_user(username):
     conn = create_connection()
     cur = conn.cursor()
     cur.execute("SELECT * FROM users WHERE username=?", (username,))
     rows = cur.fetchall()
-    conn.close()
     if rows:
         return rows[0]
     return None
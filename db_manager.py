@@ -0,0 +1,178 @@
+import os
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+
+# Path of the library database. Can be overridden with the LIBRIS_DB
+# environment variable or set_database_path().
+DEFAULT_DB_PATH = os.environ.get("LIBRIS_DB", "library.db")
+
+# Storage tuning applied to every new connection. journal_mode is stored in
+# the database file; the others only last for the connection's lifetime.
+STORAGE_PROFILE = {
+    "journal_mode": "WAL",      # readers don't block the writer
+    "synchronous": "NORMAL",    # in WAL mode this only fsyncs at checkpoints
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -32000,       # negative means KiB, so ~32 MB of page cache
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,       # ms to wait for a lock held by another thread
+}
+
+_db_path = DEFAULT_DB_PATH
+_functions = {}
+_local = threading.local()
+_lock = threading.Lock()
+_generation = 0
+_open_connections = weakref.WeakSet()
+
+
+class _Connection(sqlite3.Connection):
+    # Plain sqlite3.Connection objects can't be weakly referenced; the subclass
+    # lets the registry forget connections whose thread has exited.
+    pass
+
+
+def set_database_path(path):
+    """
+    Points the manager at another database file and drops every cached connection.
+    """
+    global _db_path
+    close_all()
+    _db_path = path
+
+
+def get_database_path():
+    return _db_path
+
+
+def set_storage_profile(**pragmas):
+    """
+    Overrides entries of STORAGE_PROFILE, e.g. set_storage_profile(synchronous="FULL").
+    Existing connections are closed so the new settings apply everywhere.
+    """
+    for name, value in pragmas.items():
+        if name not in STORAGE_PROFILE:
+            raise ValueError(f"Unknown storage setting: {name}")
+        STORAGE_PROFILE[name] = value
+    close_all()
+
+
+def register_function(name, num_params, func):
+    """
+    Makes a deterministic Python function callable from SQL on every connection.
+    """
+    _functions[name] = (num_params, func)
+    close_all()
+
+
+def _apply_storage_profile(conn):
+    for name, value in STORAGE_PROFILE.items():
+        # PRAGMA values can't be bound as parameters; names are checked
+        # against STORAGE_PROFILE in set_storage_profile().
+        conn.execute(f"PRAGMA {name} = {value}")
+
+
+def _connect(path):
+    # isolation_level=None puts the connection in autocommit mode, so a single
+    # statement commits on its own and transaction() controls multi-statement scopes.
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, factory=_Connection)
+    conn.owner = threading.current_thread()
+    _apply_storage_profile(conn)
+    for name, (num_params, func) in _functions.items():
+        conn.create_function(name, num_params, func, deterministic=True)
+    with _lock:
+        _open_connections.add(conn)
+    return conn
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+
+def _thread_state():
+    if getattr(_local, "generation", None) != _generation:
+        # close_all() leaves connections of live threads to their own thread;
+        # one inside a transaction is kept until the transaction ends
+        if any(getattr(_local, "depth", {}).values()):
+            return _local
+        for conn in getattr(_local, "connections", {}).values():
+            _close_quietly(conn)
+        _local.generation = _generation
+        _local.connections = {}
+        _local.depth = {}
+    return _local
+
+
+def get_connection(path=None):
+    """
+    Returns the calling thread's long-lived connection, opening it on first use.
+    """
+    path = path or _db_path
+    state = _thread_state()
+    conn = state.connections.get(path)
+    if conn is None:
+        conn = state.connections[path] = _connect(path)
+    return conn
+
+
+@contextmanager
+def transaction(path=None, write=True):
+    """
+    Runs the enclosed statements in one transaction on the thread's connection.
+    Nested scopes become savepoints, so only the outermost scope commits.
+
+    The outermost scope takes the write lock up front (BEGIN IMMEDIATE): a
+    deferred transaction that reads and then writes can't wait for a busy
+    writer when it upgrades its lock, it fails with SQLITE_BUSY at once.
+    write=False starts a deferred read transaction instead, for a consistent
+    snapshot that doesn't hold up writers.
+    """
+    path = path or _db_path
+    conn = get_connection(path)
+    depth = _thread_state().depth
+    level = depth.get(path, 0)
+
+    if level == 0:
+        conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+    else:
+        conn.execute(f"SAVEPOINT sp_{level}")
+    depth[path] = level + 1
+
+    try:
+        yield conn
+    except BaseException:
+        depth[path] = level
+        if level == 0:
+            conn.execute("ROLLBACK")
+        else:
+            conn.execute(f"ROLLBACK TO sp_{level}")
+            conn.execute(f"RELEASE sp_{level}")
+        raise
+    else:
+        depth[path] = level
+        if level == 0:
+            conn.execute("COMMIT")
+        else:
+            conn.execute(f"RELEASE sp_{level}")
+
+
+def close_all():
+    """
+    Drops every connection opened by the manager, in all threads. The calling
+    thread's connections and those of finished threads are closed here; other
+    threads may be mid-query, so each closes its own on its next
+    get_connection() call and reconnects.
+    """
+    global _generation
+    with _lock:
+        conns = list(_open_connections)
+        _open_connections.clear()
+        _generation += 1
+    current = threading.current_thread()
+    for conn in conns:
+        if conn.owner is current or not conn.owner.is_alive():
+            _close_quietly(conn)
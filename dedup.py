@@ -0,0 +1,190 @@
+"""
+Cross-provider deduplication for api.py: the same edition often comes back
+from several providers, each copy with part of the data.
+
+Clusters.add(book) puts each result into a cluster: one with the same ISBN
+(ISBN-10 and -13 compared as ISBN-13), or else one whose title is nearly the
+same and whose author shares a name. Fuzzy candidates are only looked up
+among results whose title starts with the same word, so adding n results
+stays close to linear. Results with two different ISBNs are different
+editions and never merged.
+
+The first result of a cluster is its record; later ones are merged into it
+in place, filling in the best cover, the longest real summary and a
+non-zero page count.
+"""
+import re
+import unicodedata
+
+import isbn
+import scoring
+
+# Title similarity (InDel ratio of the normalized titles) for a fuzzy match
+TITLE_THRESHOLD = 0.9
+
+# Values providers use when they have nothing
+MISSING_AUTHORS = {"Bilinmeyen Yazar"}
+MISSING_PUBLISHERS = {"Bilinmeyen Yayınevi", "Apple Books"}
+MISSING_SUMMARIES = {"Özet bulunmuyor.", "Özet yok.", ""}
+
+# Cover quality by source: iTunes artwork is requested at 600x600, Google's
+# thumbnails are ~128px wide and Open Library's -M covers ~180px.
+COVER_RANKS = {"Apple Books": 3, "Kitapyurdu": 3, "Google Books": 2, "Open Library": 1}
+
+_BRACKETS = re.compile(r"\([^)]*\)|\[[^\]]*\]")
+_NON_WORD = re.compile(r"[^\w\s]")
+_FOLD = str.maketrans({"I": "ı", "İ": "i"})
+
+
+def _diacritics_table():
+    # Latin letters with diacritics -> base letter, so fold() can strip them
+    # with one str.translate instead of decomposing every string
+    table = {ord("ı"): "i"}
+    for code in range(0xC0, 0x250):
+        base = unicodedata.normalize("NFD", chr(code))[0]
+        if base != chr(code) and base.isascii():
+            table[code] = base
+    return table
+
+
+_STRIP_DIACRITICS = _diacritics_table()
+
+
+def fold(text):
+    """
+    Turkish-aware lower case without diacritics or punctuation, with ı
+    written as i, so spellings from different providers compare equal.
+    """
+    text = (text or "").translate(_FOLD).lower().translate(_STRIP_DIACRITICS)
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+def title_key(title):
+    # "(Ciltli)", "[Cep Boy]" and similar edition notes don't change the book
+    return fold(_BRACKETS.sub(" ", title or ""))
+
+
+def author_names(author):
+    """
+    Set of name parts long enough to identify an author ("Ali, Sabahattin"
+    and "Sabahattin Ali" share them; so do an author with and without the
+    translator appended).
+    """
+    if not author or author in MISSING_AUTHORS:
+        return frozenset()
+    return frozenset(part for part in fold(author).split() if len(part) > 2)
+
+
+def is_real_summary(summary):
+    if not summary or summary.strip() in MISSING_SUMMARIES:
+        return False
+    # Kitapyurdu placeholder texts, see AddBook.force_add_book
+    return not ("bulundu" in summary.lower() and len(summary) < 50)
+
+
+def cover_rank(book):
+    if not book.get("cover_url"):
+        return -1
+    return COVER_RANKS.get(book.get("cover_source", book.get("source")), 0)
+
+
+def merge(record, book):
+    """
+    Fills record's missing or weaker fields from book, in place.
+    """
+    if cover_rank(book) > cover_rank(record):
+        record["cover_url"] = book["cover_url"]
+        record["cover_source"] = book["source"]
+    summary = book.get("summary")
+    if is_real_summary(summary) and (not is_real_summary(record.get("summary")) or len(summary) > len(record["summary"])):
+        record["summary"] = summary
+    if not record.get("page_count") and book.get("page_count"):
+        record["page_count"] = book["page_count"]
+    if record.get("author") in MISSING_AUTHORS and book.get("author") not in MISSING_AUTHORS:
+        record["author"] = book["author"]
+    if record.get("publisher") in MISSING_PUBLISHERS and book.get("publisher") not in MISSING_PUBLISHERS:
+        record["publisher"] = book["publisher"]
+    if isbn.normalize(record.get("isbn")) is None and isbn.normalize(book.get("isbn")):
+        record["isbn"] = book["isbn"]
+    if not record.get("published_date") and book.get("published_date"):
+        record["published_date"] = book["published_date"]
+    if not record.get("link") and book.get("link"):
+        record["link"] = book["link"]
+    if book["source"] not in record["sources"]:
+        record["sources"].append(book["source"])
+
+
+class _Entry:
+    __slots__ = ("record", "isbn", "title", "authors")
+
+    def __init__(self, record, book_isbn, title, authors):
+        self.record = record
+        self.isbn = book_isbn
+        self.title = title
+        self.authors = authors
+
+
+class Clusters:
+    def __init__(self):
+        self.by_isbn = {}
+        self.blocks = {}    # first word of the title key -> entries
+
+    def _find(self, book_isbn, title, authors):
+        if book_isbn and book_isbn in self.by_isbn:
+            return self.by_isbn[book_isbn]
+        words = title.split()
+        block = self.blocks.get(words[0], ()) if words else ()
+        if not block:
+            return None
+        similarity = None
+        for entry in block:
+            if book_isbn and entry.isbn and entry.isbn != book_isbn:
+                continue
+            if authors and entry.authors:
+                if authors.isdisjoint(entry.authors):
+                    continue
+            elif title != entry.title:
+                # Without an author to compare only an exact title will do
+                continue
+            if title == entry.title:
+                return entry
+            # The length difference alone can rule out a match
+            if 2 * min(len(title), len(entry.title)) < TITLE_THRESHOLD * (len(title) + len(entry.title)):
+                continue
+            if similarity is None:
+                similarity = scoring.Scorer(title).similarity
+            if similarity(entry.title) >= TITLE_THRESHOLD:
+                return entry
+        return None
+
+    def add(self, book):
+        """
+        Adds book and returns True if it starts a new cluster (book is then
+        the cluster's record), False if it was merged into an existing record.
+        """
+        return self.merge_into(book) is book
+
+    def merge_into(self, book):
+        """
+        Like add, but returns the record book ended up in: book itself if it
+        starts a new cluster, else the existing record it was merged into.
+        """
+        book_isbn = isbn.normalize(book.get("isbn"))
+        title = title_key(book["title"])
+        authors = author_names(book["author"])
+        entry = self._find(book_isbn, title, authors)
+        if entry is not None:
+            merge(entry.record, book)
+            if entry.isbn is None and book_isbn:
+                entry.isbn = book_isbn
+                self.by_isbn[book_isbn] = entry
+            return entry.record
+
+        book.setdefault("sources", [book["source"]])
+        entry = _Entry(book, book_isbn, title, authors)
+        if entry.isbn:
+            self.by_isbn.setdefault(entry.isbn, entry)
+        words = title.split()
+        if words:
+            self.blocks.setdefault(words[0], []).append(entry)
+        return book
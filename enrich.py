@@ -0,0 +1,203 @@
+"""
+Fills in missing ISBNs, page counts, summaries, covers, publishers and links
+for books already in the library (typically after a CSV import), using the
+metadata providers in api.py.
+
+Books are processed in id order, BATCH_SIZE at a time, with a few lookups in
+flight at once; http_client's per-host rate limits keep the providers happy.
+Each batch is written in one transaction together with the user's
+checkpoint (enrichment_progress), so a stopped or crashed run continues
+where it left off. Books whose lookup failed (a network error, say) are
+recorded in enrichment_failures and retried first by the next run. Only
+fields that are still missing are written; nothing the user entered is
+overwritten.
+
+Usage: python enrich.py [--user ID] [--batch-size N] [--workers N] [--limit N] [--restart] [--db PATH]
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import api
+import database
+import db_manager
+import dedup
+import isbn
+import scoring
+
+BATCH_SIZE = 25
+WORKERS = 3
+# How close a provider result's title has to be to the book's (0..1)
+TITLE_THRESHOLD = 0.85
+
+
+def best_match(book, results):
+    """
+    Returns the result that is the same book as row book (title close
+    enough, an author name in common), or None.
+    """
+    _, title, author = book[:3]
+    wanted_title = dedup.title_key(title)
+    wanted_authors = dedup.author_names(author)
+    similarity = scoring.Scorer(wanted_title).similarity
+    best = None
+    best_similarity = TITLE_THRESHOLD
+    for result in results:
+        authors = dedup.author_names(result["author"])
+        if wanted_authors and authors and wanted_authors.isdisjoint(authors):
+            continue
+        value = similarity(dedup.title_key(result["title"]))
+        if value >= best_similarity:
+            best, best_similarity = result, value
+    return best
+
+
+def lookup(book):
+    """
+    Returns the provider result for a books row, or None if nothing matches.
+    A valid ISBN in the row is looked up directly; otherwise every provider
+    is searched by title and author.
+    """
+    _, title, author, book_isbn = book[:4]
+    if isbn.parse(book_isbn or ""):
+        hits = api.resolve_isbn(book_isbn)
+        if hits:
+            return hits[0]
+    return best_match(book, api.get_book_metadata(f"{title} {author}"))
+
+
+def update_for(book, result):
+    """
+    Returns the save_enrichment update for a books row from a provider
+    result: the fields the result actually has, None for the rest.
+    """
+    found = isbn.normalize(result.get("isbn"))
+    return {
+        "id": book[0],
+        "isbn": found,
+        "page_count": result.get("page_count") or None,
+        "summary": result["summary"] if dedup.is_real_summary(result.get("summary")) else None,
+        "cover_url": result.get("cover_url") or None,
+        "publisher": result["publisher"] if result.get("publisher") not in dedup.MISSING_PUBLISHERS else None,
+        "link": result.get("link") or None,
+    }
+
+
+class EnrichmentJob:
+    """
+    Enriches one user's incomplete books. run() blocks until every book is
+    checked, limit books were checked, or stop() is called (the current
+    batch is finished first). on_progress(stats) is called after each batch
+    with a dict of checked, enriched, not_found, failed, remaining,
+    books_per_minute and elapsed seconds for this run.
+    """
+    def __init__(self, user_id, batch_size=BATCH_SIZE, workers=WORKERS, limit=None, on_progress=None):
+        self.user_id = user_id
+        self.checkpoint = 0
+        self.batch_size = batch_size
+        self.workers = workers
+        self.limit = limit
+        self.on_progress = on_progress
+        self.stopping = threading.Event()
+
+    def stop(self):
+        self.stopping.set()
+
+    def _check(self, book):
+        try:
+            result = lookup(book)
+        except Exception as e:
+            print(f"Enrichment lookup failed for book {book[0]}: {e}")
+            return "failed", None
+        if result is None:
+            return "not_found", None
+        return "enriched", update_for(book, result)
+
+    def run(self):
+        progress = database.get_enrichment_progress(self.user_id)
+        self.checkpoint = progress[0] if progress else 0
+        stats = {"checked": 0, "enriched": 0, "not_found": 0, "failed": 0}
+        start = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="enrich") as executor:
+            # Failures of earlier runs first; they don't move the checkpoint
+            self._run_pass(executor, database.get_failed_enrichment_books, False, stats, start)
+            self._run_pass(executor, database.get_incomplete_books, True, stats, start)
+        return stats
+
+    def _run_pass(self, executor, fetch, advance, stats, start):
+        # fetch(user_id, after_id, limit) returns the next books in id order
+        last_id = self.checkpoint if advance else 0
+        while not self.stopping.is_set():
+            size = self.batch_size
+            if self.limit is not None:
+                size = min(size, self.limit - stats["checked"])
+                if size <= 0:
+                    break
+            books = fetch(self.user_id, last_id, size)
+            if not books:
+                break
+
+            outcomes = list(executor.map(self._check, books))
+            updates = [update for outcome, update in outcomes if update]
+            counts = {key: sum(1 for outcome, _ in outcomes if outcome == key) for key in ("enriched", "not_found", "failed")}
+            failed_ids = [book[0] for book, (outcome, _) in zip(books, outcomes) if outcome == "failed"]
+            last_id = books[-1][0]
+            if advance:
+                self.checkpoint = last_id
+            database.save_enrichment(self.user_id, updates, self.checkpoint, [book[0] for book in books],
+                                     counts["enriched"], failed_ids)
+
+            stats["checked"] += len(books)
+            for key, count in counts.items():
+                stats[key] += count
+            if self.on_progress:
+                elapsed = time.monotonic() - start
+                self.on_progress(dict(
+                    stats,
+                    remaining=database.count_incomplete_books(self.user_id, self.checkpoint),
+                    books_per_minute=stats["checked"] / elapsed * 60 if elapsed else 0.0,
+                    elapsed=elapsed,
+                ))
+
+
+def print_progress(stats):
+    rate = stats["books_per_minute"]
+    eta = stats["remaining"] / rate * 60 if rate else 0
+    print(f"checked {stats['checked']}: {stats['enriched']} enriched, {stats['not_found']} not found, "
+          f"{stats['failed']} failed | {rate:.1f} books/min, {stats['remaining']} left, "
+          f"ETA {int(eta // 3600)}h{int(eta % 3600 // 60):02d}m")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fill in missing book metadata from the online providers.")
+    parser.add_argument("--user", type=int, help="user id to enrich (default: every user)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="lookups in flight at once")
+    parser.add_argument("--limit", type=int, help="stop after checking this many books")
+    parser.add_argument("--restart", action="store_true", help="forget the checkpoint and start from the first book")
+    parser.add_argument("--db", help="database file (default: LIBRIS_DB or library.db)")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        db_manager.set_database_path(args.db)
+    database.init_db()
+    user_ids = [args.user] if args.user is not None else [user[0] for user in database.get_all_users()]
+
+    for user_id in user_ids:
+        if args.restart:
+            database.reset_enrichment_progress(user_id)
+        print(f"User {user_id}: {database.count_incomplete_books(user_id)} incomplete books")
+        job = EnrichmentJob(user_id, args.batch_size, args.workers, args.limit, on_progress=print_progress)
+        try:
+            job.run()
+        except KeyboardInterrupt:
+            # Batches already written are kept; the next run resumes after them
+            print("Stopped; run again to continue.")
+            break
+    db_manager.close_all()
+
+
+if __name__ == "__main__":
+    main()
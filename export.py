@@ -0,0 +1,171 @@
+"""
+Streams a user's library (shelves, books, quotes, sessions, vocabulary, tags)
+out of SQLite into CSV, JSONL or Parquet files with constant memory.
+
+Usage:
+    python export.py --format jsonl --out backups/
+    python export.py --user 1 --format csv --out backups/ --db library.db
+"""
+import argparse
+import csv
+import datetime
+import gzip
+import json
+import os
+import sys
+
+import database
+import db_manager
+
+EXPORT_TABLES = list(database.EXPORT_QUERIES)
+FORMATS = ["csv", "jsonl", "parquet"]
+
+
+def export_library(user_id, out_dir, fmt="csv", chunk_size=1000, compress=False):
+    """
+    Writes every exported table of the user's library into out_dir.
+    csv and parquet produce one file per table, jsonl a single file whose
+    records carry a "table" field. Returns the written paths.
+    All tables are read in one read transaction, so the files are a
+    consistent snapshot even while the app keeps writing.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    os.makedirs(out_dir, exist_ok=True)
+    with db_manager.transaction(write=False):
+        return _export_tables(user_id, out_dir, fmt, chunk_size, compress)
+
+
+def _export_tables(user_id, out_dir, fmt, chunk_size, compress):
+    prefix = os.path.join(out_dir, f"libris_{user_id}")
+
+    if fmt == "jsonl":
+        path = prefix + (".jsonl.gz" if compress else ".jsonl")
+        _write_jsonl(user_id, path, chunk_size, compress)
+        return [path]
+
+    paths = []
+    for table in EXPORT_TABLES:
+        if fmt == "csv":
+            path = f"{prefix}_{table}.csv" + (".gz" if compress else "")
+            _write_csv(user_id, table, path, chunk_size, compress)
+        else:
+            path = f"{prefix}_{table}.parquet"
+            _write_parquet(user_id, table, path, chunk_size)
+        paths.append(path)
+    return paths
+
+
+def _open_text(path, compress):
+    if compress:
+        return gzip.open(path, 'wt', newline='', encoding='utf-8')
+    # utf-8-sig so Excel opens Turkish characters correctly
+    return open(path, 'w', newline='', encoding='utf-8-sig')
+
+
+def _write_csv(user_id, table, path, chunk_size, compress):
+    with _open_text(path, compress) as f:
+        writer = csv.writer(f)
+        header_written = False
+        for columns, rows in database.iter_export_chunks(user_id, table, chunk_size):
+            if not header_written:
+                writer.writerow(columns)
+                header_written = True
+            writer.writerows(rows)
+
+
+def _write_jsonl(user_id, path, chunk_size, compress):
+    opener = gzip.open if compress else open
+    with opener(path, 'wt', encoding='utf-8') as f:
+        for table in EXPORT_TABLES:
+            for columns, rows in database.iter_export_chunks(user_id, table, chunk_size):
+                for row in rows:
+                    record = {"table": table}
+                    record.update(zip(columns, row))
+                    f.write(json.dumps(record, ensure_ascii=False))
+                    f.write("\n")
+
+
+def _column_type(pa, declared):
+    # The schema follows the columns' declared types (SQLite type affinity
+    # rules), so it doesn't depend on which rows come first
+    if "INT" in declared:
+        return pa.int64()
+    if any(kind in declared for kind in ("REAL", "FLOA", "DOUB")):
+        return pa.float64()
+    return pa.string()
+
+
+def _coerce(pa, value, pa_type):
+    # SQLite lets any column hold any type; a value that doesn't fit the
+    # declared type raises rather than being dropped from the backup
+    if value is None:
+        return value
+    if pa_type == pa.int64():
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        if isinstance(value, int):
+            return value
+        raise ValueError(f"{value!r} is not an integer")
+    if pa_type == pa.float64():
+        if isinstance(value, (int, float)):
+            return float(value)
+        raise ValueError(f"{value!r} is not a number")
+    return str(value)
+
+
+def _write_parquet(user_id, table, path, chunk_size):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+
+    declared = database.get_export_column_types(table)
+    writer = None
+    schema = None
+    try:
+        for columns, rows in database.iter_export_chunks(user_id, table, chunk_size):
+            if schema is None:
+                schema = pa.schema([(name, _column_type(pa, declared.get(name, ""))) for name in columns])
+                writer = pq.ParquetWriter(path, schema, compression="zstd")
+            # Each chunk becomes one row group
+            arrays = []
+            for i, field in enumerate(schema):
+                try:
+                    values = [_coerce(pa, row[i], field.type) for row in rows]
+                except ValueError as e:
+                    raise RuntimeError(f"Parquet export of {table}.{field.name} failed: {e}")
+                arrays.append(pa.array(values, type=field.type))
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export Libris libraries for backup.")
+    parser.add_argument("--user", type=int, help="user id to export (default: every user)")
+    parser.add_argument("--format", choices=FORMATS, default="jsonl")
+    parser.add_argument("--out", default=os.path.join("backups", datetime.date.today().isoformat()))
+    parser.add_argument("--db", help="database file (default: LIBRIS_DB or library.db)")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--gzip", action="store_true", help="gzip csv/jsonl output")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        db_manager.set_database_path(args.db)
+
+    user_ids = [args.user] if args.user is not None else [u[0] for u in database.get_all_users()]
+    try:
+        for user_id in user_ids:
+            for path in export_library(user_id, args.out, args.format, args.chunk_size, args.gzip):
+                print(path)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+HTML parsing for the scrapers in api.py.
+
+Pages are parsed with BeautifulSoup using the fastest tree builder that is
+installed: lxml if available, otherwise Python's built-in html.parser. Set
+LIBRIS_HTML_PARSER to force one. Scrapers pass a filter built with only()
+so that just the parts of the page they read are turned into a tree; the
+rest of the markup is skipped as it is tokenized.
+"""
+import os
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401
+    _DEFAULT_PARSER = "lxml"
+except ImportError:
+    _DEFAULT_PARSER = "html.parser"
+
+PARSER = os.environ.get("LIBRIS_HTML_PARSER", _DEFAULT_PARSER)
+
+# bs4 4.13 decides which tags to build through allow_tag_creation(); older
+# versions use a different strainer protocol, where we just parse everything.
+_CAN_STRAIN = hasattr(SoupStrainer, "allow_tag_creation")
+
+
+class _Subtrees(SoupStrainer):
+    """
+    Keeps the tags with one of the given ids or classes, or a <meta> with
+    one of the given names, along with everything inside them. Checked for
+    every start tag, so it looks at the raw attributes directly rather than
+    going through SoupStrainer's general matching.
+    """
+    def __init__(self, ids, classes, meta):
+        super().__init__()
+        self.ids = frozenset(ids)
+        self.classes = frozenset(classes)
+        self.meta = frozenset(meta)
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        if not attrs:
+            return False
+        if attrs.get("id") in self.ids:
+            return True
+        classes = attrs.get("class")
+        if classes:
+            if isinstance(classes, str):
+                classes = classes.split()
+            if not self.classes.isdisjoint(classes):
+                return True
+        return name == "meta" and attrs.get("name") in self.meta
+
+    def allow_string_creation(self, string):
+        # Text is only wanted inside the kept tags
+        return False
+
+
+def only(ids=(), classes=(), meta=()):
+    """
+    Returns a parse_only filter keeping the elements with any of the given
+    ids or classes, and <meta name=...> tags with the given names; None
+    (parse everything) on older bs4.
+    """
+    if not _CAN_STRAIN:
+        return None
+    return _Subtrees(ids, classes, meta)
+
+
+def parse(html, parse_only=None, parser=None):
+    """
+    Returns a BeautifulSoup tree of html, limited to parse_only if given.
+    """
+    return BeautifulSoup(html, parser or PARSER, parse_only=parse_only)
@@ -0,0 +1,207 @@
+"""
+Shared HTTP layer for the metadata providers in api.py.
+
+Every host gets one keep-alive requests.Session with a bounded connection
+pool, a limit on concurrent requests and an optional token-bucket rate
+limit. get() retries connection errors, timeouts and 429/5xx responses a
+few times with jittered exponential backoff, honouring Retry-After.
+stats() reports how many requests reused a pooled connection.
+set_transport() swaps the adapter the sessions send through (replay.py uses
+it to record provider traffic and to replay it offline).
+"""
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+import requests.adapters
+
+# Concurrent requests (and pooled connections) per host
+HOST_CONNECTIONS = 3
+
+MAX_RETRIES = 2
+BACKOFF_BASE = 0.3      # seconds; attempt n waits up to BACKOFF_BASE * 2**n
+# Longest wait before a retry; a server asking for more (Retry-After) gets
+# no retry, so a caller without a deadline can't be parked for minutes
+MAX_RETRY_DELAY = 10
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# host -> (requests per second, burst). Hosts not listed aren't throttled.
+RATE_LIMITS = {
+    "www.googleapis.com": (5, 10),
+    "openlibrary.org": (3, 5),
+    "itunes.apple.com": (1, 5),     # documented limit is ~20 calls a minute
+    "www.kitapyurdu.com": (4, 8),
+}
+
+DEFAULT_HEADERS = {
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+}
+
+
+class RateLimited(requests.exceptions.RequestException):
+    """
+    Raised when a request would have to wait for the rate limit past its deadline.
+    """
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Takes a token and returns how long the caller must wait before using it.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self):
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class _Host:
+    def __init__(self, host):
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        # Retries are done in get(), where they can respect rate limits and deadlines
+        self.adapter = _transport(pool_connections=2, pool_maxsize=HOST_CONNECTIONS, max_retries=0)
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self.slots = threading.BoundedSemaphore(HOST_CONNECTIONS)
+        limit = RATE_LIMITS.get(host)
+        self.bucket = TokenBucket(*limit) if limit else None
+        self.counter_lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0.0
+
+    def count(self, requests=0, retries=0, throttled=0.0):
+        with self.counter_lock:
+            self.requests += requests
+            self.retries += retries
+            self.throttled += throttled
+
+    def connections_opened(self):
+        # urllib3 counts the connections each pool has had to open
+        pools = self.adapter.poolmanager.pools
+        opened = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                opened += pool.num_connections
+        return opened
+
+
+_hosts = {}
+_lock = threading.Lock()
+_transport = requests.adapters.HTTPAdapter
+
+
+def set_transport(factory):
+    """
+    Makes every session send through factory(**HTTPAdapter kwargs) from now
+    on, and returns the previous factory. Existing sessions (and their
+    counters) are dropped.
+    """
+    global _transport
+    with _lock:
+        previous, _transport = _transport, factory
+        for state in _hosts.values():
+            state.session.close()
+        _hosts.clear()
+    return previous
+
+
+def _host(url):
+    host = urlsplit(url).netloc
+    with _lock:
+        state = _hosts.get(host)
+        if state is None:
+            state = _hosts[host] = _Host(host)
+    return state
+
+
+def _retry_delay(attempt, response=None):
+    if response is not None:
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return float(retry_after)
+    # "Full jitter" keeps concurrent clients from retrying in lockstep
+    return random.uniform(0, BACKOFF_BASE * 2 ** attempt)
+
+
+def get(url, params=None, headers=None, timeout=5, retries=MAX_RETRIES, deadline=None):
+    """
+    requests.get through the host's pooled session, with retries and rate
+    limiting. deadline is a time.monotonic() value: no attempt, wait or
+    timeout extends past it. Returns the last response (callers check the
+    status); raises the last network error if every attempt failed.
+    """
+    state = _host(url)
+    attempt = 0
+    while True:
+        if state.bucket:
+            wait = state.bucket.reserve()
+            if deadline is not None and time.monotonic() + wait >= deadline:
+                state.bucket.refund()
+                raise RateLimited(f"Rate limit for {urlsplit(url).netloc} would pass the deadline")
+            if wait:
+                state.count(throttled=wait)
+                time.sleep(wait)
+
+        attempt_timeout = timeout
+        if deadline is not None:
+            attempt_timeout = min(timeout, max(deadline - time.monotonic(), 0.1))
+
+        response = None
+        error = None
+        try:
+            with state.slots:
+                state.count(requests=1)
+                response = state.session.get(url, params=params, headers=headers, timeout=attempt_timeout)
+            if response.status_code not in RETRY_STATUSES:
+                return response
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            error = e
+
+        delay = _retry_delay(attempt, response)
+        if (attempt >= retries or delay > MAX_RETRY_DELAY
+                or (deadline is not None and time.monotonic() + delay >= deadline)):
+            if error:
+                raise error
+            return response
+        attempt += 1
+        state.count(retries=1)
+        time.sleep(delay)
+
+
+def stats():
+    """
+    Returns per-host counters: requests sent, connections opened and reused,
+    retries, and seconds spent waiting for the rate limit.
+    """
+    with _lock:
+        hosts = dict(_hosts)
+    result = {}
+    for host, state in hosts.items():
+        opened = state.connections_opened()
+        result[host] = {
+            "requests": state.requests,
+            "connections_opened": opened,
+            "connections_reused": max(state.requests - opened, 0),
+            "retries": state.retries,
+            "throttled_seconds": round(state.throttled, 3),
+        }
+    return result
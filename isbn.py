@@ -0,0 +1,76 @@
+"""
+ISBN helpers: providers report ISBNs as ISBN-10 or ISBN-13, with or without
+hyphens, so comparisons go through normalize(), which returns the ISBN-13.
+parse() is the strict version for user input: it also checks the check digit.
+"""
+import re
+
+_SEPARATORS = re.compile(r"[\s-]")
+
+
+def compact(value):
+    """
+    Strips hyphens and spaces and upper-cases a trailing x.
+    """
+    return _SEPARATORS.sub("", value or "").upper()
+
+
+def isbn13_check_digit(first12):
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(first12))
+    return str((10 - total % 10) % 10)
+
+
+def isbn10_check_digit(first9):
+    total = sum(int(d) * (10 - i) for i, d in enumerate(first9))
+    check = (11 - total % 11) % 11
+    return "X" if check == 10 else str(check)
+
+
+def is_valid(value):
+    """
+    True if value is an ISBN-10 or ISBN-13 with a correct check digit.
+    """
+    value = compact(value)
+    if len(value) == 13 and value.isdigit():
+        return value[12] == isbn13_check_digit(value[:12])
+    if len(value) == 10 and value[:9].isdigit():
+        return value[9] == isbn10_check_digit(value[:9])
+    return False
+
+
+def to_isbn13(isbn10):
+    """
+    Converts a compact ISBN-10 to ISBN-13 (prefix 978, new check digit).
+    """
+    first12 = "978" + isbn10[:9]
+    return first12 + isbn13_check_digit(first12)
+
+
+def to_isbn10(isbn13):
+    """
+    Converts a compact ISBN-13 to ISBN-10; None for 979 ISBNs, which have no
+    ISBN-10.
+    """
+    if not isbn13.startswith("978"):
+        return None
+    return isbn13[3:12] + isbn10_check_digit(isbn13[3:12])
+
+
+def normalize(value):
+    """
+    Returns the ISBN-13 for an ISBN-10 or ISBN-13 string, or None if value
+    doesn't look like one ("Bilinmiyor", other identifiers).
+    """
+    value = compact(value)
+    if len(value) == 13 and value.isdigit():
+        return value
+    if len(value) == 10 and value[:9].isdigit() and (value[9].isdigit() or value[9] == "X"):
+        return to_isbn13(value)
+    return None
+
+
+def parse(query):
+    """
+    Returns the ISBN-13 if query is a valid ISBN-10 or ISBN-13, else None.
+    """
+    return normalize(query) if is_valid(query) else None
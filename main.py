@@ -1,5 +1,6 @@
 import flet as ft
 import database
+import tasks
 from ui.app_layout import AppLayout
 from ui.dashboard import Dashboard
 from ui.add_book import AddBook
@@ -21,6 +22,8 @@ def main(page: ft.Page):
     
     # Initialize Database
     database.init_db()
+    # Stop background work still running when the window closes
+    page.on_disconnect = lambda e: tasks.RUNNER.shutdown()
 
     class LibraryApp:
         def __init__(self, page):
@@ -0,0 +1,154 @@
+"""
+Persistent cache for the book metadata providers in api.py.
+
+Responses are stored per (source, normalized query) in a small SQLite file.
+A fresh entry is returned without touching the network. Once it passes its
+source's TTL it is still returned, and a background refresh is started
+(stale-while-revalidate); past STALE_FOR it counts as missing. Empty results
+are cached too, for the shorter NEGATIVE_TTL, so a query that finds nothing
+isn't retried on every keystroke. Failed fetches are never cached, and
+neither are results a fetcher marks as Incomplete. Sources whose TTL is
+None (ISBN lookups: an ISBN names one edition for good) keep their results
+permanently.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import db_manager
+
+# Override with LIBRIS_METADATA_CACHE.
+CACHE_PATH = os.environ.get("LIBRIS_METADATA_CACHE", "metadata_cache.db")
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# How long a response stays fresh, per source
+TTLS = {
+    "google": 7 * DAY,
+    "google_query": 7 * DAY,  # api.search_books
+    "openlibrary": 7 * DAY,
+    "itunes": 3 * DAY,
+    "kitapyurdu": 1 * DAY,   # prices and stock change, and so do the listings
+    "isbn": None,            # never expires
+}
+NEGATIVE_TTL = 6 * HOUR
+# How long past its TTL an entry may still be served while it is refreshed
+STALE_FOR = 30 * DAY
+
+
+class Incomplete(list):
+    """
+    Results a fetcher had to cut short, e.g. at a deadline. cached_fetch
+    returns them but doesn't store them, so the next lookup fetches again.
+    """
+
+
+_refreshing = set()
+_lock = threading.Lock()
+_executor = None
+_schema_ready = False
+
+
+def normalize_query(query):
+    """
+    Cache key for a query: whitespace collapsed and lower-cased with Turkish
+    rules (I -> ı, İ -> i); ISBNs lose their hyphens and spaces.
+    """
+    compact = query.replace("-", "").replace(" ", "")
+    if compact.isdigit() and len(compact) in (10, 13):
+        return compact
+    query = query.replace("I", "ı").replace("İ", "i").lower()
+    return " ".join(query.split())
+
+
+def _connection():
+    global _schema_ready
+    if not _schema_ready:
+        with db_manager.transaction(CACHE_PATH) as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS lookups (
+                                source text NOT NULL,
+                                query text NOT NULL,
+                                results text NOT NULL,
+                                fetched_at real NOT NULL,
+                                PRIMARY KEY (source, query)
+                            ) WITHOUT ROWID""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_lookups_fetched ON lookups(fetched_at)")
+            # Drop entries too old to be served even as stale
+            permanent = [source for source, ttl in TTLS.items() if ttl is None]
+            conn.execute(
+                f"""DELETE FROM lookups WHERE fetched_at < ?
+                    AND (source NOT IN ({','.join('?' * len(permanent))}) OR results = '[]')""",
+                [time.time() - max(ttl for ttl in TTLS.values() if ttl) - STALE_FOR, *permanent]
+            )
+        _schema_ready = True
+    return db_manager.get_connection(CACHE_PATH)
+
+
+def lookup(source, query):
+    """
+    Returns (results, age_in_seconds) for a cached response, or None.
+    """
+    row = _connection().execute(
+        "SELECT results, fetched_at FROM lookups WHERE source=? AND query=?",
+        (source, normalize_query(query))
+    ).fetchone()
+    if row is None:
+        return None
+    return json.loads(row[0]), time.time() - row[1]
+
+
+def store(source, query, results):
+    _connection().execute(
+        "INSERT OR REPLACE INTO lookups(source, query, results, fetched_at) VALUES(?,?,?,?)",
+        (source, normalize_query(query), json.dumps(results, ensure_ascii=False), time.time())
+    )
+
+
+def _refresh(source, query, fetch):
+    key = (source, normalize_query(query))
+    try:
+        results = fetch(query)
+        if not isinstance(results, Incomplete):
+            store(source, query, results)
+    except Exception as e:
+        # Keep serving the stale entry; the next lookup tries again
+        print(f"Background refresh failed for {source} '{query}': {e}")
+    finally:
+        with _lock:
+            _refreshing.discard(key)
+
+
+def _schedule_refresh(source, query, fetch):
+    global _executor
+    key = (source, normalize_query(query))
+    with _lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="metadata-refresh")
+    _executor.submit(_refresh, source, query, fetch)
+
+
+def cached_fetch(source, query, fetch):
+    """
+    Returns fetch(query) through the cache. fetch must raise when the
+    upstream call fails, so errors aren't cached as "no results".
+    """
+    cached = lookup(source, query)
+    if cached is not None:
+        results, age = cached
+        ttl = TTLS[source] if results else NEGATIVE_TTL
+        if ttl is None or age < ttl:
+            return results
+        if age < ttl + STALE_FOR:
+            _schedule_refresh(source, query, fetch)
+            return results
+
+    results = fetch(query)
+    if not isinstance(results, Incomplete):
+        store(source, query, results)
+    return results
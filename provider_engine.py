@@ -0,0 +1,166 @@
+"""
+asyncio engine that runs the book metadata providers concurrently.
+
+A Provider is anything with a name and an async fetch(query) returning a
+list of book dicts (the format api.py's fetchers produce). The engine starts
+every provider at once, hands results back as each one finishes, and cancels
+whatever is still running at the deadline, so one slow source can't hold up
+the others.
+
+From async code (e.g. a Flet async handler) await engine.search(query) or
+iterate engine.stream(query). Sync code calls engine.search_sync(query) or
+iterates engine.stream_sync(query); both run on a background event loop and
+work from any thread.
+"""
+import asyncio
+import functools
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metadata_cache
+
+# Seconds a search may take before unfinished providers are dropped
+DEFAULT_DEADLINE = 8
+
+
+class Provider:
+    """
+    A metadata source. Subclasses set name and implement fetch(), which
+    raises when the source fails.
+    """
+    name = None
+
+    async def fetch(self, query):
+        raise NotImplementedError
+
+
+class SyncProvider(Provider):
+    """
+    Wraps a blocking fetcher such as api.fetch_google_books. Calls go through
+    metadata_cache and run on a shared thread pool; the HTTP work itself is
+    pooled and rate limited by http_client.
+    """
+    _executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="provider")
+
+    def __init__(self, name, fetch, cached=True):
+        self.name = name
+        self.func = fetch
+        self.cached = cached
+
+    async def fetch(self, query):
+        if self.cached:
+            call = functools.partial(metadata_cache.cached_fetch, self.name, query, self.func)
+        else:
+            call = functools.partial(self.func, query)
+        # A cancelled await doesn't stop the worker thread; it finishes within
+        # its HTTP timeouts and its result is dropped (but still cached).
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+
+class ProviderEngine:
+    def __init__(self, providers=(), deadline=DEFAULT_DEADLINE):
+        self.providers = list(providers)
+        self.deadline = deadline
+
+    def register(self, provider):
+        self.providers.append(provider)
+
+    async def stream(self, query, deadline=None):
+        """
+        Yields (provider_name, results) in the order providers finish.
+        Failed providers are logged and skipped; the ones still running after
+        deadline seconds are cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        end = loop.time() + (deadline if deadline is not None else self.deadline)
+        tasks = {asyncio.ensure_future(provider.fetch(query)): provider for provider in self.providers}
+        pending = set(tasks)
+        try:
+            while pending:
+                timeout = end - loop.time()
+                if timeout <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = tasks[task].name
+                    try:
+                        results = task.result()
+                    except Exception as e:
+                        print(f"{name} provider failed: {e}")
+                        continue
+                    yield name, results
+            for task in pending:
+                print(f"{tasks[task].name} provider missed the deadline")
+        finally:
+            # Also runs when the consumer stops iterating early
+            for task in pending:
+                task.cancel()
+
+    async def search(self, query, deadline=None):
+        """
+        Returns the combined results of every provider that finished in time.
+        """
+        results = []
+        async for name, batch in self.stream(query, deadline):
+            results.extend(batch)
+        return results
+
+    def search_sync(self, query, deadline=None):
+        """
+        Blocking search() for sync callers, including threads that already
+        run an event loop.
+        """
+        loop = _background_loop()
+        if _running_loop() is loop:
+            raise RuntimeError("search_sync() can't be called from the engine's own loop; await search()")
+        return asyncio.run_coroutine_threadsafe(self.search(query, deadline), loop).result()
+
+    def stream_sync(self, query, deadline=None):
+        """
+        Blocking stream() for sync callers: a generator of (provider_name,
+        results). Closing it early cancels the providers still running.
+        """
+        loop = _background_loop()
+        if _running_loop() is loop:
+            raise RuntimeError("stream_sync() can't be called from the engine's own loop; use stream()")
+        items = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for item in self.stream(query, deadline):
+                    items.put(item)
+            finally:
+                items.put(done)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), loop)
+        try:
+            while True:
+                item = items.get()
+                if item is done:
+                    break
+                yield item
+            future.result()
+        finally:
+            future.cancel()
+
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _background_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="provider-engine", daemon=True).start()
+    return _loop
@@ -0,0 +1,283 @@
+"""
+Record and replay the HTTP traffic of the metadata providers in api.py, so
+they can be benchmarked and debugged without the live services.
+
+Recording sends requests as usual and saves every response as a JSON
+fixture under FIXTURE_DIR/<host>/, keyed by method and URL (query
+parameters in any order):
+
+    python replay.py record "Kürk Mantolu Madonna" 9789750719387
+
+Replaying starts a ReplayServer on localhost, which answers from the
+fixtures with optional injected latency and failures, and points
+http_client at it:
+
+    with ReplayServer(latency={"www.kitapyurdu.com": 0.3}, failure_rate=0.05) as server:
+        replay_through(server)
+        api.get_book_metadata("Kürk Mantolu Madonna")
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests.adapters
+
+import http_client
+
+# Override with LIBRIS_FIXTURES.
+FIXTURE_DIR = os.environ.get("LIBRIS_FIXTURES", os.path.join("fixtures", "providers"))
+
+# Response headers worth keeping; the body is stored decoded, so transfer
+# and content encodings are dropped.
+KEPT_HEADERS = ("Content-Type", "Retry-After")
+
+
+def fixture_key(method, url):
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return f"{method} {parts.scheme}://{parts.netloc}{parts.path}?{query}"
+
+
+def fixture_path(fixture_dir, method, url):
+    key = fixture_key(method, url)
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(fixture_dir, urlsplit(url).netloc, f"{digest}.json")
+
+
+def save_fixture(fixture_dir, method, url, status, headers, body):
+    fixture = {
+        "key": fixture_key(method, url),
+        "status": status,
+        "headers": {name: headers[name] for name in KEPT_HEADERS if name in headers},
+    }
+    try:
+        fixture["body"] = body.decode("utf-8")
+    except UnicodeDecodeError:
+        fixture["body_base64"] = base64.b64encode(body).decode("ascii")
+    path = fixture_path(fixture_dir, method, url)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(fixture, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def load_fixture(fixture_dir, method, url):
+    """
+    Returns (status, headers, body bytes) for a recorded request, or None.
+    """
+    try:
+        with open(fixture_path(fixture_dir, method, url), encoding="utf-8") as f:
+            fixture = json.load(f)
+    except FileNotFoundError:
+        return None
+    if "body_base64" in fixture:
+        body = base64.b64decode(fixture["body_base64"])
+    else:
+        body = fixture["body"].encode("utf-8")
+    return fixture["status"], fixture["headers"], body
+
+
+class RecordingAdapter(requests.adapters.HTTPAdapter):
+    """
+    Sends requests normally and saves each response to fixture_dir.
+    """
+    fixture_dir = FIXTURE_DIR
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        save_fixture(self.fixture_dir, request.method, request.url,
+                     response.status_code, response.headers, response.content)
+        return response
+
+
+class ReplayAdapter(requests.adapters.HTTPAdapter):
+    """
+    Sends every request to a ReplayServer instead of its real host.
+    """
+    server_url = None
+
+    def send(self, request, **kwargs):
+        request = request.copy()
+        parts = urlsplit(request.url)
+        request.url = f"{self.server_url}/{parts.scheme}/{parts.netloc}{parts.path}"
+        if parts.query:
+            request.url += "?" + parts.query
+        return super().send(request, **kwargs)
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive, like the real services
+
+    def do_GET(self):
+        server = self.server.replay
+        scheme, _, rest = self.path.lstrip("/").partition("/")
+        url = f"{scheme}://{rest}"
+        host = urlsplit(url).netloc
+
+        delay, failed = server.injected(host)
+        if delay:
+            time.sleep(delay)
+        if failed:
+            status, headers, body = server.fail_status, {}, b""
+        else:
+            response = load_fixture(server.fixture_dir, "GET", url)
+            if response is None and server.fallback is not None:
+                response = server.fallback(url)
+            if response is None:
+                server.missing.add(fixture_key("GET", url))
+                response = 404, {"Content-Type": "text/plain"}, b"No fixture recorded"
+            status, headers, body = response
+        server.count(host)
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ReplayServer:
+    """
+    Local stand-in for the provider hosts, serving recorded fixtures.
+
+    latency and failure_rate are a number for every host or a dict of
+    host -> value; each response waits latency seconds (+/- jitter, as a
+    fraction) and fails with fail_status at failure_rate. fallback(url),
+    if given, answers requests that have no fixture with (status, headers,
+    body bytes) or None. Requests with no answer get a 404 and are listed in
+    missing.
+    """
+    def __init__(self, fixture_dir=FIXTURE_DIR, latency=0.0, jitter=0.25, failure_rate=0.0,
+                 fail_status=503, fallback=None, seed=None):
+        self.fixture_dir = fixture_dir
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.fail_status = fail_status
+        self.fallback = fallback
+        self.missing = set()
+        self.requests = {}
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.httpd = None
+
+    @staticmethod
+    def _for_host(value, host):
+        return value.get(host, 0) if isinstance(value, dict) else value
+
+    def injected(self, host):
+        """
+        Returns (delay in seconds, whether to fail) for the next response from host.
+        """
+        latency = self._for_host(self.latency, host)
+        with self.lock:
+            delay = latency * (1 + self.rng.uniform(-self.jitter, self.jitter)) if latency else 0
+            failed = self.rng.random() < self._for_host(self.failure_rate, host)
+        return delay, failed
+
+    def count(self, host):
+        with self.lock:
+            self.requests[host] = self.requests.get(host, 0) + 1
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), _ReplayHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.replay = self
+        threading.Thread(target=self.httpd.serve_forever, name="replay-server", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def replay_through(server):
+    """
+    Sends all http_client traffic to server from now on. Returns the previous
+    transport for http_client.set_transport().
+    """
+    adapter = type("BoundReplayAdapter", (ReplayAdapter,), {"server_url": server.url})
+    return http_client.set_transport(adapter)
+
+
+def record_to(fixture_dir=FIXTURE_DIR):
+    """
+    Saves all http_client responses to fixture_dir from now on. Returns the
+    previous transport for http_client.set_transport().
+    """
+    adapter = type("BoundRecordingAdapter", (RecordingAdapter,), {"fixture_dir": fixture_dir})
+    return http_client.set_transport(adapter)
+
+
+def record(queries, fixture_dir=FIXTURE_DIR):
+    """
+    Runs get_book_metadata for each query against the live services,
+    recording their responses, and adds the queries to fixture_dir/queries.json.
+    """
+    import api
+    import metadata_cache
+
+    # Bypass the metadata cache so every provider really is contacted
+    metadata_cache.CACHE_PATH = os.path.join(tempfile.mkdtemp(), "metadata_cache.db")
+    previous = record_to(fixture_dir)
+    try:
+        for query in queries:
+            print(f"Recording '{query}': {len(api.get_book_metadata(query))} results")
+    finally:
+        http_client.set_transport(previous)
+
+    path = os.path.join(fixture_dir, "queries.json")
+    recorded = recorded_queries(fixture_dir)
+    recorded += [q for q in queries if q not in recorded]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(recorded, f, ensure_ascii=False, indent=1)
+
+
+def recorded_queries(fixture_dir=FIXTURE_DIR):
+    try:
+        with open(os.path.join(fixture_dir, "queries.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record provider responses as replay fixtures.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser("record", help="run searches against the live services and save the responses")
+    rec.add_argument("queries", nargs="+")
+    rec.add_argument("--dir", default=FIXTURE_DIR, help=f"fixture directory (default: {FIXTURE_DIR})")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        record(args.queries, args.dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Background tasks for the Flet views, so network, file and PDF/image work
+doesn't block the event handler that started it.
+
+    task = RUNNER.run("Kitap aranıyor", work, key=("search", query),
+                      on_done=show_results, on_progress=show_progress)
+
+Thread tasks (run) get their Task as the only argument: they report
+progress with task.report(...) and call task.check() between steps to stop
+early once cancelled. CPU-bound work (run_cpu) goes to a process pool and
+receives plain picklable arguments instead.
+
+A task submitted with the key of one still queued or running isn't started
+again: the caller's callbacks are added to the running task. on_done,
+on_error and on_progress, and the runner's listeners (the visible task
+list), are called through the runner's dispatch function, one at a time, and
+never for a cancelled task.
+"""
+import itertools
+import os
+import threading
+from concurrent.futures import CancelledError, ProcessPoolExecutor, ThreadPoolExecutor
+
+THREAD_WORKERS = 4
+PROCESS_WORKERS = max(1, min(2, os.cpu_count() or 1))
+# Finished tasks stay listed this long, so the user sees how they ended
+KEEP_FINISHED = 5
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+
+class Cancelled(Exception):
+    """
+    Raised by Task.check() inside a task that was cancelled.
+    """
+
+
+class Task:
+    def __init__(self, runner, task_id, label, key):
+        self.runner = runner
+        self.id = task_id
+        self.label = label
+        self.key = key
+        self.state = QUEUED
+        self.progress = None    # 0..1, or None while unknown
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.future = None
+        self.callbacks = []     # (on_done, on_error, on_progress)
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def finished(self):
+        return self.state in (DONE, FAILED, CANCELLED)
+
+    def cancel(self):
+        """
+        Stops the task: a queued one never starts, a running thread task
+        stops at its next check(), a running process task is left to finish
+        but its result is dropped.
+        """
+        if self.finished:
+            return
+        self._cancel.set()
+        if self.future is not None:
+            self.future.cancel()
+        self.runner._finish(self, CANCELLED)
+
+    def check(self):
+        if self.cancelled:
+            raise Cancelled()
+
+    def report(self, progress=None, message=None):
+        """
+        Updates the task's progress (0..1) and/or message from the worker.
+        """
+        if self.cancelled:
+            return
+        if progress is not None:
+            self.progress = progress
+        if message is not None:
+            self.message = message
+        for _, _, on_progress in list(self.callbacks):
+            if on_progress:
+                self.runner.dispatch(on_progress, self)
+        self.runner._changed()
+
+
+class TaskRunner:
+    """
+    dispatch(fn, *args) runs a callback for the UI; the default runs it on
+    the worker thread, serialized by a lock. Flet control updates are
+    thread-safe, so that is enough for the views; a frontend with a real UI
+    thread would pass its own.
+    """
+    def __init__(self, thread_workers=THREAD_WORKERS, process_workers=PROCESS_WORKERS, dispatch=None):
+        self.thread_workers = thread_workers
+        self.process_workers = process_workers
+        self._dispatch = dispatch
+        self._threads = None
+        self._processes = None
+        self._tasks = []        # in submission order, finished ones included
+        self._active = {}       # key -> queued or running task
+        self._listeners = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._ui_lock = threading.RLock()
+
+    def dispatch(self, fn, *args):
+        if self._dispatch is not None:
+            self._dispatch(fn, *args)
+            return
+        with self._ui_lock:
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"Task callback failed: {e}")
+
+    def add_listener(self, listener):
+        """
+        listener(tasks) is called with tasks() whenever a task is added,
+        progresses or ends.
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def tasks(self):
+        with self._lock:
+            return list(self._tasks)
+
+    def run(self, label, fn, key=None, on_done=None, on_error=None, on_progress=None):
+        """
+        Runs fn(task) on the thread pool and returns the Task.
+        """
+        return self._submit(label, key, (on_done, on_error, on_progress), lambda task: self._thread_pool().submit(self._call, task, fn))
+
+    def run_cpu(self, label, fn, *args, key=None, on_done=None, on_error=None):
+        """
+        Runs fn(*args) in a worker process and returns the Task; fn and
+        args must be picklable (a module-level function and plain data).
+        """
+        def start(task):
+            # A process pool can't tell when the call starts; it is shown as
+            # running from submission
+            task.state = RUNNING
+            return self._process_pool().submit(fn, *args)
+        return self._submit(label, key, (on_done, on_error, None), start)
+
+    def cancel_all(self):
+        for task in self.tasks():
+            task.cancel()
+
+    def shutdown(self):
+        self.cancel_all()
+        with self._lock:
+            pools = [self._threads, self._processes]
+            self._threads = self._processes = None
+        for pool in pools:
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+    def _thread_pool(self):
+        with self._lock:
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(max_workers=self.thread_workers, thread_name_prefix="tasks")
+            return self._threads
+
+    def _process_pool(self):
+        with self._lock:
+            if self._processes is None:
+                self._processes = ProcessPoolExecutor(max_workers=self.process_workers)
+            return self._processes
+
+    def _submit(self, label, key, callbacks, start):
+        with self._lock:
+            task = self._active.get(key) if key is not None else None
+            if task is not None:
+                task.callbacks.append(callbacks)
+                return task
+            task = Task(self, next(self._ids), label, key)
+            task.callbacks.append(callbacks)
+            self._tasks.append(task)
+            if key is not None:
+                self._active[key] = task
+        task.future = start(task)
+        task.future.add_done_callback(lambda future: self._completed(task, future))
+        self._changed()
+        return task
+
+    def _call(self, task, fn):
+        if task.cancelled:
+            raise Cancelled()
+        task.state = RUNNING
+        self._changed()
+        return fn(task)
+
+    def _completed(self, task, future):
+        if task.cancelled:
+            return
+        try:
+            task.result = future.result()
+        except (Cancelled, CancelledError):
+            self._finish(task, CANCELLED)
+            return
+        except Exception as e:
+            task.error = e
+            print(f"Task '{task.label}' failed: {e}")
+            self._finish(task, FAILED)
+            for _, on_error, _ in task.callbacks:
+                if on_error:
+                    self.dispatch(on_error, e)
+            return
+        self._finish(task, DONE)
+        for on_done, _, _ in task.callbacks:
+            if on_done:
+                self.dispatch(on_done, task.result)
+
+    def _finish(self, task, state):
+        with self._lock:
+            if task.finished:
+                return
+            task.state = state
+            if task.key is not None and self._active.get(task.key) is task:
+                del self._active[task.key]
+            finished = [t for t in self._tasks if t.finished]
+            for old in finished[:-KEEP_FINISHED]:
+                self._tasks.remove(old)
+        self._changed()
+
+    def _changed(self):
+        tasks = self.tasks()
+        for listener in list(self._listeners):
+            self.dispatch(listener, tasks)
+
+
+# Shared by every view of the app
+RUNNER = TaskRunner()
@@ -0,0 +1,124 @@
+import threading
+
+import pytest
+
+import db_manager
+
+
+@pytest.fixture
+def conn(tmp_path):
+    db_manager.set_database_path(str(tmp_path / "test.db"))
+    conn = db_manager.get_connection()
+    conn.execute("CREATE TABLE t (x integer)")
+    yield conn
+    db_manager.set_database_path(db_manager.DEFAULT_DB_PATH)
+
+
+def values(conn):
+    return [row[0] for row in conn.execute("SELECT x FROM t ORDER BY x")]
+
+
+def test_connection_is_reused_per_thread(conn):
+    assert db_manager.get_connection() is conn
+    other = []
+    thread = threading.Thread(target=lambda: other.append(db_manager.get_connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
+
+
+def test_transaction_commits(conn):
+    with db_manager.transaction():
+        conn.execute("INSERT INTO t VALUES (1)")
+        conn.execute("INSERT INTO t VALUES (2)")
+    assert not conn.in_transaction
+    assert values(conn) == [1, 2]
+
+
+def test_transaction_rolls_back_on_error(conn):
+    with pytest.raises(ValueError):
+        with db_manager.transaction():
+            conn.execute("INSERT INTO t VALUES (1)")
+            raise ValueError()
+    assert not conn.in_transaction
+    assert values(conn) == []
+
+
+def test_nested_scope_rolls_back_to_its_savepoint(conn):
+    with db_manager.transaction():
+        conn.execute("INSERT INTO t VALUES (1)")
+        with pytest.raises(ValueError):
+            with db_manager.transaction():
+                conn.execute("INSERT INTO t VALUES (2)")
+                with db_manager.transaction():
+                    conn.execute("INSERT INTO t VALUES (3)")
+                raise ValueError()
+        # Only the outermost scope commits
+        assert conn.in_transaction
+        with db_manager.transaction():
+            conn.execute("INSERT INTO t VALUES (4)")
+    assert values(conn) == [1, 4]
+
+
+def test_outer_rollback_discards_released_savepoints(conn):
+    with pytest.raises(ValueError):
+        with db_manager.transaction():
+            with db_manager.transaction():
+                conn.execute("INSERT INTO t VALUES (1)")
+            raise ValueError()
+    assert values(conn) == []
+
+
+def test_write_transactions_serialize_read_then_write(conn):
+    # Every scope reads the count and then writes it; with BEGIN IMMEDIATE
+    # none fails with SQLITE_BUSY and no two see the same count
+    errors = []
+
+    def writer():
+        try:
+            for _ in range(20):
+                with db_manager.transaction() as c:
+                    count = c.execute("SELECT COUNT(*) FROM t").fetchone()[0]
+                    c.execute("INSERT INTO t VALUES (?)", (count,))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert values(conn) == list(range(80))
+
+
+def test_close_all_leaves_other_threads_mid_transaction_alone(conn):
+    started = threading.Event()
+    closed = threading.Event()
+    errors = []
+
+    def worker():
+        try:
+            with db_manager.transaction() as c:
+                c.execute("INSERT INTO t VALUES (1)")
+                started.set()
+                closed.wait()
+                db_manager.get_connection().execute("INSERT INTO t VALUES (2)")
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    started.wait()
+    db_manager.close_all()
+    closed.set()
+    thread.join()
+    assert errors == []
+    assert values(db_manager.get_connection()) == [1, 2]
+
+
+def test_close_all_reconnects_lazily(conn):
+    db_manager.close_all()
+    fresh = db_manager.get_connection()
+    assert fresh is not conn
+    assert values(fresh) == []
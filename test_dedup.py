@@ -0,0 +1,72 @@
+import dedup
+
+
+def result(title, author, source, **fields):
+    book = {
+        "title": title, "author": author, "source": source, "isbn": "", "cover_url": "",
+        "summary": "", "page_count": 0, "publisher": "", "published_date": "", "link": "",
+    }
+    book.update(fields)
+    return book
+
+
+def test_same_isbn_in_both_forms_is_merged():
+    clusters = dedup.Clusters()
+    first = result("Kürk Mantolu Madonna", "Sabahattin Ali", "Google Books", isbn="9789750719387")
+    second = result("Kurk Mantolu Madonna (Ciltli)", "Ali, Sabahattin", "Open Library",
+                    isbn="975-07-1938-X", page_count=160)
+    assert clusters.add(first)
+    assert not clusters.add(second)
+    assert first["page_count"] == 160
+    assert first["sources"] == ["Google Books", "Open Library"]
+
+
+def test_similar_title_with_shared_author_is_merged():
+    clusters = dedup.Clusters()
+    first = result("İçimizdeki Şeytan", "Sabahattin Ali", "Google Books")
+    second = result("Icimizdeki Seytan", "Sabahattin Ali", "Kitapyurdu", summary="Ömer ile Macide'nin hikâyesi.")
+    assert clusters.add(first)
+    assert clusters.merge_into(second) is first
+    assert first["summary"] == "Ömer ile Macide'nin hikâyesi."
+
+
+def test_different_isbns_are_different_editions():
+    clusters = dedup.Clusters()
+    assert clusters.add(result("Suç ve Ceza", "Dostoyevski", "Google Books", isbn="9789750738609"))
+    assert clusters.add(result("Suç ve Ceza", "Dostoyevski", "Open Library", isbn="9786053609322"))
+
+
+def test_different_authors_are_not_merged():
+    clusters = dedup.Clusters()
+    assert clusters.add(result("Sefiller", "Victor Hugo", "Google Books"))
+    assert clusters.add(result("Sefiller", "Kolektif Yazarlar", "Kitapyurdu"))
+
+
+def test_without_authors_only_an_exact_title_merges():
+    clusters = dedup.Clusters()
+    assert clusters.add(result("Tutunamayanlar", "Bilinmeyen Yazar", "Apple Books"))
+    assert clusters.add(result("Tutunamayanlar 2", "Bilinmeyen Yazar", "Apple Books"))
+    assert not clusters.add(result("Tutunamayanlar", "", "Google Books"))
+
+
+def test_merge_keeps_the_better_cover_and_longer_summary():
+    record = result("Saatleri Ayarlama Enstitüsü", "Ahmet Hamdi Tanpınar", "Open Library",
+                    cover_url="https://covers.openlibrary.org/b/id/1-M.jpg", summary="Kısa özet.")
+    record["sources"] = ["Open Library"]
+    dedup.merge(record, result("Saatleri Ayarlama Enstitüsü", "Ahmet Hamdi Tanpınar", "Apple Books",
+                               cover_url="https://is1-ssl.mzstatic.com/600x600bb.jpg",
+                               summary="Hayri İrdal'ın Enstitü'deki yıllarını anlatan daha uzun bir özet."))
+    assert record["cover_url"] == "https://is1-ssl.mzstatic.com/600x600bb.jpg"
+    assert record["cover_source"] == "Apple Books"
+    assert record["summary"].startswith("Hayri")
+    # Placeholders never replace a real summary
+    dedup.merge(record, result("Saatleri Ayarlama Enstitüsü", "Ahmet Hamdi Tanpınar", "Google Books",
+                               summary="Özet bulunmuyor."))
+    assert record["summary"].startswith("Hayri")
+    assert record["sources"] == ["Open Library", "Apple Books", "Google Books"]
+
+
+def test_title_key_and_author_names():
+    assert dedup.title_key("KÜRK MANTOLU MADONNA [Cep Boy]") == "kurk mantolu madonna"
+    assert dedup.author_names("Ali, Sabahattin") == dedup.author_names("Sabahattin Ali")
+    assert dedup.author_names("Bilinmeyen Yazar") == frozenset()
@@ -0,0 +1,48 @@
+import isbn
+
+
+def test_compact_strips_separators():
+    assert isbn.compact("978-975-07-1938-7") == "9789750719387"
+    assert isbn.compact(" 0 306 40615 x ") == "030640615X"
+    assert isbn.compact(None) == ""
+
+
+def test_check_digits():
+    assert isbn.isbn13_check_digit("978030640615") == "7"
+    assert isbn.isbn10_check_digit("030640615") == "2"
+    # A remainder of 10 is written as X
+    assert isbn.isbn10_check_digit("080442957") == "X"
+
+
+def test_is_valid():
+    assert isbn.is_valid("9780306406157")
+    assert isbn.is_valid("0-306-40615-2")
+    assert isbn.is_valid("080442957x")
+    assert not isbn.is_valid("9780306406158")
+    assert not isbn.is_valid("0306406153")
+    assert not isbn.is_valid("Bilinmiyor")
+    assert not isbn.is_valid("")
+
+
+def test_isbn10_to_isbn13_and_back():
+    assert isbn.to_isbn13("0306406152") == "9780306406157"
+    assert isbn.to_isbn10("9780306406157") == "0306406152"
+    assert isbn.to_isbn10(isbn.to_isbn13("080442957X")) == "080442957X"
+    # 979 ISBNs have no ISBN-10
+    assert isbn.to_isbn10("9791032305690") is None
+
+
+def test_normalize_returns_isbn13():
+    assert isbn.normalize("0-306-40615-2") == "9780306406157"
+    assert isbn.normalize("978 0 306 40615 7") == "9780306406157"
+    # normalize doesn't check the check digit; parse does
+    assert isbn.normalize("9780306406158") == "9780306406158"
+    assert isbn.normalize("Bilinmiyor") is None
+    assert isbn.normalize(None) is None
+
+
+def test_parse():
+    assert isbn.parse("0306406152") == "9780306406157"
+    assert isbn.parse("9780306406157") == "9780306406157"
+    assert isbn.parse("9780306406158") is None
+    assert isbn.parse("Kürk Mantolu Madonna") is None
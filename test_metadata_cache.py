@@ -0,0 +1,102 @@
+import pytest
+
+
+class Fetcher:
+    def __init__(self, results):
+        self.results = results
+        self.calls = []
+
+    def __call__(self, query):
+        self.calls.append(query)
+        if isinstance(self.results, Exception):
+            raise self.results
+        return self.results
+
+
+def age(cache, source, query, seconds):
+    # Moves an entry's fetch time back by seconds
+    cache._connection().execute(
+        "UPDATE lookups SET fetched_at = fetched_at - ? WHERE source=? AND query=?",
+        (seconds, source, cache.normalize_query(query))
+    )
+
+
+def wait_for_refreshes(cache):
+    cache._executor.shutdown(wait=True)
+    cache._executor = None
+
+
+BOOK = {"title": "Kürk Mantolu Madonna", "author": "Sabahattin Ali"}
+
+
+def test_normalize_query(cache):
+    assert cache.normalize_query("  KÜRK   Mantolu ") == "kürk mantolu"
+    assert cache.normalize_query("IŞIK") == "ışık"
+    assert cache.normalize_query("978-975-07-1938-7") == "9789750719387"
+
+
+def test_fresh_entry_is_served_from_the_cache(cache):
+    fetch = Fetcher([BOOK])
+    assert cache.cached_fetch("google", "Kürk Mantolu", fetch) == [BOOK]
+    assert cache.cached_fetch("google", "kürk  mantolu", fetch) == [BOOK]
+    assert fetch.calls == ["Kürk Mantolu"]
+
+
+def test_stale_entry_is_served_and_refreshed(cache):
+    cache.cached_fetch("google", "madonna", Fetcher([BOOK]))
+    age(cache, "google", "madonna", cache.TTLS["google"] + 60)
+
+    newer = dict(BOOK, page_count=160)
+    fetch = Fetcher([newer])
+    assert cache.cached_fetch("google", "madonna", fetch) == [BOOK]
+    wait_for_refreshes(cache)
+    assert fetch.calls == ["madonna"]
+    assert cache.cached_fetch("google", "madonna", Fetcher([])) == [newer]
+
+
+def test_entry_past_the_stale_window_is_fetched_again(cache):
+    cache.cached_fetch("itunes", "madonna", Fetcher([BOOK]))
+    age(cache, "itunes", "madonna", cache.TTLS["itunes"] + cache.STALE_FOR + 60)
+    fetch = Fetcher([])
+    assert cache.cached_fetch("itunes", "madonna", fetch) == []
+    assert fetch.calls == ["madonna"]
+
+
+def test_empty_results_use_the_negative_ttl(cache):
+    cache.cached_fetch("google", "yok böyle kitap", Fetcher([]))
+    fetch = Fetcher([BOOK])
+    assert cache.cached_fetch("google", "yok böyle kitap", fetch) == []
+    assert fetch.calls == []
+
+    age(cache, "google", "yok böyle kitap", cache.NEGATIVE_TTL + 60)
+    assert cache.cached_fetch("google", "yok böyle kitap", fetch) == []
+    wait_for_refreshes(cache)
+    assert fetch.calls == ["yok böyle kitap"]
+
+
+def test_isbn_hits_never_expire(cache):
+    cache.cached_fetch("isbn", "9789750719387", Fetcher([BOOK]))
+    age(cache, "isbn", "9789750719387", 10 * 365 * cache.DAY)
+    fetch = Fetcher([])
+    assert cache.cached_fetch("isbn", "9789750719387", fetch) == [BOOK]
+    assert fetch.calls == []
+
+
+def test_failures_are_not_cached(cache):
+    with pytest.raises(ConnectionError):
+        cache.cached_fetch("google", "madonna", Fetcher(ConnectionError("offline")))
+    assert cache.lookup("google", "madonna") is None
+    assert cache.cached_fetch("google", "madonna", Fetcher([BOOK])) == [BOOK]
+
+
+def test_incomplete_results_are_not_cached(cache):
+    partial = dict(BOOK, summary="")
+    assert cache.cached_fetch("kitapyurdu", "madonna", Fetcher(cache.Incomplete([partial]))) == [partial]
+    assert cache.lookup("kitapyurdu", "madonna") is None
+
+    # Nor do they replace a stale entry when a refresh comes back cut short
+    cache.cached_fetch("kitapyurdu", "madonna", Fetcher([BOOK]))
+    age(cache, "kitapyurdu", "madonna", cache.TTLS["kitapyurdu"] + 60)
+    assert cache.cached_fetch("kitapyurdu", "madonna", Fetcher(cache.Incomplete([partial]))) == [BOOK]
+    wait_for_refreshes(cache)
+    assert cache.lookup("kitapyurdu", "madonna")[0] == [BOOK]
@@ -0,0 +1,78 @@
+import pytest
+
+import database
+import db_manager
+from test_reading_stats import daily_stats, expected_daily_stats
+
+
+@pytest.fixture
+def baseline_db(tmp_path, monkeypatch):
+    """
+    A database with the tables init_db created before SCHEMA_MIGRATIONS
+    (user_version 0) and some data in it.
+    """
+    db_manager.set_database_path(str(tmp_path / "library.db"))
+    with monkeypatch.context() as m:
+        m.setattr(database, "SCHEMA_MIGRATIONS", [])
+        database.init_db()
+    conn = db_manager.get_connection()
+    conn.executescript("""
+        INSERT INTO users(id, username, password) VALUES (1, 'okur', '');
+        INSERT INTO shelves(id, name, description, user_id) VALUES (1, 'Okunanlar', '', 1), (2, 'Boş', '', 1);
+        INSERT INTO books(id, title, author, shelf_id, user_id, status, finish_date, page_count, rating)
+        VALUES (1, 'Kürk Mantolu Madonna', 'Sabahattin Ali', 1, 1, 'Okundu', '12.03.2024', 160, 5),
+               (2, 'Tutunamayanlar', 'Oğuz Atay', 1, 1, 'Okunuyor', NULL, 724, 0);
+        INSERT INTO quotes(book_id, text, page_number) VALUES (1, 'Hayatta en çok sevdiğim şey umuttu.', 42);
+        INSERT INTO reading_sessions(book_id, start_time, end_time, duration_minutes, pages_read)
+        VALUES (1, '2024-03-10 20:00:00', '2024-03-10 20:30:00', 30, 25),
+               (1, '2024-03-11 21:00:00', '2024-03-11 21:45:00', 45, 40),
+               (2, '2024-03-11 22:00:00', '2024-03-11 22:10:00', 10, 8),
+               (2, '2024-03-14 19:00:00', '2024-03-14 19:20:00', 20, 15);
+    """)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 0
+    yield conn
+    db_manager.set_database_path(db_manager.DEFAULT_DB_PATH)
+
+
+def test_migrations_upgrade_a_baseline_database(baseline_db):
+    database.init_db()
+    conn = baseline_db
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == database.SCHEMA_MIGRATIONS[-1][0]
+
+    # v3: existing rows are searchable
+    hits = database.search_library(1, "umut")
+    assert [(kind, book_id) for kind, _, book_id, *_ in hits] == [("quote", 1)]
+
+    # v5/v6: rollups and streaks backfilled from the existing sessions
+    assert daily_stats(conn) == expected_daily_stats(conn)
+    assert database.get_reading_totals(1) == (105, 88, 4, 1)
+    assert conn.execute(
+        "SELECT current_streak, longest_streak, last_day FROM reading_streaks WHERE user_id = 1"
+    ).fetchone() == (1, 2, "2024-03-14")
+
+    # v4/v8: enrichment tables start empty
+    assert database.get_enrichment_progress(1) is None
+    assert database.get_failed_enrichment_books(1) == []
+
+    # v7: added_at exists; books from before it have none
+    summary = {row[1]: row[3:] for row in database.get_shelf_summary(1)}
+    assert summary["Okunanlar"] == (2, 1, 884, 5.0, None)
+    assert summary["Boş"][0] == 0
+
+
+def test_migrations_run_once(baseline_db):
+    database.init_db()
+    before = daily_stats(baseline_db)
+    database.init_db()
+    assert daily_stats(baseline_db) == before
+    assert baseline_db.execute("SELECT COUNT(*) FROM reading_streaks").fetchone()[0] == 1
+
+
+def test_triggers_keep_a_migrated_database_in_sync(baseline_db):
+    database.init_db()
+    database.add_reading_session(2, "2024-03-15 20:00:00", "2024-03-15 20:30:00", 30, 20)
+    database.delete_book(1)
+    assert daily_stats(baseline_db) == expected_daily_stats(baseline_db)
+    assert baseline_db.execute(
+        "SELECT current_streak, longest_streak, last_day FROM reading_streaks WHERE user_id = 1"
+    ).fetchone() == (2, 2, "2024-03-15")
@@ -0,0 +1,106 @@
+import datetime
+
+import database
+
+TODAY = datetime.date.today()
+
+
+def day(offset):
+    return (TODAY + datetime.timedelta(days=offset)).isoformat()
+
+
+def read(book_id, offset, minutes=30, pages=20):
+    start = f"{day(offset)} 20:00:00"
+    database.add_reading_session(book_id, start, start, minutes, pages)
+
+
+def expected_daily_stats(conn):
+    # daily_stats recomputed from scratch, in the same shape
+    expected = {}
+    for user_id, on, minutes, pages, sessions in conn.execute("""
+        SELECT b.user_id, substr(rs.start_time, 1, 10), SUM(rs.duration_minutes), SUM(rs.pages_read), COUNT(*)
+        FROM reading_sessions rs JOIN books b ON b.id = rs.book_id
+        WHERE b.user_id IS NOT NULL
+        GROUP BY 1, 2
+    """):
+        expected[(user_id, on)] = [minutes, pages, sessions, 0]
+    for user_id, finish_date in conn.execute(
+        "SELECT user_id, finish_date FROM books WHERE status = 'Okundu' AND user_id IS NOT NULL"
+    ):
+        try:
+            finished = datetime.datetime.strptime(finish_date, "%d.%m.%Y").date().isoformat()
+        except (TypeError, ValueError):
+            continue
+        expected.setdefault((user_id, finished), [0, 0, 0, 0])[3] += 1
+    return {key: tuple(value) for key, value in expected.items()}
+
+
+def daily_stats(conn):
+    return {
+        (user_id, on): (minutes, pages, sessions, books_finished)
+        for user_id, on, minutes, pages, sessions, books_finished in conn.execute(
+            "SELECT user_id, day, minutes, pages, sessions, books_finished FROM daily_stats"
+        )
+    }
+
+
+def test_sessions_roll_up_per_day(db, user):
+    user_id, shelf_id = user
+    first = database.add_book("Kürk Mantolu Madonna", "Sabahattin Ali", "", "", shelf_id, user_id)
+    second = database.add_book("Tutunamayanlar", "Oğuz Atay", "", "", shelf_id, user_id)
+    read(first, -1, 30, 20)
+    read(first, 0, 15, 10)
+    read(second, 0, 45, 30)
+
+    assert daily_stats(db) == expected_daily_stats(db)
+    assert database.get_reading_totals(user_id) == (90, 60, 3, 0)
+    days = database.get_daily_stats(user_id, 3)
+    assert [row[1:4] for row in days] == [(0, 0, 0), (30, 20, 1), (60, 40, 2)]
+
+
+def test_finished_books_follow_status_and_finish_date(db, user):
+    user_id, shelf_id = user
+    book_id = database.add_book("Sefiller", "Victor Hugo", "", "", shelf_id, user_id,
+                                status="Okundu", finish_date="12.03.2024")
+    assert daily_stats(db) == {(user_id, "2024-03-12"): (0, 0, 0, 1)}
+
+    db.execute("UPDATE books SET finish_date = '14.03.2024' WHERE id = ?", (book_id,))
+    assert daily_stats(db) == {(user_id, "2024-03-14"): (0, 0, 0, 1)}
+
+    db.execute("UPDATE books SET status = 'Okunuyor' WHERE id = ?", (book_id,))
+    assert daily_stats(db) == {}
+
+
+def test_deleting_a_book_removes_its_sessions(db, user):
+    user_id, shelf_id = user
+    kept = database.add_book("Kürk Mantolu Madonna", "Sabahattin Ali", "", "", shelf_id, user_id)
+    deleted = database.add_book("Tutunamayanlar", "Oğuz Atay", "", "", shelf_id, user_id)
+    read(kept, -5)
+    for offset in (-2, -1, 0):
+        read(deleted, offset)
+
+    database.delete_book(deleted)
+    assert db.execute("SELECT COUNT(*) FROM reading_sessions WHERE book_id = ?", (deleted,)).fetchone()[0] == 0
+    assert daily_stats(db) == expected_daily_stats(db)
+
+
+def test_changing_a_books_owner_moves_its_totals(db, user):
+    user_id, shelf_id = user
+    database.add_user("ikinci", "")
+    other_id = database.get_all_users()[1][0]
+    book_id = database.add_book("Sefiller", "Victor Hugo", "", "", shelf_id, user_id,
+                                status="Okundu", finish_date="12.03.2024")
+    read(book_id, 0, 40, 25)
+
+    db.execute("UPDATE books SET user_id = ? WHERE id = ?", (other_id, book_id))
+    assert daily_stats(db) == expected_daily_stats(db)
+    assert database.get_reading_totals(user_id) == (0, 0, 0, 0)
+    assert database.get_reading_totals(other_id) == (40, 25, 1, 1)
+
+
+def test_delete_user_clears_rollups(db, user):
+    user_id, shelf_id = user
+    book_id = database.add_book("Suç ve Ceza", "Dostoyevski", "", "", shelf_id, user_id)
+    read(book_id, 0)
+    database.delete_user(user_id)
+    assert daily_stats(db) == {}
@@ -0,0 +1,63 @@
+import datetime
+
+import database
+from test_reading_stats import TODAY, day, read
+
+
+def streak_row(conn, user_id):
+    return conn.execute(
+        "SELECT current_streak, longest_streak, last_day FROM reading_streaks WHERE user_id=?", (user_id,)
+    ).fetchone()
+
+
+def test_streak_grows_breaks_and_repairs(db, user):
+    user_id, shelf_id = user
+    book_id = database.add_book("Suç ve Ceza", "Dostoyevski", "", "", shelf_id, user_id)
+    for offset in (-6, -5, -2, -1):
+        read(book_id, offset)
+    read(book_id, -1)    # a second session on the same day changes nothing
+    assert streak_row(db, user_id) == (2, 2, day(-1))
+    assert database.get_streak(user_id) == (2, 2, TODAY - datetime.timedelta(days=1))
+
+    # A backdated session can join two streaks into one
+    read(book_id, -4)
+    read(book_id, -3)
+    assert streak_row(db, user_id) == (6, 6, day(-1))
+
+    read(book_id, 0)
+    assert streak_row(db, user_id) == (7, 7, day(0))
+    incremental = streak_row(db, user_id)
+    database.repair_streak(user_id)
+    assert streak_row(db, user_id) == incremental
+
+
+def test_deleting_a_book_shortens_the_streak(db, user):
+    user_id, shelf_id = user
+    kept = database.add_book("Kürk Mantolu Madonna", "Sabahattin Ali", "", "", shelf_id, user_id)
+    deleted = database.add_book("Tutunamayanlar", "Oğuz Atay", "", "", shelf_id, user_id)
+    read(kept, -5)
+    for offset in (-2, -1, 0):
+        read(deleted, offset)
+    assert streak_row(db, user_id) == (3, 3, day(0))
+
+    database.delete_book(deleted)
+    assert streak_row(db, user_id) == (1, 1, day(-5))
+    assert database.get_streak(user_id)[0] == 0
+
+
+def test_repair_streak_without_sessions_removes_the_row(db, user):
+    user_id, shelf_id = user
+    book_id = database.add_book("Suç ve Ceza", "Dostoyevski", "", "", shelf_id, user_id)
+    read(book_id, 0)
+    db.execute("DELETE FROM reading_sessions")
+    database.repair_streak(user_id)
+    assert streak_row(db, user_id) is None
+    assert database.get_streak(user_id) == (0, 0, None)
+
+
+def test_delete_user_clears_the_streak(db, user):
+    user_id, shelf_id = user
+    book_id = database.add_book("Suç ve Ceza", "Dostoyevski", "", "", shelf_id, user_id)
+    read(book_id, 0)
+    database.delete_user(user_id)
+    assert streak_row(db, user_id) is None
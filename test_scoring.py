@@ -0,0 +1,50 @@
+import pytest
+
+import scoring
+
+
+def indel_similarity(a, b):
+    # Reference: 2 * LCS / total length, with a plain DP table
+    if not a and not b:
+        return 1.0
+    previous = [0] * (len(b) + 1)
+    for char in a:
+        current = [0]
+        for j, other in enumerate(b):
+            current.append(previous[j] + 1 if char == other else max(previous[j + 1], current[j]))
+        previous = current
+    return 2 * previous[-1] / (len(a) + len(b))
+
+
+@pytest.mark.parametrize("title", [
+    "kürk mantolu madonna",
+    "kurk mantolu madonna",
+    "madonna",
+    "içimizdeki şeytan",
+    "",
+])
+def test_similarity_is_the_indel_ratio(title):
+    scorer = scoring.Scorer("Kürk Mantolu Madonna")
+    assert scorer.similarity(title) == pytest.approx(indel_similarity("kürk mantolu madonna", title))
+
+
+def test_similarity_without_rapidfuzz(monkeypatch):
+    monkeypatch.setattr(scoring, "Indel", None)
+    scorer = scoring.Scorer("Suç ve Ceza")
+    assert scorer.similarity("suç ve ceza") == 1.0
+    assert scorer.similarity("ceza") == pytest.approx(indel_similarity("suç ve ceza", "ceza"))
+    assert scoring.Scorer("").similarity("") == 1.0
+
+
+def test_lcs_beyond_one_machine_word():
+    pattern = "abcdefghij" * 10
+    text = "xaxbxcxdxexfxgxhxixj" * 6
+    assert scoring._LCS(pattern)(text) == round(indel_similarity(pattern, text) * (len(pattern) + len(text)) / 2)
+
+
+def test_closer_titles_score_higher():
+    scorer = scoring.Scorer("Kürk Mantolu Madonna")
+    book = {"title": "Kürk Mantolu Madonna", "author": "Sabahattin Ali", "page_count": 160,
+            "cover_url": "https://example.com/c.jpg", "summary": "", "publisher": "YKY", "source": "Google Books"}
+    other = dict(book, title="Madonna Kürk Mantolu Üzerine Notlar")
+    assert scorer.score(book) > scorer.score(other)
@@ -0,0 +1,69 @@
+import database
+
+
+def hits(user_id, query, limit=20):
+    return [(kind, ref_id) for kind, ref_id, *_ in database.search_library(user_id, query, limit)]
+
+
+def add_quote(book_id, text):
+    database.add_quote(book_id, text)
+    return database.get_quotes(book_id)[-1][0]
+
+
+def indexed_terms(conn):
+    conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS temp.search_terms USING fts5vocab(main, search_index, 'row')")
+    return [row[0] for row in conn.execute("SELECT term FROM temp.search_terms")]
+
+
+def test_matches_ignore_case_and_diacritics(db, user):
+    user_id, shelf_id = user
+    book_id = database.add_book("Işığın Çiçekleri", "Sabahattin Ali", "", "", shelf_id, user_id)
+    quote_id = add_quote(book_id, "Çiçek açan dallar")
+    assert hits(user_id, "isigin") == [("book", book_id)]
+    assert sorted(hits(user_id, "cicek")) == [("book", book_id), ("quote", quote_id)]
+    assert hits(user_id, "cicek yok") == []
+
+
+def test_other_users_rows_never_take_the_limit(db, user):
+    user_id, shelf_id = user
+    database.add_user("ikinci", "")
+    other_id = database.get_all_users()[1][0]
+    mine = database.add_book("Kürk Mantolu Madonna", "Sabahattin Ali", "", "", shelf_id, user_id)
+    theirs = database.add_book("Umut Kitabı", "Biri", "", "", shelf_id, other_id)
+    for _ in range(50):
+        database.add_quote(theirs, "umut umut umut")
+    quote_id = add_quote(mine, "Hayatta en çok sevdiğim şey umuttu.")
+
+    assert hits(user_id, "umut", limit=5) == [("quote", quote_id)]
+    assert len(hits(other_id, "umut", limit=5)) == 5
+
+
+def test_rows_follow_their_book_to_a_new_owner(db, user):
+    user_id, shelf_id = user
+    database.add_user("ikinci", "")
+    other_id = database.get_all_users()[1][0]
+    book_id = database.add_book("Sefiller", "Victor Hugo", "", "", shelf_id, user_id)
+    quote_id = add_quote(book_id, "Umut her şeydir")
+    database.add_word(user_id, book_id, "umutsuz", "", "")
+
+    db.execute("UPDATE books SET user_id = ? WHERE id = ?", (other_id, book_id))
+    assert hits(user_id, "umut") == []
+    assert ("quote", quote_id) in hits(other_id, "umut")
+    assert len(hits(other_id, "umut")) == 2
+
+    database.delete_quote(quote_id)
+    assert [kind for kind, _ in hits(other_id, "umut")] == ["word"]
+
+
+def test_deleted_books_leave_no_hits(db, user):
+    user_id, shelf_id = user
+    book_id = database.add_book("Sefiller", "Victor Hugo", "", "", shelf_id, user_id)
+    quote_id = add_quote(book_id, "Umut her şeydir")
+    database.delete_book(book_id)
+    assert hits(user_id, "umut") == []
+    assert hits(user_id, "sefiller") == []
+
+    # The orphaned quote is still deleted from the index with the values it
+    # was indexed under, which leaves nothing behind
+    database.delete_quote(quote_id)
+    assert indexed_terms(db) == []
@@ -1,6 +1,10 @@
 import flet as ft
+import bisect
 import api
 import database
+import tasks
+
+from ui.dashboard import cover_image
 
 class AddBook(ft.Column):
     def __init__(self, user_id):
@@ -32,6 +36,10 @@ class AddBook(ft.Column):
         )
         
         self.results_area = ft.Column(spacing=20)
+        self.result_scores = []
+        self.result_cards = {}  # id of a result dict -> its card
+        self.search_task = None
+        self.progress = ft.ProgressBar(color=ft.Colors.TEAL_400, visible=False)
         self.shelf_dropdown = ft.Dropdown(
             label="Raf Seç", 
             options=[],
@@ -74,12 +82,17 @@ class AddBook(ft.Column):
                 border_radius=20,
             ),
             ft.Divider(height=40, color=ft.Colors.TRANSPARENT),
+            self.progress,
             self.results_area
         ]
 
     def did_mount(self):
         self.load_shelves()
 
+    def will_unmount(self):
+        if self.search_task:
+            self.search_task.cancel()
+
     def load_shelves(self):
         shelves = database.get_shelves(self.user_id)
         if not shelves:
@@ -93,78 +106,48 @@ class AddBook(ft.Column):
         self.update()
 
     def search_book(self, e):
-        if not self.search_query.value:
+        query = self.search_query.value
+        if not query:
             return
-        
+        key = ("search", query)
+        if self.search_task and self.search_task.key == key and not self.search_task.finished:
+            return
+
+        # A newer search cancels this one, so it stops adding results
+        if self.search_task:
+            self.search_task.cancel()
         self.results_area.controls.clear()
-        self.results_area.controls.append(ft.ProgressBar(color=ft.Colors.TEAL_400))
+        self.result_scores = []
+        self.result_cards = {}
+        self.progress.visible = True
         self.update()
 
-        books = api.get_book_metadata(self.search_query.value)
-        self.results_area.controls.clear()
+        def show_batch(task, batch):
+            if task.cancelled:
+                return
+            for book_data in batch:
+                self.insert_result(book_data)
+            # The first hits show up while slower sources are still searching
+            self.update()
 
-        if books:
-            for book_data in books:
-                self.results_area.controls.append(
-                    ft.Container(
-                        content=ft.Row(
-                            [
-                                ft.Container(
-                                    content=ft.Image(
-                                        src=book_data["cover_url"] if book_data["cover_url"] else "https://via.placeholder.com/150", 
-                                        height=150, 
-                                        border_radius=10,
-                                        fit=ft.ImageFit.CONTAIN,
-                                    ),
-                                    shadow=ft.BoxShadow(blur_radius=10, color=ft.Colors.with_opacity(0.3, ft.Colors.BLACK)),
-                                    border_radius=10,
-                                ),
-                                ft.Container(width=20),
-                                ft.Column(
-                                    [
-                                    ft.Text(book_data['title'], size=18, weight="bold", max_lines=2, overflow=ft.TextOverflow.ELLIPSIS),
-                                    ft.Text(f"Yazar: {book_data['author']}", size=14, color=ft.Colors.TEAL_200),
-                                    ft.Text(f"Yayınevi: {book_data['publisher']}", size=12, color=ft.Colors.GREY_400),
-                                    ft.Text(f"Sayfa: {book_data['page_count']}", size=12, color=ft.Colors.GREY_500),
-                                    ft.Container(height=10),
-                                    ft.Row([
-                                        ft.ElevatedButton(
-                                            "Hızlı Ekle", 
-                                            icon=ft.Icons.ADD_TASK_ROUNDED, 
-                                            on_click=lambda e, b=book_data: self.save_book(b),
-                                            style=ft.ButtonStyle(
-                                                bgcolor=ft.Colors.TEAL_600,
-                                                color=ft.Colors.WHITE
-                                            )
-                                        ),
-                                        ft.OutlinedButton(
-                                            "Düzenle & Ekle",
-                                            icon=ft.Icons.EDIT_NOTE,
-                                            on_click=lambda e, b=book_data: self.open_edit_dialog(b)
-                                        ),
-                                        ft.IconButton(
-                                            icon=ft.Icons.OPEN_IN_NEW,
-                                            tooltip="Kitabı İncele",
-                                            icon_color=ft.Colors.TEAL_200,
-                                            on_click=lambda e, url=book_data.get("link"): e.page.launch_url(url) if url else None,
-                                            visible=bool(book_data.get("link"))
-                                        )
-                                    ])
-                                    ],
-                                    expand=True,
-                                    alignment=ft.MainAxisAlignment.START
-                                )
-                            ],
-                            alignment=ft.MainAxisAlignment.START,
-                            vertical_alignment=ft.CrossAxisAlignment.START
-                        ),
-                        padding=20,
-                        bgcolor=ft.Colors.ON_INVERSE_SURFACE,
-                        border_radius=15,
-                        animate_opacity=300,
-                    )
-                )
-        else:
+        def work(task):
+            results = api.stream_book_metadata(query)
+            try:
+                for batch in results:
+                    task.check()
+                    tasks.RUNNER.dispatch(show_batch, task, batch)
+            finally:
+                results.close()
+
+        self.search_task = tasks.RUNNER.run(
+            f"Kitap aranıyor: {query}", work, key=key,
+            on_done=lambda _: self.search_finished(),
+            on_error=lambda _: self.search_finished()
+        )
+
+    def search_finished(self):
+        self.progress.visible = False
+        if not self.results_area.controls:
             self.results_area.controls.append(
                 ft.Container(
                     content=ft.Column([
@@ -178,9 +161,84 @@ class AddBook(ft.Column):
                     border_radius=20
                 )
             )
-        
+
         self.update()
 
+    def insert_result(self, book_data):
+        # A result already shown comes back when a later source merged into
+        # it: its card is rebuilt and moved to the new score's place
+        card = self.result_cards.pop(id(book_data), None)
+        if card is not None:
+            position = self.results_area.controls.index(card)
+            del self.results_area.controls[position]
+            del self.result_scores[position]
+
+        # result_scores holds the negated scores of the shown results, in
+        # display order, so bisect finds the ranked position for a new one
+        position = bisect.bisect_right(self.result_scores, -book_data["score"])
+        self.result_scores.insert(position, -book_data["score"])
+        card = self.result_cards[id(book_data)] = self.result_card(book_data)
+        self.results_area.controls.insert(position, card)
+
+    def result_card(self, book_data):
+        return ft.Container(
+            content=ft.Row(
+                [
+                    ft.Container(
+                        content=cover_image(
+                            book_data["cover_url"], "grid",
+                            height=150, 
+                            border_radius=10,
+                            fit=ft.ImageFit.CONTAIN,
+                        ),
+                        shadow=ft.BoxShadow(blur_radius=10, color=ft.Colors.with_opacity(0.3, ft.Colors.BLACK)),
+                        border_radius=10,
+                    ),
+                    ft.Container(width=20),
+                    ft.Column(
+                        [
+                        ft.Text(book_data['title'], size=18, weight="bold", max_lines=2, overflow=ft.TextOverflow.ELLIPSIS),
+                        ft.Text(f"Yazar: {book_data['author']}", size=14, color=ft.Colors.TEAL_200),
+                        ft.Text(f"Yayınevi: {book_data['publisher']}", size=12, color=ft.Colors.GREY_400),
+                        ft.Text(f"Sayfa: {book_data['page_count']}", size=12, color=ft.Colors.GREY_500),
+                        ft.Container(height=10),
+                        ft.Row([
+                            ft.ElevatedButton(
+                                "Hızlı Ekle", 
+                                icon=ft.Icons.ADD_TASK_ROUNDED, 
+                                on_click=lambda e, b=book_data: self.save_book(b),
+                                style=ft.ButtonStyle(
+                                    bgcolor=ft.Colors.TEAL_600,
+                                    color=ft.Colors.WHITE
+                                )
+                            ),
+                            ft.OutlinedButton(
+                                "Düzenle & Ekle",
+                                icon=ft.Icons.EDIT_NOTE,
+                                on_click=lambda e, b=book_data: self.open_edit_dialog(b)
+                            ),
+                            ft.IconButton(
+                                icon=ft.Icons.OPEN_IN_NEW,
+                                tooltip="Kitabı İncele",
+                                icon_color=ft.Colors.TEAL_200,
+                                on_click=lambda e, url=book_data.get("link"): e.page.launch_url(url) if url else None,
+                                visible=bool(book_data.get("link"))
+                            )
+                        ])
+                        ],
+                        expand=True,
+                        alignment=ft.MainAxisAlignment.START
+                    )
+                ],
+                alignment=ft.MainAxisAlignment.START,
+                vertical_alignment=ft.CrossAxisAlignment.START
+            ),
+            padding=20,
+            bgcolor=ft.Colors.ON_INVERSE_SURFACE,
+            border_radius=15,
+            animate_opacity=300,
+        )
+
     def save_book(self, book_data):
         shelf_id = self.shelf_dropdown.value
         if not shelf_id:
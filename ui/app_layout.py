@@ -1,5 +1,6 @@
 import flet as ft
 import database
+from ui.task_queue import TaskQueue
 
 class AppLayout(ft.Row):
     def __init__(self, app, page: ft.Page, *args, **kwargs):
@@ -82,7 +83,8 @@ class AppLayout(ft.Row):
         )
 
         self.content_area = ft.Container(expand=True, padding=30)
-        self.controls = [self.rail, self.content_area]
+        self.task_queue = TaskQueue()
+        self.controls = [self.rail, ft.Column([self.content_area, self.task_queue], expand=True, spacing=0)]
 
     def toggle_theme(self, e):
         self.page.theme_mode = ft.ThemeMode.LIGHT if self.page.theme_mode == ft.ThemeMode.DARK else ft.ThemeMode.DARK
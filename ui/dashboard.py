@@ -2,11 +2,15 @@ import flet as ft
 import database
 import datetime
 import random
+import re
+import math
 import os
+from collections import OrderedDict
 import utils
-import csv
-import codecs
 import api
+import export
+import cover_cache
+import tasks
 
 class BookDetailsDialog(ft.AlertDialog):
     def __init__(self, book, on_update, user_id):
@@ -88,8 +92,13 @@ class BookDetailsDialog(ft.AlertDialog):
         # Rating
         self.rating_slider = ft.Slider(min=0, max=5, divisions=5, label="{value}", value=self.rating_val)
         
+        # Shelves and tags come in one read; quotes, words and sessions are
+        # loaded by their tabs (see on_tab_change)
+        bundle = database.get_book_bundle(self.book_id, self.user_id)
+        self.all_tags = bundle["all_tags"]
+
         # Shelf Dropdown
-        shelves = database.get_shelves(self.user_id)
+        shelves = bundle["shelves"]
         self.shelf_dropdown = ft.Dropdown(
             label="Raf",
             value=str(self.shelf_id_val),
@@ -100,24 +109,25 @@ class BookDetailsDialog(ft.AlertDialog):
         # Tags Tab
         self.tag_input = ft.TextField(label="Etiket Ekle", expand=True, on_submit=self.add_tag_action)
         self.tags_row = ft.Row(wrap=True, spacing=5)
-        self.load_tags(update=False)
+        self.load_tags(bundle["tags"], update=False)
 
         # Quotes Tab
         self.quote_text = ft.TextField(label="Alıntı Ekle", multiline=True, min_lines=2, expand=True)
         self.quote_page = ft.TextField(label="Sayfa", width=80, keyboard_type=ft.KeyboardType.NUMBER)
         self.quotes_list = ft.Column(spacing=10, scroll=ft.ScrollMode.AUTO)
-        self.load_quotes(update=False)
 
         # Vocabulary Tab
         self.vocab_word = ft.TextField(label="Kelime", expand=True)
         self.vocab_def = ft.TextField(label="Anlamı", expand=True)
         self.vocab_sentence = ft.TextField(label="Örnek Cümle", multiline=True)
         self.vocab_list = ft.Column(spacing=10, scroll=ft.ScrollMode.AUTO)
-        self.load_vocab(update=False)
 
         # History Tab
         self.history_list = ft.Column(spacing=10, scroll=ft.ScrollMode.AUTO)
-        self.load_history(update=False)
+
+        # Tab index -> loader, run the first time the tab is selected
+        self.lazy_tabs = {2: self.load_quotes, 3: self.load_vocab, 4: self.load_history}
+        self.loaded_tabs = set()
 
         self.content = ft.Container(
             width=600,
@@ -125,6 +135,7 @@ class BookDetailsDialog(ft.AlertDialog):
                 ft.Tabs(
                     selected_index=0,
                     animation_duration=300,
+                    on_change=self.on_tab_change,
                     tabs=[
                         ft.Tab(
                             text="Genel Bilgiler",
@@ -279,28 +290,25 @@ class BookDetailsDialog(ft.AlertDialog):
                 if e.files:
                     new_cover_path = e.files[0].path
                     # Update database directly
-                    database.update_book_details(
-                        self.book_id,
-                        self.edit_title.value,
-                        self.edit_author.value,
-                        int(self.shelf_dropdown.value),
-                        int(self.rating_slider.value),
-                        self.edit_notes.value,
-                        self.edit_summary.value,
-                        self.edit_borrower.value,
-                        self.borrow_date_val,
-                        self.status_dropdown.value,
-                        int(self.current_page_field.value) if self.current_page_field.value else 0,
-                        self.start_date_field.value,
-                        self.finish_date_field.value,
-                        self.file_path_val
-                    )
-                    # We need a separate update for cover_url since update_book_details doesn't handle it yet?
-                    # Wait, update_book_details doesn't have cover_url param.
-                    # I need to add a specific function or update the existing one.
-                    # Let's add a specific function to database.py first or just execute SQL here? 
-                    # Better to add to database.py.
-                    database.update_book_cover(self.book_id, new_cover_path)
+                    with database.unit_of_work():
+                        database.update_book_details(
+                            self.book_id,
+                            self.edit_title.value,
+                            self.edit_author.value,
+                            int(self.shelf_dropdown.value),
+                            int(self.rating_slider.value),
+                            self.edit_notes.value,
+                            self.edit_summary.value,
+                            self.edit_borrower.value,
+                            self.borrow_date_val,
+                            self.status_dropdown.value,
+                            int(self.current_page_field.value) if self.current_page_field.value else 0,
+                            self.start_date_field.value,
+                            self.finish_date_field.value,
+                            self.file_path_val
+                        )
+                        # update_book_details doesn't take cover_url, so it gets its own statement
+                        database.update_book_cover(self.book_id, new_cover_path)
                     
                     self.page.snack_bar = ft.SnackBar(ft.Text("Kapak resmi güncellendi!"))
                     self.page.snack_bar.open = True
@@ -375,9 +383,9 @@ class BookDetailsDialog(ft.AlertDialog):
         if update: self.update()
 
     def create_quote_card(self, text):
-        try:
-            # Generate image
-            img_path = utils.generate_quote_card(text, self.author_val, self.title_val)
+        page = self.page
+
+        def show_card(img_path):
             abs_path = os.path.abspath(img_path)
             
             # Show preview dialog
@@ -391,16 +399,22 @@ class BookDetailsDialog(ft.AlertDialog):
                     ft.Text(f"Kaydedildi: {img_path}", size=12, color=ft.Colors.GREY)
                 ], tight=True, horizontal_alignment=ft.CrossAxisAlignment.CENTER),
                 actions=[
-                    ft.TextButton("Kapat", on_click=lambda e: self.page.close(preview_dialog)),
+                    ft.TextButton("Kapat", on_click=lambda e: page.close(preview_dialog)),
                     ft.ElevatedButton("Aç", on_click=open_image)
                 ]
             )
-            self.page.open(preview_dialog)
-            
-        except Exception as ex:
-            self.page.snack_bar = ft.SnackBar(ft.Text(f"Kart oluşturulamadı: {ex}"))
-            self.page.snack_bar.open = True
-            self.page.update()
+            page.open(preview_dialog)
+
+        def show_error(ex):
+            page.snack_bar = ft.SnackBar(ft.Text(f"Kart oluşturulamadı: {ex}"))
+            page.snack_bar.open = True
+            page.update()
+
+        # Image rendering is CPU work; it runs in a worker process
+        tasks.RUNNER.run_cpu(
+            "Alıntı kartı", utils.generate_quote_card, text, self.author_val, self.title_val,
+            key=("quote_card", self.book_id, text), on_done=show_card, on_error=show_error
+        )
 
 
     def add_quote_action(self, e):
@@ -442,6 +456,12 @@ class BookDetailsDialog(ft.AlertDialog):
         )
         self.page.open(self.confirm_dialog)
 
+    def on_tab_change(self, e):
+        index = e.control.selected_index
+        if index in self.lazy_tabs and index not in self.loaded_tabs:
+            self.loaded_tabs.add(index)
+            self.lazy_tabs[index]()
+
     def on_status_change(self, e):
         self.current_page_field.visible = (self.status_dropdown.value == "Okunuyor")
         self.update()
@@ -538,10 +558,11 @@ class BookDetailsDialog(ft.AlertDialog):
         
         if not word: return
         
-        database.add_word(self.user_id, self.book_id, word, definition, sentence)
-        
-        # Award XP for learning new words!
-        database.add_xp(self.user_id, 5)
+        with database.unit_of_work():
+            database.add_word(self.user_id, self.book_id, word, definition, sentence)
+
+            # Award XP for learning new words!
+            database.add_xp(self.user_id, 5)
         
         self.vocab_word.value = ""
         self.vocab_def.value = ""
@@ -555,9 +576,10 @@ class BookDetailsDialog(ft.AlertDialog):
         database.delete_word(word_id)
         self.load_vocab()
 
-    def load_tags(self, update=True):
+    def load_tags(self, book_tags=None, update=True):
         self.tags_row.controls.clear()
-        book_tags = database.get_book_tags(self.book_id)
+        if book_tags is None:
+            book_tags = database.get_book_tags(self.book_id)
         for t in book_tags:
             # t: (id, name, color)
             self.tags_row.controls.append(
@@ -586,10 +608,9 @@ class BookDetailsDialog(ft.AlertDialog):
         # Let's assume create_tag returns ID or None.
         # If None, we need to fetch ID
         
-        # First, try to find tag ID
-        all_tags = database.get_all_tags()
+        # First, try to find tag ID (all_tags was loaded with the dialog)
         tag_id = None
-        for t in all_tags:
+        for t in self.all_tags:
             if t[1].lower() == tag_name.lower():
                 tag_id = t[0]
                 break
@@ -599,6 +620,8 @@ class BookDetailsDialog(ft.AlertDialog):
             colors = [ft.Colors.RED, ft.Colors.BLUE, ft.Colors.GREEN, ft.Colors.ORANGE, ft.Colors.PURPLE, ft.Colors.TEAL]
             color = random.choice(colors)
             tag_id = database.create_tag(tag_name, color)
+            if tag_id:
+                self.all_tags.append((tag_id, tag_name, color))
             
         if tag_id:
             database.add_tag_to_book(self.book_id, tag_id)
@@ -614,9 +637,17 @@ class BookDetailsDialog(ft.AlertDialog):
         self.load_tags()
 
     def create_pdf_report(self, e):
+        page = self.page
+
+        def show_error(ex):
+            page.snack_bar = ft.SnackBar(ft.Text(f"PDF hatası: {ex}"), bgcolor=ft.Colors.RED_400)
+            page.snack_bar.open = True
+            page.update()
+
         try:
-            quotes = database.get_quotes(self.book_id)
-            vocab = database.get_words(self.book_id)
+            bundle = database.get_book_bundle(self.book_id, self.user_id, ("quotes", "words"))
+            quotes = bundle["quotes"]
+            vocab = bundle["words"]
             
             # Re-fetch book data to get latest notes/summary
             # Actually self.book might be stale, but we have edit fields values
@@ -636,20 +667,23 @@ class BookDetailsDialog(ft.AlertDialog):
             filename = f"Kitap_Karnesi_{self.book_id}.pdf"
             desktop = os.path.join(os.path.join(os.environ['USERPROFILE']), 'Desktop')
             output_path = os.path.join(desktop, filename)
-            
-            utils.generate_book_report_pdf(current_book, quotes, vocab, self.edit_notes.value, output_path)
-            
-            self.page.snack_bar = ft.SnackBar(ft.Text(f"PDF oluşturuldu: {output_path}"), bgcolor=ft.Colors.GREEN_600)
-            self.page.snack_bar.open = True
-            self.page.update()
+        except Exception as ex:
+            show_error(ex)
+            return
+
+        def show_report(_):
+            page.snack_bar = ft.SnackBar(ft.Text(f"PDF oluşturuldu: {output_path}"), bgcolor=ft.Colors.GREEN_600)
+            page.snack_bar.open = True
+            page.update()
             
             # Open PDF
             os.startfile(output_path)
-            
-        except Exception as ex:
-            self.page.snack_bar = ft.SnackBar(ft.Text(f"PDF hatası: {ex}"), bgcolor=ft.Colors.RED_400)
-            self.page.snack_bar.open = True
-            self.page.update()
+
+        # The PDF is rendered in a worker process; the dialog stays responsive
+        tasks.RUNNER.run_cpu(
+            "PDF raporu", utils.generate_book_report_pdf, current_book, quotes, vocab, self.edit_notes.value, output_path,
+            key=("pdf", output_path), on_done=show_report, on_error=show_error
+        )
 
 class ReadingSessionDialog(ft.AlertDialog):
     def __init__(self, book, on_update):
@@ -783,13 +817,15 @@ class ReadingSessionDialog(ft.AlertDialog):
             start_time = (datetime.datetime.now() - datetime.timedelta(seconds=self.seconds)).strftime("%Y-%m-%d %H:%M")
             end_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
             
-            database.update_book_progress(self.book[0], new_page)
-            database.add_reading_session(self.book[0], start_time, end_time, duration_minutes, pages_read)
-            
             # Award XP
             xp_earned = (pages_read * 2) + duration_minutes
             user_id = self.book[19] if len(self.book) > 19 else 1
-            database.add_xp(user_id, xp_earned)
+
+            # Progress, session and XP are committed together
+            with database.unit_of_work():
+                database.update_book_progress(self.book[0], new_page)
+                database.add_reading_session(self.book[0], start_time, end_time, duration_minutes, pages_read)
+                database.add_xp(user_id, xp_earned)
             
             self.page.snack_bar = ft.SnackBar(ft.Text(f"Oturum kaydedildi: {duration_minutes} dk, {pages_read} sayfa. +{xp_earned} XP!"))
             self.page.snack_bar.open = True
@@ -822,6 +858,115 @@ class ReadingSessionDialog(ft.AlertDialog):
         self.pomodoro_btn.update()
         self.timer_text.update()
 
+# Sort dropdown label -> database.BOOK_SORTS key
+SORT_OPTIONS = {
+    "Eklenme (Yeni-Eski)": "id_desc",
+    "Eklenme (Eski-Yeni)": "id_asc",
+    "Başlık (A-Z)": "title_asc",
+    "Başlık (Z-A)": "title_desc",
+    "Puan (Yüksek-Düşük)": "rating_desc",
+}
+
+def cover_image(url, size, **kwargs):
+    """
+    ft.Image showing url from the local cover cache; the placeholder is
+    swapped for the thumbnail once a background download finishes.
+    """
+    image = ft.Image(**kwargs)
+
+    def show(path):
+        image.src = path
+        if image.page:
+            image.update()
+
+    image.src = cover_cache.cover_src(url, size, show)
+    return image
+
+# Cards kept for reuse across filter changes and scrolling, beyond those on screen
+CARD_CACHE_SIZE = 500
+# The grid holds at most this many pages of cards; rows far above or below
+# the viewport are dropped and paged back in when the user scrolls to them
+GRID_WINDOW_PAGES = 3
+
+class BookCard(ft.Container):
+    """
+    Grid card for one database.GRID_COLUMNS row
+    (id, title, author, cover_url, rating, page_count, status, current_page).
+    set_book() updates the existing controls in place.
+    """
+    def __init__(self, book, on_open):
+        self.book = None
+        self.cover = ft.Image(fit=ft.ImageFit.COVER, border_radius=10)
+        self.title_text = ft.Text(weight="bold", size=14, no_wrap=True, overflow=ft.TextOverflow.ELLIPSIS)
+        self.author_text = ft.Text(size=12, color=ft.Colors.GREY_400, no_wrap=True, overflow=ft.TextOverflow.ELLIPSIS)
+        self.progress_bar = ft.ProgressBar(bgcolor=ft.Colors.GREY_800, height=4)
+        self.status_icon = ft.Icon(ft.Icons.CIRCLE, size=10)
+        self.status_text = ft.Text(size=10)
+
+        super().__init__(
+            content=ft.Column([
+                ft.Container(
+                    content=self.cover,
+                    expand=True,
+                    clip_behavior=ft.ClipBehavior.HARD_EDGE,
+                    border_radius=10,
+                    shadow=ft.BoxShadow(blur_radius=10, color=ft.Colors.with_opacity(0.3, ft.Colors.BLACK))
+                ),
+                ft.Container(height=5),
+                self.title_text,
+                self.author_text,
+                self.progress_bar,
+                ft.Row([self.status_icon, self.status_text], spacing=5)
+            ], spacing=2),
+            padding=10,
+            bgcolor=ft.Colors.ON_INVERSE_SURFACE,
+            border_radius=15,
+            on_click=lambda e: on_open(self.book[0])
+        )
+        self.set_book(book)
+
+    def set_book(self, book):
+        if book == self.book:
+            return
+        self.book = book
+
+        # Calculate progress
+        page_count = book[5] or 0
+        current_page = book[7] or 0
+        progress = 0
+        if page_count > 0:
+            progress = min(current_page / page_count, 1.0)
+
+        status = book[6] or "Okunacak"
+        status_color = ft.Colors.GREY
+        if status == "Okunuyor": status_color = ft.Colors.ORANGE
+        elif status == "Okundu": status_color = ft.Colors.GREEN
+
+        self.cover.src = cover_cache.cover_src(book[3], "grid", lambda path, url=book[3]: self.show_cover(url, path))
+        self.title_text.value = book[1]
+        self.author_text.value = book[2]
+        self.progress_bar.value = progress
+        self.progress_bar.color = status_color
+        self.status_icon.color = status_color
+        self.status_text.value = status
+        self.status_text.color = status_color
+
+    def show_cover(self, url, path):
+        # Called from a cover_cache worker once the thumbnail is downloaded
+        if self.book[3] == url:
+            self.cover.src = path
+            if self.page:
+                self.update()
+
+# search_library hit kind -> list icon
+SEARCH_ICONS = {
+    "book": ft.Icons.BOOK,
+    "quote": ft.Icons.FORMAT_QUOTE,
+    "word": ft.Icons.TRANSLATE,
+}
+SNIPPET_MARK = ("\x02", "\x03")
+SNIPPET_SPLIT = re.compile("[\x02\x03]")
+
 class Dashboard(ft.Column):
     def __init__(self, user_id):
         super().__init__()
@@ -839,7 +984,8 @@ class Dashboard(ft.Column):
             bgcolor=ft.Colors.ON_INVERSE_SURFACE,
             border_color=ft.Colors.TRANSPARENT,
             expand=True,
-            on_change=self.filter_books
+            on_change=self.filter_books,
+            on_submit=self.search_library
         )
         
         self.filter_dropdown = ft.Dropdown(
@@ -923,6 +1069,8 @@ class Dashboard(ft.Column):
             child_aspect_ratio=0.7,
             spacing=20,
             run_spacing=20,
+            on_scroll_interval=100,
+            on_scroll=self.on_grid_scroll,
         )
         
         self.controls = [
@@ -941,21 +1089,28 @@ class Dashboard(ft.Column):
             self.books_grid
         ]
         
-        self.all_books = []
+        # Paging state for the grid; see load_next_page and load_previous_page
+        self.cards = OrderedDict() # book id -> BookCard, least recently shown first
+        self.page_size = 60
+        self.last_row = None
+        self.window_start = 0 # position of the grid's first card in the full result list
+        self.scroll_pixels = 0
+        self.has_more = False
+        self.loading_page = False
+        self.recommendation_task = None
         self.reading_goal = database.get_user_goal(self.user_id)
 
     def did_mount(self):
         self.load_books()
 
     def pick_random_book(self, e):
-        unread_books = [b for b in self.all_books if len(b) > 14 and b[14] == "Okunacak"]
-        if not unread_books:
+        book = database.get_random_book(self.user_id, "Okunacak")
+        if not book:
             self.page.snack_bar = ft.SnackBar(ft.Text("Okunacak kitap bulunamadı!"))
             self.page.snack_bar.open = True
             self.page.update()
             return
             
-        book = random.choice(unread_books)
         self.open_book_details(book)
         self.page.snack_bar = ft.SnackBar(ft.Text(f"Öneri: {book[1]}"))
         self.page.snack_bar.open = True
@@ -984,97 +1139,161 @@ class Dashboard(ft.Column):
         self.page.open(dialog)
 
     def load_books(self):
-        self.all_books = database.get_books(self.user_id)
-        self.filter_books(None) # Apply sort and filter
+        # Refresh after a change: only the window on screen is reloaded. Cards
+        # above it stay as they are; the ones below are dropped and paged in
+        # again when the user scrolls down to them.
+        columns, row_height = self.grid_geometry()
+        window = self.visible_page_size()
+        first = min(len(self.books_grid.controls), int(self.scroll_pixels // row_height) * columns)
+        if first == 0 and self.window_start == 0:
+            self.show_first_page(max(self.page_size, window))
+            return
+
+        books = database.query_books(self.user_id, limit=window, offset=self.window_start + first, **self.current_query())
+        self.has_more = len(books) == window
+        kept = self.books_grid.controls[:first]
+        if not books and not kept:
+            # Everything from the window on was deleted
+            self.show_first_page(max(self.page_size, window))
+            return
+        self.last_row = books[-1] if books else kept[-1].book
+        self.books_grid.controls = kept
+        self.render_books(books, append=True)
 
     def filter_books(self, e):
-        search_term = self.search_field.value.lower() if self.search_field.value else ""
+        # Filtering, sorting and paging all happen in SQL; start again from the first page
+        self.page_size = self.visible_page_size()
+        self.show_first_page(self.page_size)
+
+    def current_query(self):
+        search_term = self.search_field.value.strip() if self.search_field.value else ""
         filter_type = self.filter_dropdown.value
-        sort_type = self.sort_dropdown.value
-        
-        filtered_books = []
-        for book in self.all_books:
-            # book: (id, title, author, isbn, cover_url, shelf_id, is_read, rating, notes, summary, page_count, publisher, borrower_name, borrow_date, status, current_page, ...)
-            title = book[1].lower() if book[1] else ""
-            author = book[2].lower() if book[2] else ""
-            status = book[14] if len(book) > 14 else "Okunacak"
-            borrower = book[12] if len(book) > 12 else ""
-            
-            matches_search = search_term in title or search_term in author
-            matches_filter = True
-            
-            if filter_type == "Okunacak":
-                matches_filter = (status == "Okunacak")
-            elif filter_type == "Okunuyor":
-                matches_filter = (status == "Okunuyor")
-            elif filter_type == "Okundu":
-                matches_filter = (status == "Okundu")
-            elif filter_type == "Ödünç Verilen":
-                matches_filter = (borrower != "")
-                
-            if matches_search and matches_filter:
-                filtered_books.append(book)
-        
-        # Sorting
-        if sort_type == "Eklenme (Yeni-Eski)":
-            filtered_books.sort(key=lambda x: x[0], reverse=True)
-        elif sort_type == "Eklenme (Eski-Yeni)":
-            filtered_books.sort(key=lambda x: x[0])
-        elif sort_type == "Başlık (A-Z)":
-            filtered_books.sort(key=lambda x: x[1].lower() if x[1] else "")
-        elif sort_type == "Başlık (Z-A)":
-            filtered_books.sort(key=lambda x: x[1].lower() if x[1] else "", reverse=True)
-        elif sort_type == "Puan (Yüksek-Düşük)":
-            filtered_books.sort(key=lambda x: x[7] if len(x) > 7 and x[7] is not None else 0, reverse=True)
-
-        self.render_books(filtered_books)
-
-    def render_books(self, books):
-        self.books_grid.controls.clear()
-        for book in books:
-            # book: (id, title, author, isbn, cover_url, shelf_id, is_read, rating, notes, summary, page_count, publisher, borrower_name, borrow_date, status, current_page, ...)
-            
-            # Calculate progress
-            page_count = book[10] if len(book) > 10 and book[10] else 0
-            current_page = book[15] if len(book) > 15 and book[15] else 0
-            progress = 0
-            if page_count > 0:
-                progress = min(current_page / page_count, 1.0)
-                
-            status = book[14] if len(book) > 14 else "Okunacak"
-            status_color = ft.Colors.GREY
-            if status == "Okunuyor": status_color = ft.Colors.ORANGE
-            elif status == "Okundu": status_color = ft.Colors.GREEN
-            
-            card = ft.Container(
-                content=ft.Column([
-                    ft.Container(
-                        content=ft.Image(
-                            src=book[4] if book[4] else "https://via.placeholder.com/150",
-                            fit=ft.ImageFit.COVER,
-                            border_radius=10,
-                        ),
-                        expand=True,
-                        clip_behavior=ft.ClipBehavior.HARD_EDGE,
-                        border_radius=10,
-                        shadow=ft.BoxShadow(blur_radius=10, color=ft.Colors.with_opacity(0.3, ft.Colors.BLACK))
-                    ),
-                    ft.Container(height=5),
-                    ft.Text(book[1], weight="bold", size=14, no_wrap=True, overflow=ft.TextOverflow.ELLIPSIS),
-                    ft.Text(book[2], size=12, color=ft.Colors.GREY_400, no_wrap=True, overflow=ft.TextOverflow.ELLIPSIS),
-                    ft.ProgressBar(value=progress, color=status_color, bgcolor=ft.Colors.GREY_800, height=4),
-                    ft.Row([
-                        ft.Icon(ft.Icons.CIRCLE, size=10, color=status_color),
-                        ft.Text(status, size=10, color=status_color)
-                    ], spacing=5)
-                ], spacing=2),
-                padding=10,
-                bgcolor=ft.Colors.ON_INVERSE_SURFACE,
-                border_radius=15,
-                on_click=lambda e, b=book: self.open_book_details(b)
-            )
-            self.books_grid.controls.append(card)
+        status = filter_type if filter_type in ("Okunacak", "Okunuyor", "Okundu") else None
+
+        return {
+            "search": search_term or None,
+            "status": status,
+            "borrowed": filter_type == "Ödünç Verilen",
+            "sort": SORT_OPTIONS.get(self.sort_dropdown.value, "id_desc"),
+        }
+
+    def grid_geometry(self):
+        # (cards per row, height of a row including its spacing) at the window's size
+        width = self.page.width if self.page and self.page.width else 1200
+        columns = max(1, math.ceil(width / self.books_grid.max_extent))
+        card_height = (width / columns) / self.books_grid.child_aspect_ratio
+        return columns, card_height + self.books_grid.run_spacing
+
+    def visible_page_size(self):
+        # Enough cards to fill the window plus two rows of buffer below it
+        height = self.page.height if self.page and self.page.height else 800
+        columns, row_height = self.grid_geometry()
+        return columns * (math.ceil(height / row_height) + 2)
+
+    def show_first_page(self, limit):
+        books = database.query_books(self.user_id, limit=limit, **self.current_query())
+        self.has_more = len(books) == limit
+        self.last_row = books[-1] if books else None
+        self.window_start = 0
+        scrolled = self.scroll_pixels > 0
+        self.scroll_pixels = 0
+        self.render_books(books)
+        if scrolled:
+            self.books_grid.scroll_to(offset=0, duration=0)
+
+    def load_next_page(self):
+        if not self.has_more or self.loading_page:
+            return
+        self.loading_page = True
+        try:
+            books = database.query_books(self.user_id, limit=self.page_size, after=self.last_row, **self.current_query())
+            self.has_more = len(books) == self.page_size
+            if books:
+                self.last_row = books[-1]
+            self.render_books(books, append=True)
+        finally:
+            self.loading_page = False
+
+    def load_previous_page(self):
+        # Pages the rows above the window back in, as load_next_page does below it
+        if self.window_start == 0 or self.loading_page:
+            return
+        self.loading_page = True
+        try:
+            columns = self.grid_geometry()[0]
+            count = min(self.window_start, math.ceil(self.page_size / columns) * columns)
+            offset = self.window_start - count
+            books = database.query_books(self.user_id, limit=count, offset=offset, **self.current_query())
+            self.window_start = offset
+            self.render_books(books, prepend=True)
+        finally:
+            self.loading_page = False
+
+    def trim_window(self, from_top):
+        # Drops whole rows of cards from one end of the grid once it holds more
+        # than GRID_WINDOW_PAGES pages. The cards stay in self.cards, so paging
+        # them back in reuses them. Returns how many rows were dropped.
+        columns = self.grid_geometry()[0]
+        extra = len(self.books_grid.controls) - GRID_WINDOW_PAGES * self.page_size
+        rows = max(0, extra // columns)
+        if rows == 0:
+            return 0
+        dropped = rows * columns
+        if from_top:
+            self.books_grid.controls = self.books_grid.controls[dropped:]
+            self.window_start += dropped
+        else:
+            self.books_grid.controls = self.books_grid.controls[:-dropped]
+            self.last_row = self.books_grid.controls[-1].book
+            self.has_more = True
+        return rows
+
+    def on_grid_scroll(self, e):
+        self.scroll_pixels = e.pixels or 0
+        # Fetch the next page shortly before the user reaches the end of the
+        # grid, and the previous one near the top of a trimmed window
+        if e.max_scroll_extent is not None and e.pixels >= e.max_scroll_extent - 500:
+            self.load_next_page()
+        elif self.window_start > 0 and self.scroll_pixels <= 500:
+            self.load_previous_page()
+
+    def card_for(self, book):
+        # Reuse the card already built for this book; only changed fields are sent to the client
+        card = self.cards.pop(book[0], None)
+        if card is None:
+            card = BookCard(book, self.open_book_by_id)
+        else:
+            card.set_book(book)
+        self.cards[book[0]] = card
+        return card
+
+    def render_books(self, books, append=False, prepend=False):
+        cards = [self.card_for(book) for book in books]
+        # Rows added or dropped above the viewport shift the content; the
+        # scroll position moves by the same amount so the view stays put
+        shift = 0
+        if append:
+            self.books_grid.controls.extend(cards)
+            shift = -self.trim_window(from_top=True)
+        elif prepend:
+            self.books_grid.controls[:0] = cards
+            self.trim_window(from_top=False)
+            shift = math.ceil(len(cards) / self.grid_geometry()[0])
+        else:
+            # Flet diffs the new list against the previous one, so cards that
+            # stay in the grid are neither rebuilt nor resent.
+            self.books_grid.controls = cards
+
+        while len(self.cards) > CARD_CACHE_SIZE:
+            self.cards.popitem(last=False)
         self.update()
+        if shift:
+            self.scroll_pixels = max(0, self.scroll_pixels + shift * self.grid_geometry()[1])
+            self.books_grid.scroll_to(offset=self.scroll_pixels, duration=0)
+
+    def open_book_by_id(self, book_id):
+        # Grid rows only carry card columns; the dialog needs the full record
+        self.open_book_details(database.get_book(book_id))
 
     def open_book_details(self, book):
         print(f"Opening details for book: {book[1]}")
@@ -1088,27 +1307,16 @@ class Dashboard(ft.Column):
             self.page.update()
 
     def export_library(self, e):
-        import csv
-        import os
-        
         try:
-            desktop = os.path.join(os.path.join(os.environ['USERPROFILE']), 'Desktop')
-            filename = os.path.join(desktop, f"kutuphane_yedek_{self.user_id}.csv")
-            
-            with open(filename, 'w', newline='', encoding='utf-8-sig') as file:
-                writer = csv.writer(file)
-                writer.writerow(["ID", "Başlık", "Yazar", "ISBN", "Raf ID", "Puan", "Notlar", "Özet", "Sayfa Sayısı", "Yayınevi", "Durum", "Başlangıç", "Bitiş", "Dosya Yolu"])
-                
-                for book in self.all_books:
-                    # Map indices carefully
-                    writer.writerow([
-                        book[0], book[1], book[2], book[3], book[5], 
-                        book[7], book[8], book[9], book[10], book[11], 
-                        book[14], book[16], book[17],
-                        book[20] if len(book) > 20 else ""
-                    ])
+            desktop = os.path.join(os.path.expanduser("~"), "Desktop")
+            if not os.path.isdir(desktop):
+                desktop = os.path.expanduser("~")
+            out_dir = os.path.join(desktop, f"kutuphane_yedek_{self.user_id}")
+
+            # Streams every table straight from the database, not just the loaded books
+            export.export_library(self.user_id, out_dir, "csv")
             
-            self.page.snack_bar = ft.SnackBar(ft.Text(f"Kütüphane dışa aktarıldı: {filename}"), bgcolor=ft.Colors.GREEN_600)
+            self.page.snack_bar = ft.SnackBar(ft.Text(f"Kütüphane dışa aktarıldı: {out_dir}"), bgcolor=ft.Colors.GREEN_600)
             self.page.snack_bar.open = True
             self.page.update()
             
@@ -1128,108 +1336,95 @@ class Dashboard(ft.Column):
         picker.pick_files(allow_multiple=False, allowed_extensions=["csv"])
 
     def import_csv(self, file_path):
-        try:
-            count = 0
-            skipped = 0
-            
-            # Detect encoding
-            encoding = 'utf-8'
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f: f.read()
-            except UnicodeDecodeError:
-                encoding = 'cp1254' # Turkish Windows encoding
-            
-            with open(file_path, mode='r', encoding=encoding) as csv_file:
-                # Check if it has header
-                sample = csv_file.read(1024)
-                csv_file.seek(0)
-                has_header = csv.Sniffer().has_header(sample)
-                
-                reader = csv.reader(csv_file)
-                if has_header:
-                    header = next(reader)
-                    # Try to map columns if possible, otherwise assume order: Title, Author, ISBN...
-                    # Simple mapping: 0=Title, 1=Author
-                
-                for row in reader:
-                    if len(row) < 2: continue
-                    
-                    title = row[0].strip()
-                    author = row[1].strip()
-                    isbn = row[2].strip() if len(row) > 2 else ""
-                    publisher = row[3].strip() if len(row) > 3 else ""
-                    page_count = int(row[4]) if len(row) > 4 and row[4].isdigit() else 0
-                    status = row[5].strip() if len(row) > 5 else "Okunacak"
-                    
-                    if not title: continue
-                    
-                    if not database.book_exists(self.user_id, title, author):
-                        # Get default shelf
-                        shelves = database.get_shelves(self.user_id)
-                        shelf_id = shelves[0][0] if shelves else 1
-                        
-                        database.add_book(
-                            title, author, isbn, "", shelf_id, self.user_id, 
-                            page_count=page_count, publisher=publisher, status=status
-                        )
-                        count += 1
-                    else:
-                        skipped += 1
-                        
+        def work(task):
+            encoding = utils.detect_csv_encoding(file_path)
+            size = os.path.getsize(file_path) or 1
+
+            with open(file_path, mode='r', encoding=encoding, newline='') as csv_file:
+                def on_progress(processed, added, skipped):
+                    # Cancelling raises here, which rolls the whole import back
+                    task.check()
+                    task.report(min(1.0, csv_file.buffer.tell() / size), f"{processed} satır işlendi")
+
+                return database.bulk_import_books(
+                    self.user_id, utils.read_import_rows(csv_file), progress=on_progress
+                )
+
+        def show_progress(task):
+            self.page.snack_bar = ft.SnackBar(ft.Text(f"İçe aktarılıyor... {task.message}."))
+            self.page.snack_bar.open = True
+            self.page.update()
+
+        def show_done(result):
+            count, skipped = result
             self.page.snack_bar = ft.SnackBar(ft.Text(f"İçe aktarma tamamlandı: {count} eklendi, {skipped} atlandı."), bgcolor=ft.Colors.GREEN_600)
             self.page.snack_bar.open = True
             self.load_books()
             self.page.update()
-            
-        except Exception as ex:
+
+        def show_error(ex):
             self.page.snack_bar = ft.SnackBar(ft.Text(f"Hata: {ex}"), bgcolor=ft.Colors.RED_400)
             self.page.snack_bar.open = True
             self.page.update()
 
+        tasks.RUNNER.run(
+            f"İçe aktarılıyor: {os.path.basename(file_path)}", work, key=("import", self.user_id, file_path),
+            on_done=show_done, on_error=show_error, on_progress=show_progress
+        )
+
     def show_recommendations(self, e):
-        # 1. Get user's top rated books
-        all_books = database.get_books(self.user_id)
-        # Filter books with rating >= 4
-        favorites = [b for b in all_books if len(b) > 7 and b[7] is not None and b[7] >= 4]
-        
-        if not favorites:
-            # Fallback to any read book
-            favorites = [b for b in all_books if len(b) > 14 and b[14] == "Okundu"]
-            
-        query = ""
-        reason = ""
-        
-        if favorites:
-            fav_book = random.choice(favorites)
-            # Search for author
-            author = fav_book[2]
-            title = fav_book[1]
-            query = f"inauthor:{author}"
-            reason = f"Çünkü '{title}' kitabını beğendin."
-        else:
-            # Generic recommendation
-            genres = ["Bilim Kurgu", "Roman", "Tarih", "Kişisel Gelişim", "Felsefe"]
-            genre = random.choice(genres)
-            query = f"subject:{genre}"
-            reason = f"Popüler {genre} kitaplarından bir öneri."
-            
+        # Another click while the search runs would only open a second dialog
+        if self.recommendation_task and not self.recommendation_task.finished:
+            return
+
         # Show loading
         self.page.snack_bar = ft.SnackBar(ft.Text("Yapay zeka kitap arıyor..."))
         self.page.snack_bar.open = True
         self.page.update()
         
-        # Fetch from API
-        # We use search_books but we need to filter out books user already has
-        results = api.search_books(query)
-        
-        # Filter
-        my_titles = [b[1].lower() for b in all_books]
-        recommendations = []
-        for r in results:
-            if r['title'].lower() not in my_titles:
-                recommendations.append(r)
-                if len(recommendations) >= 3: break
-        
+        def work(task):
+            # 1. Get user's top rated books
+            all_books = database.get_books(self.user_id)
+            # Filter books with rating >= 4
+            favorites = [b for b in all_books if len(b) > 7 and b[7] is not None and b[7] >= 4]
+            
+            if not favorites:
+                # Fallback to any read book
+                favorites = [b for b in all_books if len(b) > 14 and b[14] == "Okundu"]
+                
+            if favorites:
+                fav_book = random.choice(favorites)
+                # Search for author
+                author = fav_book[2]
+                title = fav_book[1]
+                query = f"inauthor:{author}"
+                reason = f"Çünkü '{title}' kitabını beğendin."
+            else:
+                # Generic recommendation
+                genres = ["Bilim Kurgu", "Roman", "Tarih", "Kişisel Gelişim", "Felsefe"]
+                genre = random.choice(genres)
+                query = f"subject:{genre}"
+                reason = f"Popüler {genre} kitaplarından bir öneri."
+
+            task.check()
+            # We use search_books but we need to filter out books user already has
+            results = api.search_books(query)
+            
+            # Filter
+            my_titles = {b[1].lower() for b in all_books}
+            recommendations = []
+            for r in results:
+                if r['title'].lower() not in my_titles:
+                    recommendations.append(r)
+                    if len(recommendations) >= 3: break
+            return reason, recommendations
+
+        self.recommendation_task = tasks.RUNNER.run(
+            "Öneriler aranıyor", work,
+            on_done=lambda result: self.show_recommendation_dialog(*result)
+        )
+
+    def show_recommendation_dialog(self, reason, recommendations):
         if not recommendations:
             self.page.snack_bar = ft.SnackBar(ft.Text("Öneri bulunamadı, tekrar deneyin."))
             self.page.snack_bar.open = True
@@ -1244,7 +1439,7 @@ class Dashboard(ft.Column):
             content.controls.append(
                 ft.Container(
                     content=ft.Row([
-                        ft.Image(src=book['cover_url'] if book['cover_url'] else "https://via.placeholder.com/100", width=60, height=90, fit=ft.ImageFit.COVER),
+                        cover_image(book['cover_url'], "grid", width=60, height=90, fit=ft.ImageFit.COVER),
                         ft.Column([
                             ft.Text(book['title'], weight="bold", width=200, no_wrap=True, overflow=ft.TextOverflow.ELLIPSIS),
                             ft.Text(book['author'], size=12, color=ft.Colors.GREY_400),
@@ -1264,6 +1459,43 @@ class Dashboard(ft.Column):
         )
         self.page.open(dialog)
 
+    def search_library(self, e):
+        # Enter in the search box searches notes, summaries, quotes and words too
+        query = self.search_field.value.strip() if self.search_field.value else ""
+        hits = database.search_library(self.user_id, query, mark=SNIPPET_MARK)
+        if not hits:
+            self.page.snack_bar = ft.SnackBar(ft.Text("Sonuç bulunamadı."))
+            self.page.snack_bar.open = True
+            self.page.update()
+            return
+
+        def open_hit(book_id):
+            self.page.close(dialog)
+            self.open_book_details(database.get_book(book_id))
+
+        content = ft.Column(spacing=5, scroll=ft.ScrollMode.AUTO, height=400, width=500)
+        for kind, ref_id, book_id, book_title, snippet, score in hits:
+            # snippet marks matched words; render them bold
+            spans = []
+            for i, part in enumerate(SNIPPET_SPLIT.split(snippet)):
+                if part:
+                    spans.append(ft.TextSpan(part, ft.TextStyle(weight="bold", color=ft.Colors.AMBER_400) if i % 2 else None))
+            content.controls.append(
+                ft.ListTile(
+                    leading=ft.Icon(SEARCH_ICONS[kind]),
+                    title=ft.Text(book_title, weight="bold", no_wrap=True, overflow=ft.TextOverflow.ELLIPSIS),
+                    subtitle=ft.Text(spans=spans, size=12, max_lines=3),
+                    on_click=lambda e, book_id=book_id: open_hit(book_id)
+                )
+            )
+
+        dialog = ft.AlertDialog(
+            title=ft.Text(f"\"{query}\" için sonuçlar"),
+            content=content,
+            actions=[ft.TextButton("Kapat", on_click=lambda e: self.page.close(dialog))]
+        )
+        self.page.open(dialog)
+
     def open_recommendation_details(self, book_data):
         # Reuse AddBook logic or show simple details
         # Let's show a simple dialog with "Add to Library" button
@@ -1294,7 +1526,7 @@ class Dashboard(ft.Column):
         rec_dialog = ft.AlertDialog(
             title=ft.Text(book_data['title']),
             content=ft.Column([
-                ft.Image(src=book_data['cover_url'], height=200),
+                cover_image(book_data['cover_url'], "detail", height=200),
                 ft.Text(f"Yazar: {book_data['author']}"),
                 ft.Text(f"Özet: {book_data['summary'][:200]}..." if book_data['summary'] else "Özet yok."),
             ], tight=True, horizontal_alignment=ft.CrossAxisAlignment.CENTER),
@@ -1337,61 +1569,3 @@ class Dashboard(ft.Column):
         database.delete_book(book_id)
         self.load_books()
 
-    def render_books(self, books):
-        self.books_grid.controls.clear()
-        for book in books:
-            # book: (id, title, author, isbn, cover_url, shelf_id, is_read, rating, notes, summary, page_count, publisher, borrower_name, borrow_date, status, current_page, ...)
-            
-            # Calculate progress
-            page_count = book[10] if len(book) > 10 and book[10] else 0
-            current_page = book[15] if len(book) > 15 and book[15] else 0
-            progress = 0
-            if page_count > 0:
-                progress = min(current_page / page_count, 1.0)
-                
-            status = book[14] if len(book) > 14 else "Okunacak"
-            status_color = ft.Colors.GREY
-            if status == "Okunuyor": status_color = ft.Colors.ORANGE
-            elif status == "Okundu": status_color = ft.Colors.GREEN
-            
-            card = ft.Container(
-                content=ft.Column([
-                    ft.Container(
-                        content=ft.Image(
-                            src=book[4] if book[4] else "https://via.placeholder.com/150",
-                            fit=ft.ImageFit.COVER,
-                            border_radius=10,
-                        ),
-                        expand=True,
-                        clip_behavior=ft.ClipBehavior.HARD_EDGE,
-                        border_radius=10,
-                        shadow=ft.BoxShadow(blur_radius=10, color=ft.Colors.with_opacity(0.3, ft.Colors.BLACK))
-                    ),
-                    ft.Container(height=5),
-                    ft.Text(book[1], weight="bold", size=14, no_wrap=True, overflow=ft.TextOverflow.ELLIPSIS),
-                    ft.Text(book[2], size=12, color=ft.Colors.GREY_400, no_wrap=True, overflow=ft.TextOverflow.ELLIPSIS),
-                    ft.ProgressBar(value=progress, color=status_color, bgcolor=ft.Colors.GREY_800, height=4),
-                    ft.Row([
-                        ft.Icon(ft.Icons.CIRCLE, size=10, color=status_color),
-                        ft.Text(status, size=10, color=status_color)
-                    ], spacing=5)
-                ], spacing=2),
-                padding=10,
-                bgcolor=ft.Colors.ON_INVERSE_SURFACE,
-                border_radius=15,
-                on_click=lambda e, b=book: self.open_book_details(b)
-            )
-            self.books_grid.controls.append(card)
-        self.update()
-
-    def open_book_details(self, book):
-        print(f"Opening details for book: {book[1]}")
-        try:
-            dialog = BookDetailsDialog(book, self.load_books, self.user_id)
-            self.page.open(dialog)
-        except Exception as e:
-            print(f"Error opening book details: {e}")
-            self.page.snack_bar = ft.SnackBar(ft.Text(f"Hata: {e}"))
-            self.page.snack_bar.open = True
-            self.page.update()
-
@@ -1,7 +1,7 @@
 import flet as ft
 import database
 
-from ui.dashboard import BookDetailsDialog
+from ui.dashboard import BookDetailsDialog, cover_image
 
 class Shelves(ft.Column):
     def __init__(self, user_id):
@@ -90,16 +90,11 @@ class Shelves(ft.Column):
 
     def load_shelves(self):
         self.shelves_grid.controls.clear()
-        shelves = database.get_shelves(self.user_id)
-        # Get book counts for each shelf
-        all_books = database.get_books(self.user_id)
-        shelf_counts = {}
-        for book in all_books:
-            s_id = book[5]
-            shelf_counts[s_id] = shelf_counts.get(s_id, 0) + 1
+        # summary: (shelf_id, name, description, books, read, pages, avg_rating, last_added)
+        shelves = [row for row in database.get_shelf_summary(self.user_id) if row[1] is not None]
 
         for shelf in shelves:
-            count = shelf_counts.get(shelf[0], 0)
+            count = shelf[3]
             self.shelves_grid.controls.append(
                 ft.Container(
                     content=ft.Column([
@@ -225,8 +220,8 @@ class Shelves(ft.Column):
                         [
                             ft.Container(
                                 content=ft.Stack([
-                                    ft.Image(
-                                        src=book[4] if book[4] else "https://via.placeholder.com/150",
+                                    cover_image(
+                                        book[4], "grid",
                                         fit=ft.ImageFit.COVER,
                                         border_radius=ft.border_radius.all(12),
                                         width=1000, # Fill container
@@ -325,16 +320,15 @@ class Shelves(ft.Column):
         self.update()
 
     def delete_shelf(self, shelf_id):
-        book_count = database.get_shelf_book_count(shelf_id)
-        if book_count > 0:
+        # delete_shelf refuses a shelf with books on it, in the same statement
+        if not database.delete_shelf(shelf_id):
             self.page.snack_bar = ft.SnackBar(
-                content=ft.Text(f"Bu rafta {book_count} kitap var. Silmek için önce kitapları taşıyın veya silin."),
+                content=ft.Text("Bu rafta kitap var. Silmek için önce kitapları taşıyın veya silin."),
                 bgcolor=ft.Colors.RED_400
             )
             self.page.snack_bar.open = True
             self.page.update()
             return
 
-        database.delete_shelf(shelf_id)
         self.load_shelves()
 
@@ -1,6 +1,5 @@
 import flet as ft
 import database
-import datetime
 from collections import defaultdict
 
 class Statistics(ft.Column):
@@ -56,33 +55,21 @@ class Statistics(ft.Column):
         )
 
     def load_stats(self):
-        # 1. Basic Stats
-        total_minutes = database.get_total_reading_time(self.user_id)
-        total_pages_session = database.get_total_pages_read_in_sessions(self.user_id)
-        all_books = database.get_books(self.user_id)
+        # 1. Basic Stats (from the daily rollups, see database.get_daily_stats)
+        total_minutes, total_pages_session, _, _ = database.get_reading_totals(self.user_id)
         
         hours, mins = divmod(total_minutes, 60)
         time_str = f"{hours}s {mins}dk" if hours > 0 else f"{mins}dk"
         
         self.total_time_card.content.controls[1].value = time_str
         self.total_pages_card.content.controls[1].value = f"{total_pages_session} sayfa"
-        self.total_books_card.content.controls[1].value = str(len(all_books))
+        self.total_books_card.content.controls[1].value = str(database.get_book_count(self.user_id))
         
         # 2. Bar Chart (Last 7 Days)
-        sessions = database.get_user_reading_sessions(self.user_id)
-        # sessions: (id, book_id, start_time, end_time, duration, pages, title)
-        
-        daily_pages = defaultdict(int)
-        today = datetime.date.today()
-        dates = [(today - datetime.timedelta(days=i)) for i in range(6, -1, -1)]
-        
-        for s in sessions:
-            try:
-                # s[2] is start_time string "YYYY-MM-DD HH:MM"
-                s_date = datetime.datetime.strptime(s[2], "%Y-%m-%d %H:%M").date()
-                if s_date in dates:
-                    daily_pages[s_date] += s[5] # s[5] is pages_read
-            except: pass
+        # days: (date, minutes, pages, sessions, books_finished), oldest first
+        days = database.get_daily_stats(self.user_id, 7)
+        dates = [d[0] for d in days]
+        daily_pages = {d[0]: d[2] for d in days}
             
         chart_groups = []
         for d in dates:
@@ -128,14 +115,11 @@ class Statistics(ft.Column):
         )
 
         # 3. Pie Chart (Shelves)
-        shelves = database.get_shelves(self.user_id)
-        shelf_map = {s[0]: s[1] for s in shelves} # id -> name
         shelf_counts = defaultdict(int)
-        
-        for b in all_books:
-            s_id = b[5]
-            s_name = shelf_map.get(s_id, "Bilinmiyor")
-            shelf_counts[s_name] += 1
+        for shelf in database.get_shelf_summary(self.user_id):
+            # Empty shelves stay out of the chart
+            if shelf[3]:
+                shelf_counts[shelf[1] or "Bilinmiyor"] += shelf[3]
             
         pie_sections = []
         colors = [ft.Colors.BLUE, ft.Colors.RED, ft.Colors.GREEN, ft.Colors.ORANGE, ft.Colors.PURPLE, ft.Colors.TEAL, ft.Colors.PINK]
@@ -0,0 +1,55 @@
+import flet as ft
+import tasks
+
+STATE_ICONS = {
+    tasks.DONE: (ft.Icons.CHECK_CIRCLE_OUTLINE, ft.Colors.GREEN_400),
+    tasks.FAILED: (ft.Icons.ERROR_OUTLINE, ft.Colors.RED_400),
+    tasks.CANCELLED: (ft.Icons.BLOCK, ft.Colors.GREY_500),
+}
+
+class TaskQueue(ft.Container):
+    """
+    The background tasks of tasks.RUNNER: a row per task with its progress
+    and a cancel button. Hidden while nothing is queued or running.
+    """
+    def __init__(self, runner=tasks.RUNNER):
+        self.runner = runner
+        self.rows = ft.Column(spacing=5)
+        super().__init__(
+            content=self.rows,
+            visible=False,
+            padding=ft.padding.symmetric(horizontal=30, vertical=10),
+            bgcolor=ft.Colors.ON_INVERSE_SURFACE
+        )
+
+    def did_mount(self):
+        self.runner.add_listener(self.show_tasks)
+        self.show_tasks(self.runner.tasks())
+
+    def will_unmount(self):
+        self.runner.remove_listener(self.show_tasks)
+
+    def show_tasks(self, task_list):
+        self.visible = any(not task.finished for task in task_list)
+        self.rows.controls = [self.task_row(task) for task in task_list] if self.visible else []
+        if self.page:
+            self.update()
+
+    def task_row(self, task):
+        if task.finished:
+            icon, color = STATE_ICONS[task.state]
+            status = ft.Icon(icon, color=color, size=18)
+        else:
+            status = ft.IconButton(
+                icon=ft.Icons.CLOSE_ROUNDED,
+                icon_size=18,
+                tooltip="İptal",
+                on_click=lambda e: task.cancel()
+            )
+        label = f"{task.label} · {task.message}" if task.message else task.label
+        return ft.Row([
+            ft.Text(label, size=12, width=300, no_wrap=True, overflow=ft.TextOverflow.ELLIPSIS),
+            # progress None shows the indeterminate bar, for tasks that can't tell
+            ft.ProgressBar(value=1 if task.finished else task.progress, expand=True, color=ft.Colors.TEAL_400, bgcolor=ft.Colors.GREY_800, height=5),
+            status
+        ], vertical_alignment=ft.CrossAxisAlignment.CENTER)
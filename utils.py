@@ -2,12 +2,56 @@ from PIL import Image, ImageDraw, ImageFont
 import textwrap
 import os
 import random
+import csv
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib import colors
 
+def detect_csv_encoding(file_path):
+    """
+    Returns 'utf-8' if the whole file decodes as UTF-8, otherwise the Turkish
+    Windows code page. Reads in chunks so big exports don't land in memory.
+    """
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            while f.read(1 << 20):
+                pass
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'cp1254' # Turkish Windows encoding
+
+def read_import_rows(csv_file):
+    """
+    Yields book rows for database.bulk_import_books from an open CSV file.
+    Column order: Title, Author, ISBN, Publisher, Page Count, Status.
+    """
+    # Check if it has header
+    sample = csv_file.read(1024)
+    csv_file.seek(0)
+    has_header = csv.Sniffer().has_header(sample) if sample else False
+
+    reader = csv.reader(csv_file)
+    if has_header:
+        next(reader)
+
+    for row in reader:
+        if len(row) < 2: continue
+
+        title = row[0].strip()
+        if not title: continue
+
+        yield {
+            "title": title,
+            "author": row[1].strip(),
+            "isbn": row[2].strip() if len(row) > 2 else "",
+            "publisher": row[3].strip() if len(row) > 3 else "",
+            "page_count": int(row[4]) if len(row) > 4 and row[4].isdigit() else 0,
+            "status": row[5].strip() if len(row) > 5 else "Okunacak",
+            "cover_url": "",
+        }
+
 def generate_quote_card(text, author, book_title, theme="dark"):
     # Configuration
     width = 1080